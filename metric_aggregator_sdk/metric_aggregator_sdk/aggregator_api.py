@@ -1,11 +1,11 @@
 # my_resilient_sdk/aggregator_manager.py
 
+import os
 import time
-import json
+import random
 import logging
 import threading
 import requests
-from dataclasses import asdict
 from typing import Optional
 from metric_aggregator_sdk.config.config import Config
 
@@ -13,10 +13,19 @@ from .dto_models import DeviceSnapshot, AggregatorData
 from .retry_queue import RetryQueue
 from .device import Device
 from .command_poller import CommandPoller
+from .transport import Transport, HttpTransport
+from .encoding import PayloadEncoder
+from .snapshot_buffer import make_buffer
+
+RETRYABLE_STATUS_CODES = (429, 503)
+# What a server that only accepts JSON answers to an encoded body: 400 (gzip) or 422 (msgpack,
+# columnar). Also what any server answers to invalid data, so these only prompt a JSON retry.
+# A server that decodes encodings answers 415 to one it does not support.
+POSSIBLY_UNSUPPORTED_ENCODING_STATUS_CODES = (400, 422)
 
 class AggregatorAPI(threading.Thread):
     """
-    A resilient aggregator that merges DeviceSnapshots, uploads them,
+    A resilient aggregator that buffers DeviceSnapshots, uploads them,
     manages a retry queue for failed uploads, and maintains a device registry
     to relay commands to registered devices.
     """
@@ -26,8 +35,13 @@ class AggregatorAPI(threading.Thread):
         name: str, 
         script_path: Optional[str] = None, 
         config_path: str = "default_config.json",
-        logger: Optional[logging.Logger] = None
+        logger: Optional[logging.Logger] = None,
+        transport: Optional[Transport] = None
     ):
+        """
+        transport: how to reach the server; by default a pooled keep-alive HttpTransport sized by
+        the config, shared with the command poller. Pass a stub Transport to run without a server.
+        """
         super().__init__()
         sdk_config = Config(script_path=script_path, config_path=config_path)
         aggregator_cfg = sdk_config.aggregatorSDK
@@ -37,18 +51,43 @@ class AggregatorAPI(threading.Thread):
         self.snapshots_endpoint = aggregator_cfg.snapshots_endpoint
         self.interval = aggregator_cfg.interval
         self.retry_interval = aggregator_cfg.retry_interval
+        self.retry_batch_max_snapshots = aggregator_cfg.retry_batch_max_snapshots
+        self.retry_batch_max_bytes = aggregator_cfg.retry_batch_max_bytes
+        self.retry_backoff_max = aggregator_cfg.retry_backoff_max
+        self._failed_uploads = 0    # consecutive failed uploads, drives the backoff
+        self._next_retry_time = 0.0 # when the retry queue may be replayed next
         self.logger = logger or logging.getLogger(__name__)
         self._stop_event = threading.Event()
-        self._snapshot_buffer = {}  # device_name -> DeviceSnapshot
+        self._snapshot_buffer = make_buffer(aggregator_cfg.buffer_mode, aggregator_cfg.buffer_aggregate_interval)
         self._snapshot_lock = threading.Lock()
-        self.retry_queue = RetryQueue(logger=self.logger)
+        retry_queue_path = aggregator_cfg.retry_queue_path
+        self.retry_queue = RetryQueue(
+            path=os.path.abspath(retry_queue_path.format(guid=guid, name=name)) if retry_queue_path else None,
+            max_items=aggregator_cfg.retry_queue_max_items,
+            max_bytes=aggregator_cfg.retry_queue_max_bytes,
+            logger=self.logger.getChild("RetryQueue")
+        )
         self.device_registry = {}
+        self.encoder = PayloadEncoder(
+            format=aggregator_cfg.upload_format,
+            compression=aggregator_cfg.upload_compression,
+            logger=self.logger.getChild("PayloadEncoder")
+        )
+        self._owns_transport = transport is None
+        self.transport = transport if transport is not None else HttpTransport(
+            pool_size=aggregator_cfg.http_pool_size,
+            connect_timeout=aggregator_cfg.http_connect_timeout,
+            read_timeout=aggregator_cfg.http_read_timeout
+        )
         self.command_poller = CommandPoller(
             aggregator_name=self.name,  
             base_url=self.base_url,
-            poll_interval=5.0,
+            poll_interval=aggregator_cfg.command_poll_interval,
             logger=self.logger.getChild("CommandPoller"),
-            device_registry=self.device_registry
+            device_registry=self.device_registry,
+            long_poll=aggregator_cfg.command_long_poll,
+            long_poll_timeout=aggregator_cfg.command_long_poll_timeout,
+            transport=self.transport
         )
 
     def register_device(self, device: Device):
@@ -62,7 +101,7 @@ class AggregatorAPI(threading.Thread):
         self.logger.info("[AggregatorAPI] Starting aggregator thread.")
         self.command_poller.start() 
         last_upload_time = time.time()
-        last_retry_time = time.time()
+        self._next_retry_time = time.time() + self.retry_interval
 
         while not self._stop_event.is_set():
             time.sleep(0.5)  # Polling interval to check for stop signal
@@ -72,11 +111,14 @@ class AggregatorAPI(threading.Thread):
                 self._upload_merged_data()
                 last_upload_time = current_time
 
-            if current_time - last_retry_time >= self.retry_interval:
-                self._flush_retry_queue()
-                last_retry_time = current_time
+            if current_time >= self._next_retry_time:
+                # Replay only until the next live upload is due: fresh data goes first.
+                self._flush_retry_queue(deadline=last_upload_time + self.interval)
 
         self.command_poller.stop()
+        self.retry_queue.close()
+        if self._owns_transport:
+            self.transport.close()
         self.logger.info("[AggregatorAPI] Aggregator thread stopped.")
 
     def stop(self):
@@ -86,30 +128,25 @@ class AggregatorAPI(threading.Thread):
 
     def add_snapshot(self, snapshot: DeviceSnapshot):
         """
-        Adds new snapshot data to the buffer and merges it with existing data if present.
+        Adds new snapshot data to the buffer: merged with the device's earlier data, kept as a
+        sample or folded into its window, depending on buffer_mode.
         """
         with self._snapshot_lock:
-            if snapshot.device_name in self._snapshot_buffer:
-                existing = self._snapshot_buffer[snapshot.device_name]
-                existing.merge(snapshot)  
-                self.logger.debug("Merged snapshot for device '%s'.", snapshot.device_name)
-            else:
-                self._snapshot_buffer[snapshot.device_name] = snapshot
-                self.logger.debug("Added new snapshot for device '%s'.", snapshot.device_name)
+            self._snapshot_buffer.add(snapshot)
+        self.logger.debug("Buffered snapshot for device '%s'.", snapshot.device_name)
 
     def _upload_merged_data(self):
         """
-        Merge buffered snapshots into an AggregatorData object and attempt to upload.
+        Collect buffered snapshots into an AggregatorData object and attempt to upload.
         On failure (i.e. connection issues), enqueue snapshots for retry.
         """
         with self._snapshot_lock:
-            if not self._snapshot_buffer:
-                self.logger.debug("[AggregatorAPI] No snapshots to upload.")
-                return
-            device_names = list(self._snapshot_buffer.keys())
-            self.logger.info("[AggregatorAPI] Preparing to upload snapshots for devices: %s", device_names)
-            device_snapshots = list(self._snapshot_buffer.values())
-            self._snapshot_buffer.clear()
+            device_snapshots = self._snapshot_buffer.drain()
+        if not device_snapshots:
+            self.logger.debug("[AggregatorAPI] No snapshots to upload.")
+            return
+        device_names = sorted({snap.device_name for snap in device_snapshots})
+        self.logger.info("[AggregatorAPI] Preparing to upload %d snapshots for devices: %s", len(device_snapshots), device_names)
 
         aggregator_data = AggregatorData(
             guid=self.guid,
@@ -120,28 +157,57 @@ class AggregatorAPI(threading.Thread):
         queue_size = self.retry_queue.size()
         self.logger.info("[AggregatorAPI] Current retry queue size: %d", queue_size)
 
-        if not self._upload(aggregator_data):
-            for snap in device_snapshots:
-                self.retry_queue.enqueue(snap)
+        if self._upload(aggregator_data):
+            self._upload_succeeded()
+        else:
+            self.retry_queue.enqueue_many(device_snapshots)
+            self._upload_failed()
 
-    def _flush_retry_queue(self):
+    def _flush_retry_queue(self, deadline: Optional[float] = None):
         """
-        Attempt to re-upload snapshots from the retry queue.
+        Re-upload the retry queue oldest first, in chunks of at most retry_batch_max_snapshots
+        snapshots / retry_batch_max_bytes bytes, until it is empty, an upload fails (the next
+        replay then waits for the backoff) or the deadline passes.
+        Snapshots are only removed from the queue once uploaded, so a crash mid-flush loses nothing.
         """
-        items = self.retry_queue.dequeue_all()
-        if not items:
-            return
+        while not self._stop_event.is_set() and (deadline is None or time.time() < deadline):
+            entries = self.retry_queue.read_batch(self.retry_batch_max_snapshots, self.retry_batch_max_bytes)
+            if not entries:
+                self._next_retry_time = time.time() + self.retry_interval
+                return
 
-        self.logger.info("[AggregatorAPI] Retrying %d queued snapshots.", len(items))
-        aggregator_data = AggregatorData(
-            guid=self.guid,
-            name=self.name,
-            device_snapshots=items
-        )
+            self.logger.info("[AggregatorAPI] Retrying %d of %d queued snapshots.", len(entries), self.retry_queue.size())
+            aggregator_data = AggregatorData(
+                guid=self.guid,
+                name=self.name,
+                device_snapshots=[snap for _, snap in entries]
+            )
 
-        if not self._upload(aggregator_data):
-            for snap in items:
-                self.retry_queue.enqueue(snap)
+            if not self._upload(aggregator_data):
+                self._upload_failed()
+                return
+            self.retry_queue.delete([entry_id for entry_id, _ in entries])
+            self._upload_succeeded()
+
+    def _upload_succeeded(self):
+        """
+        The server is reachable again: replay the backlog from the next loop iteration.
+        """
+        if self._failed_uploads:
+            self._failed_uploads = 0
+            self._next_retry_time = time.time()
+
+    def _upload_failed(self):
+        """
+        Exponential backoff with jitter before the next replay: retry_interval doubled per
+        consecutive failure, capped at retry_backoff_max, then randomized to 50-100% so that
+        aggregators cut off by the same outage don't all replay at once when it ends.
+        """
+        self._failed_uploads += 1
+        delay = min(self.retry_backoff_max, self.retry_interval * 2 ** (self._failed_uploads - 1))
+        delay = random.uniform(delay / 2, delay)
+        self._next_retry_time = max(self._next_retry_time, time.time() + delay)
+        self.logger.info("[AggregatorAPI] Upload failed %d times in a row, next retry in %.1fs.", self._failed_uploads, delay)
 
     def _upload(self, aggregator_data: AggregatorData) -> bool:
         """
@@ -150,20 +216,30 @@ class AggregatorAPI(threading.Thread):
         Returns True for successful uploads (or when dropping bad data),
         and False if the connection failed (to trigger a retry).
         """
-        payload = json.dumps(asdict(aggregator_data), default=str)
         url = f"{self.base_url}{self.snapshots_endpoint}"
         device_names = [snap.device_name for snap in aggregator_data.device_snapshots]
         self.logger.info("[AggregatorAPI] Attempting to upload data for devices: %s", device_names)
         connected_successfully = False
 
         try:
-            response = requests.post(
-                url,
-                data=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=20
-            )
+            payload, headers = self.encoder.encode(aggregator_data)
+            response = self.transport.post(url, data=payload, headers=headers)
             connected_successfully = True
+            if response.status_code == 415 and self.encoder.downgrade():
+                # The server does not understand this encoding: resend as plain JSON.
+                payload, headers = self.encoder.encode(aggregator_data)
+                response = self.transport.post(url, data=payload, headers=headers)
+            elif response.status_code in POSSIBLY_UNSUPPORTED_ENCODING_STATUS_CODES and not self.encoder.is_plain:
+                # An older server, or invalid data: try the same batch once as plain JSON and only
+                # stay on JSON if the server accepts that.
+                payload, headers = self.encoder.encode(aggregator_data, plain=True)
+                response = self.transport.post(url, data=payload, headers=headers)
+                if response.ok:
+                    self.encoder.downgrade()
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                # Server is applying backpressure (e.g. ingest queue full), not rejecting the data.
+                self.logger.warning("[AggregatorAPI] Server busy (HTTP %d) for devices %s. Will retry later.", response.status_code, device_names)
+                return False
             response.raise_for_status()
             self.logger.info("[AggregatorAPI] Successfully uploaded aggregator data for devices %s. Server response: %s", device_names, response.text)
             return True
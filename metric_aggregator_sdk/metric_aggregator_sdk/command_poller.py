@@ -1,52 +1,77 @@
 import time
-import requests
 import logging
 import threading
+from .transport import HttpTransport
 
 class CommandPoller(threading.Thread):
     """
     A thread that periodically polls the server for commands intended for this aggregator,
     relays them to the registered devices, and then acknowledges them so the server
     can remove them from the queue.
+
+    With long_poll=True the poller asks the server to hold each request for up to
+    long_poll_timeout seconds until a command arrives, and polls again right away, so commands
+    are delivered within milliseconds with one request per timeout instead of one per
+    poll_interval. poll_interval then only paces retries after errors, and polls against a server
+    that answers immediately (one without long-poll support).
     """
-    def __init__(self, aggregator_name, base_url, poll_interval=5.0, logger=None, device_registry=None):
-        super().__init__()
+    def __init__(self, aggregator_name, base_url, poll_interval=5.0, logger=None, device_registry=None,
+                 long_poll=False, long_poll_timeout=25.0, transport=None):
+        # A daemon in long-poll mode, so stop() does not have to wait for a held request.
+        super().__init__(daemon=long_poll)
         self.aggregator_name = aggregator_name
         self.base_url = base_url.rstrip("/")
         self.poll_interval = poll_interval
+        self.long_poll = long_poll
+        self.long_poll_timeout = long_poll_timeout
         self.logger = logger or logging.getLogger(__name__)
         self.device_registry = device_registry if device_registry is not None else {}
+        self._owns_transport = transport is None
+        self.transport = transport if transport is not None else HttpTransport(pool_size=1)
         self._stop_event = threading.Event()
 
     def run(self):
-        self.logger.info("[CommandPoller] Starting command poller thread.")
+        self.logger.info("[CommandPoller] Starting command poller thread (long_poll=%s).", self.long_poll)
         while not self._stop_event.is_set():
-            time.sleep(self.poll_interval)
+            if not self.long_poll:
+                time.sleep(self.poll_interval)
+            started = time.monotonic()
             try:
-                self._poll_commands()
+                acked = self._poll_commands()
             except Exception as e:
                 self.logger.warning("[CommandPoller] Error while polling commands: %s", e)
+                acked = False
+            if self.long_poll and not acked and time.monotonic() - started < 1.0:
+                # An error, or an immediate answer with nothing acked: don't spin against the server.
+                self._stop_event.wait(self.poll_interval)
 
         self.logger.info("[CommandPoller] Stopped command poller thread.")
 
     def stop(self):
         self.logger.info("[CommandPoller] Stop signal received.")
         self._stop_event.set()
-        self.join()
+        # A held long poll is abandoned; commands it returns late are only acked once relayed.
+        self.join(timeout=1.0 if self.long_poll else None)
+        if self._owns_transport and not self.is_alive():
+            self.transport.close()
 
     def _poll_commands(self):
         """
         1) GET unacked commands from the server
         2) Relay each command to the appropriate device
         3) Ack them back to the server so they won't appear again
+        Returns True when commands were acked, so the next long poll can start right away.
         """
         url = f"{self.base_url}/api/aggregators/{self.aggregator_name}/commands"
-        resp = requests.get(url, timeout=5)
+        if self.long_poll:
+            resp = self.transport.get(url, params={"wait": self.long_poll_timeout}, timeout=self.long_poll_timeout + 10)
+        else:
+            resp = self.transport.get(url, timeout=5)
         resp.raise_for_status()
         commands = resp.json()  
 
         if not commands:
-            return
+            return False
 
         self.logger.info("[CommandPoller] Received %d commands from server.", len(commands))
         ack_ids = []
@@ -57,7 +82,11 @@ class CommandPoller(threading.Thread):
             command_str = cmd.get("command")
 
             if not device_name or not command_str:
-                self.logger.warning("[CommandPoller] Invalid command format: %s", cmd)
+                # Acked (dropped) all the same: it can never be relayed, and left unacked the
+                # server would hand it out again on every poll.
+                self.logger.warning("[CommandPoller] Dropping command with invalid format: %s", cmd)
+                if cmd_id is not None:
+                    ack_ids.append(cmd_id)
                 continue
 
             # If device is registered, call device.handle_command
@@ -74,8 +103,10 @@ class CommandPoller(threading.Thread):
             ack_ids.append(cmd_id)
 
         # Now ack them to the server
-        if ack_ids:
-            self._ack_commands(ack_ids)
+        if not ack_ids:
+            return False
+        self._ack_commands(ack_ids)
+        return True
 
     def _ack_commands(self, command_ids):
         """
@@ -84,6 +115,6 @@ class CommandPoller(threading.Thread):
         """
         url = f"{self.base_url}/api/aggregators/{self.aggregator_name}/commands/ack"
         payload = {"command_ids": command_ids}
-        resp = requests.post(url, json=payload, timeout=5)
+        resp = self.transport.post(url, json=payload, timeout=5)
         resp.raise_for_status()
         self.logger.info("[CommandPoller] Acked command_ids: %s", command_ids)
@@ -8,7 +8,24 @@ class AggregatorSDKConfig:
     base_url: str
     snapshots_endpoint: str
     interval: float
-    retry_interval: float
+    retry_interval: float                   # seconds between retry queue replays (first backoff step)
+    command_poll_interval: float = 5.0      # seconds between command polls (between retries with long polling)
+    command_long_poll: bool = False         # hold command polls open on the server until a command arrives
+    command_long_poll_timeout: float = 25.0 # seconds the server may hold one long poll
+    http_pool_size: int = 4                 # keep-alive connections kept open to the server, per SDK thread
+    http_connect_timeout: float = 5.0       # seconds to establish a connection
+    http_read_timeout: float = 20.0         # seconds to wait for a response (uploads)
+    upload_format: str = "json"             # "json", "msgpack" or "columnar" (see encoding.py)
+    upload_compression: str = "identity"    # "identity", "gzip" or "zstd"
+    retry_queue_path: Optional[str] = None  # SQLite file for failed uploads, "{guid}"/"{name}" filled in; None keeps it in memory
+                                            # (a relative path is taken from the directory of a custom config's script)
+    retry_queue_max_items: int = 100000     # snapshots kept for retry before the oldest are evicted
+    retry_queue_max_bytes: int = 64 * 1024 * 1024 # retry queue payload quota in bytes
+    retry_batch_max_snapshots: int = 500    # snapshots per replayed upload
+    retry_batch_max_bytes: int = 1024 * 1024 # serialized snapshot bytes per replayed upload
+    retry_backoff_max: float = 300.0        # cap in seconds of the backoff after failed uploads
+    buffer_mode: str = "latest"             # "latest", "series" or "aggregate" (see snapshot_buffer.py)
+    buffer_aggregate_interval: float = 60.0 # window in seconds of the "aggregate" buffer mode
 
 class Config:
     aggregatorSDK: AggregatorSDKConfig
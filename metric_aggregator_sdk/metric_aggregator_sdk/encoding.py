@@ -0,0 +1,154 @@
+import gzip
+import json
+import logging
+from dataclasses import asdict
+from typing import Dict, Optional, Tuple
+from .dto_models import AggregatorData
+
+try:
+    import msgpack
+except ImportError: # optional: pip install metric_aggregator_sdk[msgpack]
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError: # optional: pip install metric_aggregator_sdk[zstd]
+    zstandard = None
+
+"""
+    Upload body encodings for POST /api/snapshots.
+
+    format:
+      json      the original AggregatorData JSON document
+      msgpack   the same document as msgpack, timestamps as epoch seconds
+      columnar  metric names interned once per batch, per device a timestamps column and one value
+                column per metric; msgpack-encoded when msgpack is installed, JSON otherwise
+    compression: identity, gzip or zstd (Content-Encoding).
+
+    Formats or compressions whose optional library is missing fall back to json / gzip with a
+    warning. A server without an optional library answers 415, after which downgrade() keeps the
+    encoder on plain JSON for the rest of the session. A server predating these encodings answers
+    400 or 422, like it does for invalid data; AggregatorAPI then resends the batch once with
+    encode(plain=True) and downgrades only if the server accepts that.
+"""
+
+FORMATS = ("json", "msgpack", "columnar")
+COMPRESSIONS = ("identity", "gzip", "zstd")
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR_JSON = "application/vnd.deepmetrics.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.deepmetrics.columnar+msgpack"
+
+def to_columnar(aggregator_data: AggregatorData) -> dict:
+    """
+    AggregatorData -> columnar batch:
+      {"guid", "name", "metric_names": [name, ...],
+       "devices": [{"device_name", "timestamps": [epoch seconds, ...],
+                    "metrics": [[metric index, [value or None, ...]], ...]}, ...]}
+    """
+    names: Dict[str, int] = {}
+    devices: Dict[str, dict] = {}
+    for snapshot in aggregator_data.device_snapshots:
+        device = devices.get(snapshot.device_name)
+        if device is None:
+            device = devices[snapshot.device_name] = {"timestamps": [], "columns": {}}
+        row = len(device["timestamps"])
+        device["timestamps"].append(snapshot.timestamp.timestamp())
+        for name, value in snapshot.metrics.items():
+            index = names.setdefault(name, len(names))
+            column = device["columns"].setdefault(index, [])
+            column.extend([None] * (row - len(column)))
+            column.append(float(value))
+
+    device_list = []
+    for device_name, device in devices.items():
+        rows = len(device["timestamps"])
+        metrics = []
+        for index, column in device["columns"].items():
+            column.extend([None] * (rows - len(column)))
+            metrics.append([index, column])
+        device_list.append({"device_name": device_name, "timestamps": device["timestamps"], "metrics": metrics})
+
+    return {
+        "guid": aggregator_data.guid,
+        "name": aggregator_data.name,
+        "metric_names": list(names),
+        "devices": device_list,
+    }
+
+def _to_msgpack_document(aggregator_data: AggregatorData) -> dict:
+    return {
+        "guid": aggregator_data.guid,
+        "name": aggregator_data.name,
+        "device_snapshots": [
+            {"device_name": s.device_name, "timestamp": s.timestamp.timestamp(), "metrics": s.metrics}
+            for s in aggregator_data.device_snapshots
+        ],
+    }
+
+
+class PayloadEncoder:
+    def __init__(
+        self,
+        format: str = "json",
+        compression: str = "identity",
+        level: Optional[int] = None,
+        logger: Optional[logging.Logger] = None
+    ):
+        if format not in FORMATS:
+            raise ValueError(f"Invalid upload format '{format}'. Expected one of: {', '.join(FORMATS)}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Invalid upload compression '{compression}'. Expected one of: {', '.join(COMPRESSIONS)}")
+        self.logger = logger or logging.getLogger(__name__)
+        if format == "msgpack" and msgpack is None:
+            self.logger.warning("[PayloadEncoder] msgpack is not installed, uploading JSON instead.")
+            format = "json"
+        if compression == "zstd" and zstandard is None:
+            self.logger.warning("[PayloadEncoder] zstandard is not installed, compressing with gzip instead.")
+            compression = "gzip"
+        self.format = format
+        self.compression = compression
+        self.level = level
+        self._zstd = zstandard.ZstdCompressor(level=level or 3) if compression == "zstd" else None
+
+    @property
+    def is_plain(self) -> bool:
+        return self.format == "json" and self.compression == "identity"
+
+    def encode(self, aggregator_data: AggregatorData, plain: bool = False) -> Tuple[bytes, Dict[str, str]]:
+        """
+        (body, headers) for one upload; plain=True encodes uncompressed JSON whatever the settings.
+        """
+        if plain:
+            return json.dumps(asdict(aggregator_data), default=str).encode(), {"Content-Type": JSON}
+        if self.format == "columnar":
+            document = to_columnar(aggregator_data)
+            if msgpack is not None:
+                body, content_type = msgpack.packb(document), COLUMNAR_MSGPACK
+            else:
+                body, content_type = json.dumps(document).encode(), COLUMNAR_JSON
+        elif self.format == "msgpack":
+            body, content_type = msgpack.packb(_to_msgpack_document(aggregator_data)), MSGPACK
+        else:
+            body, content_type = json.dumps(asdict(aggregator_data), default=str).encode(), JSON
+
+        headers = {"Content-Type": content_type}
+        if self.compression == "gzip":
+            body = gzip.compress(body, compresslevel=self.level or 6)
+            headers["Content-Encoding"] = "gzip"
+        elif self.compression == "zstd":
+            body = self._zstd.compress(body)
+            headers["Content-Encoding"] = "zstd"
+        return body, headers
+
+    def downgrade(self) -> bool:
+        """
+        Fall back to uncompressed JSON. Returns False when already using it.
+        """
+        if self.is_plain:
+            return False
+        self.logger.warning("[PayloadEncoder] Server rejected %s/%s uploads, falling back to plain JSON.",
+                            self.format, self.compression)
+        self.format, self.compression, self._zstd = "json", "identity", None
+        return True
@@ -1,35 +1,202 @@
-import collections
+import json
+import os
+import sqlite3
 import threading
 import logging
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from .dto_models import DeviceSnapshot
 
 """
-You might use Python’s built-in queue.Queue, which is thread-safe out-of-the-box. 
-However, deque gives you more control if you later decide to persist to disk.
+    Retry queue for snapshots whose upload failed, kept in a SQLite database so a long outage
+    neither grows the edge process without bound nor loses the backlog on restart.
+
+    - Append-only: snapshots are inserted as rows (JSON) in arrival order and only ever deleted,
+      after a successful (or dropped) re-upload or by eviction.
+    - Bounded: at most max_items snapshots and max_bytes of payload; beyond that the oldest
+      snapshots are evicted first and the space is returned to the disk (incremental vacuum).
+    - Crash-safe: WAL journal, every enqueue is committed before returning, and replayed entries
+      are only deleted once uploaded. A database that cannot be opened or fails its integrity
+      check on startup is moved aside (*.corrupt-<time>) and a fresh one started.
+    - Batch reads: read_batch() returns the oldest entries up to a count and byte budget,
+      delete() removes them once they are dealt with.
+
+    path=None keeps the database in memory (bounded the same way, but lost on restart); this is
+    the default. To keep the backlog across restarts set retry_queue_path in a custom config, e.g.
+    "/var/lib/deepmetrics/retry_{guid}.db", or a relative path, which is resolved against the
+    directory of the script passed as script_path. The file gets -wal/-shm companions next to it.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS retry_queue (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    size INTEGER NOT NULL,
+    payload TEXT NOT NULL
+)
 """
 
+def _serialize(snapshot: DeviceSnapshot) -> str:
+    return json.dumps({
+        "device_name": snapshot.device_name,
+        "metrics": snapshot.metrics,
+        "timestamp": snapshot.timestamp.isoformat(),
+    })
+
+def _deserialize(payload: str) -> DeviceSnapshot:
+    data = json.loads(payload)
+    return DeviceSnapshot(
+        device_name=data["device_name"],
+        metrics=data["metrics"],
+        timestamp=datetime.fromisoformat(data["timestamp"])
+    )
+
 class RetryQueue:
     """
-    A simple in-memory retry queue that holds items for later reprocessing.
+    A bounded, optionally disk-backed queue of DeviceSnapshots awaiting re-upload.
     """
-    def __init__(self, logger=None):
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_items: int = 100000,
+        max_bytes: int = 64 * 1024 * 1024,
+        logger=None
+    ):
         self.logger = logger or logging.getLogger(__name__)
-        self.queue = collections.deque()
+        self.path = path
+        self.max_items = max_items
+        self.max_bytes = max_bytes
         self.lock = threading.Lock()
+        self.evicted = 0
+        self.conn = self._open()
+        self._count, self._bytes = self.conn.execute(
+            "SELECT count(*), coalesce(sum(size), 0) FROM retry_queue"
+        ).fetchone()
+        if self._count:
+            self.logger.info("Recovered %d queued snapshots (%d bytes) from %s.", self._count, self._bytes, path)
+
+    def _open(self) -> sqlite3.Connection:
+        if self.path is None:
+            return self._connect(":memory:")
+        try:
+            conn = self._connect(self.path)
+            if conn.execute("PRAGMA quick_check").fetchone()[0] == "ok":
+                return conn
+            conn.close()
+            reason = "failed its integrity check"
+        except sqlite3.DatabaseError as e:
+            reason = str(e)
+        corrupt_path = f"{self.path}.corrupt-{int(time.time())}"
+        self.logger.error("Retry queue %s %s, moving it to %s and starting empty.", self.path, reason, corrupt_path)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.replace(self.path + suffix, corrupt_path + suffix)
+        return self._connect(self.path)
 
-    def enqueue(self, item):
+    def _connect(self, database: str) -> sqlite3.Connection:
+        # Shared by the aggregator thread and add_snapshot callers; serialized by self.lock.
+        conn = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL") # only takes effect on a new database
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(_SCHEMA)
+        return conn
+
+    def enqueue(self, item: DeviceSnapshot):
+        self.enqueue_many([item])
+
+    def enqueue_many(self, items: Iterable[DeviceSnapshot]):
+        """
+        Append snapshots in one transaction, evicting the oldest if the queue is over its bounds.
+        """
+        rows = [(len(payload), payload) for payload in map(_serialize, items)]
+        if not rows:
+            return
         with self.lock:
-            self.queue.append(item)
-            self.logger.debug("Enqueued snapshot for retry. Queue size=%d", len(self.queue))
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany("INSERT INTO retry_queue (size, payload) VALUES (?, ?)", rows)
+                self._count += len(rows)
+                self._bytes += sum(size for size, _ in rows)
+                self._evict()
+            self.logger.debug("Enqueued %d snapshots for retry. Queue size=%d", len(rows), self._count)
 
-    def dequeue_all(self):
+    def _evict(self):
+        """
+        Drop the oldest entries until the queue is within max_items and max_bytes. Holds self.lock.
+        """
+        if self._count <= self.max_items and self._bytes <= self.max_bytes:
+            return
+        excess_items = self._count - self.max_items
+        excess_bytes = self._bytes - self.max_bytes
+        evict_ids, evict_bytes = [], 0
+        for entry_id, size in self.conn.execute("SELECT entry_id, size FROM retry_queue ORDER BY entry_id"):
+            if len(evict_ids) >= excess_items and evict_bytes >= excess_bytes:
+                break
+            evict_ids.append(entry_id)
+            evict_bytes += size
+        self.conn.execute("DELETE FROM retry_queue WHERE entry_id <= ?", (evict_ids[-1],))
+        self._count -= len(evict_ids)
+        self._bytes -= evict_bytes
+        self.evicted += len(evict_ids)
+        self.conn.execute("PRAGMA incremental_vacuum")
+        self.logger.warning("Retry queue full, evicted the %d oldest snapshots (%d bytes).", len(evict_ids), evict_bytes)
+
+    def read_batch(self, max_items: Optional[int] = None, max_bytes: Optional[int] = None) -> List[Tuple[int, DeviceSnapshot]]:
+        """
+        The oldest (entry_id, snapshot) pairs, up to max_items snapshots and max_bytes of payload
+        (always at least one entry if any are queued). Entries stay queued until delete().
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT entry_id, size, payload FROM retry_queue ORDER BY entry_id LIMIT ?",
+                (max_items if max_items is not None else -1,)
+            )
+            batch, total = [], 0
+            for entry_id, size, payload in rows:
+                if batch and max_bytes is not None and total + size > max_bytes:
+                    break
+                batch.append((entry_id, _deserialize(payload)))
+                total += size
+            return batch
+
+    def delete(self, entry_ids: List[int]):
+        """
+        Remove entries returned by read_batch() once they were uploaded (or dropped).
+        """
+        if not entry_ids:
+            return
+        with self.lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                for start in range(0, len(entry_ids), 500): # stay under SQLite's bound-parameter limit
+                    chunk = entry_ids[start:start + 500]
+                    where = f"entry_id IN ({','.join('?' * len(chunk))})"
+                    deleted, freed = self.conn.execute(
+                        f"SELECT count(*), coalesce(sum(size), 0) FROM retry_queue WHERE {where}", chunk
+                    ).fetchone()
+                    self.conn.execute(f"DELETE FROM retry_queue WHERE {where}", chunk)
+                    self._count -= deleted
+                    self._bytes -= freed
+            if self._count == 0:
+                self.conn.execute("PRAGMA incremental_vacuum")
+
+    def dequeue_all(self) -> List[DeviceSnapshot]:
         """
         Returns all items in the queue and clears it.
         """
+        entries = self.read_batch()
+        self.delete([entry_id for entry_id, _ in entries])
+        return [snapshot for _, snapshot in entries]
+
+    def size(self) -> int:
+        with self.lock:
+            return self._count
+
+    def size_bytes(self) -> int:
         with self.lock:
-            items = list(self.queue)
-            self.queue.clear()
-            return items
+            return self._bytes
 
-    def size(self):
+    def close(self):
         with self.lock:
-            return len(self.queue)
+            self.conn.close()
@@ -0,0 +1,166 @@
+import math
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List
+from .dto_models import DeviceSnapshot
+
+"""
+    What AggregatorAPI keeps of the snapshots added between two uploads (buffer_mode):
+
+      latest     one snapshot per device, later metric values overwrite earlier ones
+                 (DeviceSnapshot.merge); every sample but the last is lost
+      series     every sample, per device as columns: a timestamps array plus one float array per
+                 metric (NaN where a sample lacks the metric); uploaded as one snapshot per sample
+      aggregate  per device and aggregate_interval window, min/max/mean/count of every metric,
+                 uploaded as one snapshot per window timestamped at the window start: the mean
+                 under the metric's own name, so its history, overview and rollups carry on, and
+                 the rest as secondary metrics "<name> (min)", "<name> (max)" and "<name> (count)";
+                 a window is only uploaded once it has ended, so it never arrives split in two
+
+    Buffers are not thread-safe; AggregatorAPI guards them with its snapshot lock.
+"""
+
+BUFFER_MODES = ("latest", "series", "aggregate")
+
+NAN = float("nan")
+
+def _epoch(timestamp: datetime) -> float:
+    return timestamp.timestamp()
+
+def _datetime(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+class LatestBuffer:
+    def __init__(self):
+        self._snapshots: Dict[str, DeviceSnapshot] = {}
+
+    def add(self, snapshot: DeviceSnapshot):
+        existing = self._snapshots.get(snapshot.device_name)
+        if existing is not None:
+            existing.merge(snapshot)
+        else:
+            self._snapshots[snapshot.device_name] = snapshot
+
+    def drain(self) -> List[DeviceSnapshot]:
+        snapshots = list(self._snapshots.values())
+        self._snapshots.clear()
+        return snapshots
+
+    def __len__(self):
+        return len(self._snapshots)
+
+
+class DeviceSeries:
+    """
+    The samples of one device: parallel arrays of doubles, 8 bytes per timestamp and per value.
+    """
+    def __init__(self):
+        self.timestamps = array("d")
+        self.columns: Dict[str, array] = {}
+
+    def add(self, snapshot: DeviceSnapshot):
+        row = len(self.timestamps)
+        self.timestamps.append(_epoch(snapshot.timestamp))
+        for name, value in snapshot.metrics.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = array("d", [NAN]) * row
+            column.append(float(value))
+        for column in self.columns.values():
+            if len(column) == row: # metric missing from this sample
+                column.append(NAN)
+
+    def to_snapshots(self, device_name: str) -> List[DeviceSnapshot]:
+        return [
+            DeviceSnapshot(
+                device_name=device_name,
+                metrics={name: column[row] for name, column in self.columns.items() if not math.isnan(column[row])},
+                timestamp=_datetime(timestamp)
+            )
+            for row, timestamp in enumerate(self.timestamps)
+        ]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class SeriesBuffer:
+    def __init__(self):
+        self._series: Dict[str, DeviceSeries] = {}
+
+    def add(self, snapshot: DeviceSnapshot):
+        series = self._series.get(snapshot.device_name)
+        if series is None:
+            series = self._series[snapshot.device_name] = DeviceSeries()
+        series.add(snapshot)
+
+    def drain(self) -> List[DeviceSnapshot]:
+        snapshots = [snap for device_name, series in self._series.items() for snap in series.to_snapshots(device_name)]
+        self._series.clear()
+        return snapshots
+
+    def __len__(self):
+        return sum(len(series) for series in self._series.values())
+
+
+class AggregateBuffer:
+    """
+    Running min/max/sum/count per device, window and metric; memory does not grow with the
+    sampling rate.
+    """
+    def __init__(self, interval: float = 60.0):
+        if interval <= 0:
+            raise ValueError("buffer_aggregate_interval must be positive.")
+        self.interval = interval
+        self._windows: Dict[str, Dict[float, Dict[str, list]]] = {} # device -> window start -> metric -> [min, max, sum, count]
+
+    def add(self, snapshot: DeviceSnapshot):
+        epoch = _epoch(snapshot.timestamp)
+        window = self._windows.setdefault(snapshot.device_name, {}).setdefault(epoch - epoch % self.interval, {})
+        for name, value in snapshot.metrics.items():
+            value = float(value)
+            stats = window.get(name)
+            if stats is None:
+                window[name] = [value, value, value, 1]
+            else:
+                if value < stats[0]:
+                    stats[0] = value
+                if value > stats[1]:
+                    stats[1] = value
+                stats[2] += value
+                stats[3] += 1
+
+    def drain(self) -> List[DeviceSnapshot]:
+        """
+        Snapshots of the windows that have ended; the current windows keep accumulating.
+        """
+        now = time.time()
+        snapshots = []
+        for device_name, windows in self._windows.items():
+            for start in sorted(windows):
+                if start + self.interval > now:
+                    continue
+                metrics = {}
+                for name, (low, high, total, count) in windows.pop(start).items():
+                    metrics[name] = total / count
+                    metrics[f"{name} (min)"] = low
+                    metrics[f"{name} (max)"] = high
+                    metrics[f"{name} (count)"] = count
+                snapshots.append(DeviceSnapshot(device_name=device_name, metrics=metrics, timestamp=_datetime(start)))
+        self._windows = {device_name: windows for device_name, windows in self._windows.items() if windows}
+        return snapshots
+
+    def __len__(self):
+        return sum(len(windows) for windows in self._windows.values())
+
+
+def make_buffer(mode: str = "latest", aggregate_interval: float = 60.0):
+    if mode == "latest":
+        return LatestBuffer()
+    if mode == "series":
+        return SeriesBuffer()
+    if mode == "aggregate":
+        return AggregateBuffer(aggregate_interval)
+    raise ValueError(f"Invalid buffer mode '{mode}'. Expected one of: {', '.join(BUFFER_MODES)}")
@@ -0,0 +1,76 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+class Transport(ABC):
+    """
+    How the SDK talks to the server. AggregatorAPI and CommandPoller only call get/post, so tests
+    can inject a local stub implementing them: return objects with status_code, text, json() and
+    raise_for_status() like requests.Response, and raise requests.RequestException (e.g.
+    requests.ConnectionError) to simulate an unreachable server.
+    """
+    @abstractmethod
+    def get(self, url: str, params: Optional[dict] = None, timeout: Optional[float] = None):
+        pass
+
+    @abstractmethod
+    def post(self, url: str, data=None, json=None, headers: Optional[dict] = None, timeout: Optional[float] = None):
+        pass
+
+    def close(self):
+        pass
+
+
+class HttpTransport(Transport):
+    """
+    Pooled keep-alive HTTP: connections (and their TLS sessions) are kept alive and reused
+    instead of being set up for every upload, poll and ack. requests.Session is not documented as
+    thread-safe, so every thread using the transport (the uploader, the command poller) gets its
+    own Session from a threading.local, each keeping up to pool_size idle connections per host.
+    `timeout` arguments override the read timeout of a single request (e.g. for long polls).
+    """
+    def __init__(
+        self,
+        pool_size: int = 4,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 20.0
+    ):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The calling thread's Session, created on first use.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            # No transport-level retries: the SDK's retry queue decides what is resent.
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def _timeout(self, timeout: Optional[float]):
+        return (self.connect_timeout, timeout if timeout is not None else self.read_timeout)
+
+    def get(self, url: str, params: Optional[dict] = None, timeout: Optional[float] = None):
+        return self.session.get(url, params=params, timeout=self._timeout(timeout))
+
+    def post(self, url: str, data=None, json=None, headers: Optional[dict] = None, timeout: Optional[float] = None):
+        return self.session.post(url, data=data, json=json, headers=headers, timeout=self._timeout(timeout))
+
+    def close(self):
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
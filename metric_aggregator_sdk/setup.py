@@ -10,5 +10,9 @@ setup(
         "requests>=2.20.0",
         "dataclasses-json",
     ],
+    extras_require={
+        "msgpack": ["msgpack>=1.0"],
+        "zstd": ["zstandard>=0.21"],
+    },
     python_requires=">=3.7",
 )
@@ -0,0 +1,62 @@
+import gzip
+import json
+from datetime import datetime, timezone
+import pytest
+from metric_aggregator_sdk import encoding
+from metric_aggregator_sdk.dto_models import AggregatorData, DeviceSnapshot
+from metric_aggregator_sdk.encoding import PayloadEncoder, to_columnar
+
+T0 = datetime(2026, 3, 31, 12, 0, tzinfo=timezone.utc)
+T1 = datetime(2026, 3, 31, 12, 1, tzinfo=timezone.utc)
+
+def batch() -> AggregatorData:
+    return AggregatorData(guid="guid", name="aggregator", device_snapshots=[
+        DeviceSnapshot(device_name="a", metrics={"cpu": 1, "ram": 2}, timestamp=T0),
+        DeviceSnapshot(device_name="a", metrics={"ram": 3}, timestamp=T1),
+        DeviceSnapshot(device_name="b", metrics={"disk": 4}, timestamp=T0),
+    ])
+
+def test_to_columnar():
+    assert to_columnar(batch()) == {
+        "guid": "guid",
+        "name": "aggregator",
+        "metric_names": ["cpu", "ram", "disk"],
+        "devices": [
+            {"device_name": "a", "timestamps": [T0.timestamp(), T1.timestamp()],
+             "metrics": [[0, [1.0, None]], [1, [2.0, 3.0]]]},
+            {"device_name": "b", "timestamps": [T0.timestamp()], "metrics": [[2, [4.0]]]},
+        ],
+    }
+
+def test_gzip_json():
+    body, headers = PayloadEncoder("json", "gzip").encode(batch())
+    assert headers == {"Content-Type": encoding.JSON, "Content-Encoding": "gzip"}
+    assert json.loads(gzip.decompress(body))["device_snapshots"][0]["metrics"] == {"cpu": 1, "ram": 2}
+
+def test_plain_overrides_the_settings():
+    encoder = PayloadEncoder("columnar", "gzip")
+    body, headers = encoder.encode(batch(), plain=True)
+    assert headers == {"Content-Type": encoding.JSON}
+    assert json.loads(body)["guid"] == "guid"
+    assert not encoder.is_plain
+
+def test_downgrade_to_plain_json():
+    encoder = PayloadEncoder("columnar", "gzip")
+    assert encoder.downgrade() is True
+    assert encoder.is_plain
+    assert encoder.encode(batch())[1] == {"Content-Type": encoding.JSON}
+    assert encoder.downgrade() is False
+
+def test_missing_libraries_fall_back(monkeypatch):
+    monkeypatch.setattr(encoding, "msgpack", None)
+    monkeypatch.setattr(encoding, "zstandard", None)
+    encoder = PayloadEncoder("msgpack", "zstd")
+    assert (encoder.format, encoder.compression) == ("json", "gzip")
+    _, headers = PayloadEncoder("columnar").encode(batch())
+    assert headers["Content-Type"] == encoding.COLUMNAR_JSON
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        PayloadEncoder("xml")
+    with pytest.raises(ValueError):
+        PayloadEncoder("json", "brotli")
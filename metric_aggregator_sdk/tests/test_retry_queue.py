@@ -0,0 +1,68 @@
+import os
+from datetime import datetime, timezone
+from metric_aggregator_sdk.dto_models import DeviceSnapshot
+from metric_aggregator_sdk.retry_queue import RetryQueue
+
+def snapshot(i: int) -> DeviceSnapshot:
+    return DeviceSnapshot(
+        device_name=f"device {i}",
+        metrics={"cpu": i},
+        timestamp=datetime(2026, 3, 31, 12, 0, i % 60, tzinfo=timezone.utc)
+    )
+
+def names(snapshots):
+    return [s.device_name for s in snapshots]
+
+def test_fifo_round_trip():
+    queue = RetryQueue()
+    queue.enqueue_many(snapshot(i) for i in range(3))
+    assert queue.size() == 3
+    assert queue.dequeue_all() == [snapshot(i) for i in range(3)]
+    assert queue.size() == 0 and queue.size_bytes() == 0
+
+def test_evicts_oldest_beyond_max_items():
+    queue = RetryQueue(max_items=3)
+    queue.enqueue_many(snapshot(i) for i in range(5))
+    assert queue.evicted == 2
+    assert names(queue.dequeue_all()) == ["device 2", "device 3", "device 4"]
+
+def test_evicts_oldest_beyond_max_bytes():
+    queue = RetryQueue()
+    queue.enqueue(snapshot(0))
+    size = queue.size_bytes()
+    queue.max_bytes = 2 * size
+    queue.enqueue_many([snapshot(1), snapshot(2)])
+    assert queue.size() == 2
+    assert names(queue.dequeue_all()) == ["device 1", "device 2"]
+
+def test_read_batch_and_delete():
+    queue = RetryQueue()
+    queue.enqueue_many(snapshot(i) for i in range(5))
+    size = queue.size_bytes() // 5
+    batch = queue.read_batch(max_items=4, max_bytes=size * 2)
+    assert names(s for _, s in batch) == ["device 0", "device 1"]
+    assert len(queue.read_batch(max_bytes=1)) == 1 # always at least one entry
+    queue.delete([entry_id for entry_id, _ in batch])
+    assert queue.size() == 3
+    assert names(s for _, s in queue.read_batch(max_items=1)) == ["device 2"]
+
+def test_recovers_backlog_after_restart(tmp_path):
+    path = str(tmp_path / "retry.db")
+    queue = RetryQueue(path)
+    queue.enqueue_many(snapshot(i) for i in range(3))
+    size_bytes = queue.size_bytes()
+    queue.close()
+    queue = RetryQueue(path)
+    assert (queue.size(), queue.size_bytes()) == (3, size_bytes)
+    assert names(queue.dequeue_all()) == ["device 0", "device 1", "device 2"]
+    queue.close()
+
+def test_corrupt_database_is_moved_aside(tmp_path):
+    path = tmp_path / "retry.db"
+    path.write_bytes(b"not a sqlite database" * 100)
+    queue = RetryQueue(str(path))
+    assert queue.size() == 0
+    queue.enqueue(snapshot(0))
+    assert queue.size() == 1
+    queue.close()
+    assert [name for name in os.listdir(tmp_path) if name.startswith("retry.db.corrupt-")]
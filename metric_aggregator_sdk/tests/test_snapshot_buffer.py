@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from metric_aggregator_sdk.dto_models import DeviceSnapshot
+from metric_aggregator_sdk.snapshot_buffer import AggregateBuffer, LatestBuffer, SeriesBuffer, make_buffer
+
+START = datetime(2026, 3, 31, 12, 0, tzinfo=timezone.utc)
+
+def snapshot(seconds: float, device: str = "device", **metrics) -> DeviceSnapshot:
+    return DeviceSnapshot(device_name=device, metrics=metrics, timestamp=START + timedelta(seconds=seconds))
+
+def test_latest_merges_per_device():
+    buffer = LatestBuffer()
+    buffer.add(snapshot(0, cpu=1, ram=2))
+    buffer.add(snapshot(1, cpu=3))
+    buffer.add(snapshot(0, device="other", cpu=5))
+    assert len(buffer) == 2
+    latest = {s.device_name: s for s in buffer.drain()}
+    assert latest["device"].metrics == {"cpu": 3, "ram": 2}
+    assert latest["device"].timestamp == START + timedelta(seconds=1)
+    assert len(buffer) == 0
+
+def test_series_keeps_every_sample():
+    buffer = SeriesBuffer()
+    buffer.add(snapshot(0, cpu=1))
+    buffer.add(snapshot(1, cpu=2, ram=7))
+    buffer.add(snapshot(2, ram=8))
+    assert len(buffer) == 3
+    snapshots = buffer.drain()
+    assert [s.metrics for s in snapshots] == [{"cpu": 1.0}, {"cpu": 2.0, "ram": 7.0}, {"ram": 8.0}]
+    assert [s.timestamp for s in snapshots] == [START + timedelta(seconds=s) for s in range(3)]
+    assert buffer.drain() == []
+
+def test_aggregate_summarizes_ended_windows():
+    buffer = AggregateBuffer(interval=60)
+    for seconds, value in ((0, 1), (20, 5), (40, 3)):
+        buffer.add(snapshot(seconds, cpu=value))
+    [window] = buffer.drain()
+    assert window.timestamp == START
+    assert window.metrics == {"cpu": 3.0, "cpu (min)": 1.0, "cpu (max)": 5.0, "cpu (count)": 3}
+    assert len(buffer) == 0
+
+def test_aggregate_keeps_the_current_window():
+    buffer = AggregateBuffer(interval=60)
+    buffer.add(DeviceSnapshot(device_name="device", metrics={"cpu": 1}))
+    assert buffer.drain() == []
+    assert len(buffer) == 1
+
+def test_make_buffer():
+    assert isinstance(make_buffer(), LatestBuffer)
+    assert make_buffer("aggregate", 10).interval == 10
+    with pytest.raises(ValueError):
+        make_buffer("everything")
+    with pytest.raises(ValueError):
+        make_buffer("aggregate", 0)
@@ -0,0 +1,107 @@
+import argparse
+import collections
+import itertools
+import logging
+import random
+import threading
+from command_queue import CommandQueue
+from benchmarks.common import Stopwatch
+
+"""
+    Microbenchmark of the in-memory command queue without a server: `--aggregators` aggregators
+    each hold `--pending` commands; every aggregator polls and acks them, sequentially and from
+    `--threads` concurrent threads. The previous single-deque queue is timed on a random sample of
+    `--sample` aggregators, since a full round of it is quadratic in the aggregator count.
+
+    python -m benchmarks.bench_command_queue --aggregators 10000 --pending 2 --threads 8
+"""
+
+_QUIET = logging.getLogger("bench_command_queue")
+_QUIET.disabled = True
+
+class LegacyCommandQueue:
+    """
+    The previous CommandQueue: one deque under one lock, scanned on every poll and rebuilt on every ack.
+    """
+    def __init__(self):
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+        self._id_counter = itertools.count(1)
+
+    def enqueue(self, cmd: dict) -> int:
+        with self.lock:
+            command_id = next(self._id_counter)
+            cmd["command_id"] = command_id
+            self.queue.append(cmd)
+            return command_id
+
+    def get_unacked_for_aggregator(self, aggregator_name: str):
+        with self.lock:
+            return [cmd for cmd in self.queue if cmd["aggregator_name"] == aggregator_name]
+
+    def ack(self, aggregator_name: str, command_ids: list):
+        with self.lock:
+            self.queue = collections.deque(
+                cmd for cmd in self.queue
+                if not (cmd["aggregator_name"] == aggregator_name and cmd["command_id"] in command_ids)
+            )
+
+def fill(queue, aggregators, pending):
+    for i in range(pending):
+        for a in aggregators:
+            queue.enqueue({"aggregator_name": a, "device_name": f"device {i}", "command": "restart"})
+
+def poll_and_ack(queue, aggregators):
+    for a in aggregators:
+        commands = queue.get_unacked_for_aggregator(a)
+        queue.ack(a, [cmd["command_id"] for cmd in commands])
+
+def threaded(queue, aggregators, threads):
+    chunks = [aggregators[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=poll_and_ack, args=(queue, chunk)) for chunk in chunks]
+    with Stopwatch() as sw:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    return sw.elapsed
+
+def run(name, make_queue, aggregators, polled, args):
+    queue = make_queue()
+    with Stopwatch() as enqueue:
+        fill(queue, aggregators, args.pending)
+    with Stopwatch() as idle:
+        for a in polled:
+            queue.get_unacked_for_aggregator(f"{a} (idle)")
+    with Stopwatch() as sequential:
+        poll_and_ack(queue, polled)
+
+    queue = make_queue()
+    fill(queue, aggregators, args.pending)
+    concurrent = threaded(queue, polled, args.threads)
+
+    per_op = lambda seconds, ops: seconds / ops * 1e6
+    print(f"{name:<22} {per_op(enqueue.elapsed, len(aggregators) * args.pending):>12.2f} "
+          f"{per_op(idle.elapsed, len(polled)):>12.2f} {per_op(sequential.elapsed, len(polled)):>14.2f} "
+          f"{per_op(concurrent, len(polled)):>14.2f}")
+    return per_op(sequential.elapsed, len(polled))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare command queue implementations")
+    parser.add_argument("--aggregators", type=int, default=10000)
+    parser.add_argument("--pending", type=int, default=2, help="Commands pending per aggregator")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent polling threads")
+    parser.add_argument("--sample", type=int, default=200, help="Aggregators polled with the previous queue")
+    args = parser.parse_args()
+
+    aggregators = [f"aggregator {a}" for a in range(args.aggregators)]
+    sample = random.sample(aggregators, min(args.sample, len(aggregators)))
+    print(f"{args.aggregators} aggregators x {args.pending} pending commands, {args.threads} threads "
+          f"(previous queue on {len(sample)} sampled aggregators)\n")
+    print(f"{'queue':<22} {'enqueue us':>12} {'idle poll us':>12} {'poll+ack us':>14} {'threaded us':>14}")
+    legacy = run("single deque (before)", LegacyCommandQueue, aggregators, sample, args)
+    indexed = run("per-aggregator", lambda: CommandQueue(logger=_QUIET), aggregators, aggregators, args)
+    print(f"\npoll+ack speedup: {legacy / indexed:.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import json
+import statistics
+from datetime import datetime, timedelta, timezone
+from payload_decoding import decode_snapshot_body
+from schemas import AggregatorIn
+from benchmarks.common import Stopwatch
+
+try:
+    from metric_aggregator_sdk.dto_models import AggregatorData, DeviceSnapshot
+    from metric_aggregator_sdk.encoding import PayloadEncoder, msgpack, zstandard
+except ImportError:
+    raise SystemExit("The encoding benchmark needs the SDK:  pip install -e ../metric_aggregator_sdk[msgpack,zstd]")
+
+"""
+    Upload encodings compared without a database: a synthetic batch of `--devices` devices with
+    `--samples` snapshots of `--metrics` metrics each is encoded by the SDK's PayloadEncoder in every
+    format/compression, then decoded by the server's payload_decoding into AggregatorIn.
+    Reports bytes on the wire, client encode time and server decode+validate time per snapshot.
+    The first row is the previous server path: json.loads followed by AggregatorIn validation.
+
+    python -m benchmarks.bench_encoding --devices 20 --samples 10 --metrics 20
+"""
+
+def make_batch(devices, samples, metrics) -> AggregatorData:
+    start = datetime.now(timezone.utc)
+    return AggregatorData(
+        guid="00000000-0000-0000-0000-000000000001",
+        name="bench aggregator",
+        device_snapshots=[
+            DeviceSnapshot(
+                device_name=f"bench device {d}",
+                metrics={f"bench metric {m}": round((d * 7 + s * 3 + m) * 1.37, 2) for m in range(metrics)},
+                timestamp=start + timedelta(seconds=s)
+            )
+            for d in range(devices)
+            for s in range(samples)
+        ]
+    )
+
+def median_us(fn, repeat, per):
+    samples = []
+    for _ in range(repeat):
+        with Stopwatch() as sw:
+            fn()
+        samples.append(sw.elapsed * 1e6 / per)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare snapshot upload encodings")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=10, help="Snapshots per device in the batch")
+    parser.add_argument("--metrics", type=int, default=20, help="Metrics per snapshot")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per encoding (median is reported)")
+    args = parser.parse_args()
+
+    batch = make_batch(args.devices, args.samples, args.metrics)
+    snapshots = len(batch.device_snapshots)
+    print(f"{snapshots} snapshots x {args.metrics} metrics; msgpack {'available' if msgpack else 'NOT installed'}, "
+          f"zstandard {'available' if zstandard else 'NOT installed'}\n")
+    print(f"{'encoding':<28} {'bytes/snap':>11} {'ratio':>7} {'encode us/snap':>15} {'decode us/snap':>15}")
+
+    baseline_encoder = PayloadEncoder("json", "identity")
+    baseline_body, _ = baseline_encoder.encode(batch)
+    baseline_bytes = len(baseline_body) / snapshots
+    legacy_decode = median_us(lambda: AggregatorIn.model_validate(json.loads(baseline_body)), args.repeat, snapshots)
+    print(f"{'json (before, json.loads)':<28} {baseline_bytes:>11.1f} {1:>6.2f}x {'-':>15} {legacy_decode:>15.2f}")
+
+    expected = AggregatorIn.model_validate(json.loads(baseline_body))
+    for format in ("json", "msgpack", "columnar"):
+        for compression in ("identity", "gzip", "zstd"):
+            if (format == "msgpack" and msgpack is None) or (compression == "zstd" and zstandard is None):
+                continue
+            encoder = PayloadEncoder(format, compression)
+            body, headers = encoder.encode(batch)
+            decode = lambda: decode_snapshot_body(body, headers["Content-Type"], headers.get("Content-Encoding"))
+            decoded = decode()
+            if len(decoded.device_snapshots) != len(expected.device_snapshots):
+                raise SystemExit(f"{format}/{compression} decoded {len(decoded.device_snapshots)} snapshots")
+            label = f"{encoder.format}/{encoder.compression}"
+            print(f"{label:<28} {len(body) / snapshots:>11.1f} {baseline_bytes * snapshots / len(body):>6.2f}x "
+                  f"{median_us(lambda: encoder.encode(batch), args.repeat, snapshots):>15.2f} "
+                  f"{median_us(decode, args.repeat, snapshots):>15.2f}")
+
+if __name__ == "__main__":
+    main()
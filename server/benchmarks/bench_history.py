@@ -0,0 +1,92 @@
+import statistics
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from database.ingest import SnapshotIngestor
+from database.layouts import LAYOUTS
+from database.history import history_sql
+from database.rollups import RollupStore
+from benchmarks.common import base_parser, setup_database, make_payloads, cleanup, Stopwatch, BENCH_PREFIX
+
+"""
+    End-to-end latency of /api/metrics/history's database work: the previous four round trips
+    (metric lookup, COUNT, OFFSET page, avg/max) against the single statement of database/history.py,
+    for the first page and a deep page, with and without rollups for the totals.
+
+    python -m benchmarks.bench_history --snapshots 50000 --metrics 10
+"""
+
+def legacy_history(db, source_sql, metric_name, start_time, offset, limit):
+    metric_def_id = db.execute(
+        text("SELECT metric_def_id FROM metric_definitions WHERE metric_name = :n"), {"n": metric_name}
+    ).scalar()
+    params = {"metric_def_id": metric_def_id, "start_time": start_time}
+    source = f"({source_sql}) m"
+    db.execute(text(f"SELECT count(*) FROM {source} WHERE m.snapshot_time >= :start_time"), params).scalar()
+    db.execute(text(
+        f"SELECT m.metric_value, m.snapshot_time FROM {source} WHERE m.snapshot_time >= :start_time "
+        f"ORDER BY m.snapshot_time DESC OFFSET :offset LIMIT :limit"
+    ), {**params, "offset": offset, "limit": limit}).all()
+    db.execute(text(
+        f"SELECT avg(m.metric_value), max(m.metric_value) FROM {source} WHERE m.snapshot_time >= :start_time"
+    ), params).first()
+
+def single_history(db, sql, params, offset, limit):
+    db.execute(text(sql), {**params, "offset": offset, "limit": limit + 1}).all()
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        with Stopwatch() as sw:
+            fn()
+        samples.append(sw.elapsed * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = base_parser("Compare the multi-query and single-statement history paths")
+    parser.add_argument("--snapshots", type=int, default=50_000, help="Device snapshots to seed")
+    parser.add_argument("--devices", type=int, default=50, help="Devices per payload")
+    parser.add_argument("--metrics", type=int, default=10, help="Metrics per snapshot")
+    parser.add_argument("--layout", choices=list(LAYOUTS), default="narrow", help="Storage layout to seed")
+    parser.add_argument("--page-size", type=int, default=10, help="Rows per page")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per case (median is reported)")
+    args = parser.parse_args()
+
+    session_factory = setup_database()
+    db = session_factory()
+    try:
+        layout = LAYOUTS[args.layout]()
+        rollups = RollupStore()
+        requests = max(1, args.snapshots // args.devices)
+        start = datetime.now(timezone.utc) - timedelta(days=6, hours=23)
+        ingestor = SnapshotIngestor(layout=layout, rollups=rollups)
+        for payload in make_payloads(requests, args.devices, args.metrics, start=start,
+                                     step_seconds=6.5 * 86_400 / requests):
+            ingestor.ingest(db, [payload])
+
+        metric_name = f"{BENCH_PREFIX} metric 0"
+        start_time = datetime.now(timezone.utc) - timedelta(days=7)
+        params = {"metric_name": metric_name, "start_time": start_time}
+        deep_offset = (args.snapshots // 2 // args.page_size) * args.page_size
+
+        print(f"{args.snapshots} snapshots, {args.layout} layout\n")
+        print(f"{'case':<34} {'first page ms':>14} {'deep page ms':>14}")
+        cases = [
+            ("4 round trips (previous)",
+             lambda off: legacy_history(db, layout.metric_source_sql(), metric_name, start_time, off, args.page_size)),
+            ("single statement",
+             lambda off: single_history(db, history_sql(layout, None, "desc"), params, off, args.page_size)),
+            ("single statement + rollup totals",
+             lambda off: single_history(db, history_sql(layout, rollups, "desc"),
+                                        {**params, **rollups.window_params(start_time)}, off, args.page_size)),
+        ]
+        for label, run in cases:
+            first = median_ms(lambda: run(0), args.repeat)
+            deep = median_ms(lambda: run(deep_offset), args.repeat)
+            print(f"{label:<34} {first:>14.2f} {deep:>14.2f}")
+    finally:
+        if not args.keep:
+            cleanup(db)
+        db.close()
+
+if __name__ == "__main__":
+    main()
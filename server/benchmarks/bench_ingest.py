@@ -0,0 +1,99 @@
+from database.ingest import SnapshotIngestor
+from database.models_ex import (
+    AggregatorEx,
+    DeviceEx,
+    DeviceSnapshotEx,
+    MetricDefinitionEx,
+    MetricValueEx,
+    MetricDisplayConfigEx
+)
+from benchmarks.common import base_parser, setup_database, make_payloads, cleanup, Stopwatch
+
+"""
+    Compares the original ORM unit-of-work ingest with the set-based SnapshotIngestor.
+    Reports rows (snapshots + metric values) written per second.
+
+    python -m benchmarks.bench_ingest --devices 300 --metrics 20 --requests 10
+"""
+
+def legacy_orm_ingest(db, agg_in):
+    """
+    The pre-bulk implementation of POST /api/snapshots, kept here as the baseline.
+    """
+    aggregator = db.query(AggregatorEx).filter_by(guid=agg_in.guid).first()
+    if not aggregator:
+        aggregator = AggregatorEx(guid=agg_in.guid, name=agg_in.name)
+        db.add(aggregator)
+        db.flush()
+    else:
+        aggregator.name = agg_in.name
+
+    device_names = {ds_in.device_name for ds_in in agg_in.device_snapshots}
+    device_map = {
+        dev.name: dev for dev in db.query(DeviceEx)
+        .filter(DeviceEx.aggregator_id == aggregator.aggregator_id)
+        .filter(DeviceEx.name.in_(device_names))
+    }
+    for dev_name in device_names - device_map.keys():
+        device_map[dev_name] = DeviceEx(aggregator_id=aggregator.aggregator_id, name=dev_name)
+        db.add(device_map[dev_name])
+
+    metric_names = {m for ds_in in agg_in.device_snapshots for m in ds_in.metrics}
+    metricdef_map = {
+        m.metric_name: m for m in db.query(MetricDefinitionEx)
+        .filter(MetricDefinitionEx.metric_name.in_(metric_names))
+    }
+    new_mdefs = []
+    for name in metric_names - metricdef_map.keys():
+        metricdef_map[name] = MetricDefinitionEx(metric_name=name)
+        db.add(metricdef_map[name])
+        new_mdefs.append(metricdef_map[name])
+    db.flush()
+
+    for md_obj in new_mdefs:
+        db.add(MetricDisplayConfigEx(metric_def_id=md_obj.metric_def_id))
+    db.flush()
+
+    for ds_in in agg_in.device_snapshots:
+        snapshot = DeviceSnapshotEx(device_id=device_map[ds_in.device_name].device_id, snapshot_time=ds_in.timestamp)
+        db.add(snapshot)
+        for metric_name, metric_val in ds_in.metrics.items():
+            mv = MetricValueEx(metric_def_id=metricdef_map[metric_name].metric_def_id, metric_value=metric_val)
+            mv.device_snapshot = snapshot
+            db.add(mv)
+    db.commit()
+
+def run(label, session_factory, payloads, ingest_one):
+    rows = sum(len(p.device_snapshots) + sum(len(ds.metrics) for ds in p.device_snapshots) for p in payloads)
+    db = session_factory()
+    try:
+        with Stopwatch() as sw:
+            for payload in payloads:
+                ingest_one(db, payload)
+    finally:
+        db.close()
+    print(f"{label:<10} {len(payloads):>5} requests {rows:>9} rows {sw.elapsed:>8.2f}s {rows / sw.elapsed:>12,.0f} rows/s")
+
+def main():
+    parser = base_parser("Benchmark POST /api/snapshots ingest paths")
+    parser.add_argument("--devices", type=int, default=300, help="Devices per aggregator payload")
+    parser.add_argument("--metrics", type=int, default=20, help="Metrics per device snapshot")
+    parser.add_argument("--requests", type=int, default=10, help="Payloads per run")
+    args = parser.parse_args()
+
+    session_factory = setup_database()
+    ingestor = SnapshotIngestor()
+
+    try:
+        # The first payload of each run creates devices/definitions; the rest exercise steady state.
+        run("orm", session_factory, make_payloads(args.requests, args.devices, args.metrics), legacy_orm_ingest)
+        run("bulk", session_factory, make_payloads(args.requests, args.devices, args.metrics),
+            lambda db, p: ingestor.ingest(db, [p]))
+    finally:
+        if not args.keep:
+            db = session_factory()
+            cleanup(db)
+            db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import statistics
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from database.db import get_engine
+from database.ingest import SnapshotIngestor
+from database.layouts import NarrowLayout, WideLayout
+from database.layout_migrate import migrate_layout
+from benchmarks.common import base_parser, setup_database, make_payloads, cleanup, Stopwatch, BENCH_PREFIX
+
+"""
+    Storage size and query speed of the narrow vs wide snapshot layouts.
+    Seeds the narrow layout, copies it into the wide one, then compares table+index sizes and
+    the history/overview queries of both layouts. Run it against a scratch database: sizes are
+    whole-table sizes, so pre-existing rows are included.
+
+    python -m benchmarks.bench_layouts --snapshots 20000 --metrics 20
+"""
+
+def time_query(db, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        with Stopwatch() as sw:
+            db.execute(text(sql), params).fetchall()
+        samples.append(sw.elapsed * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = base_parser("Compare narrow and wide storage layouts")
+    parser.add_argument("--snapshots", type=int, default=20_000, help="Device snapshots to seed")
+    parser.add_argument("--devices", type=int, default=50, help="Devices per payload")
+    parser.add_argument("--metrics", type=int, default=20, help="Metrics per snapshot")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per query (median is reported)")
+    args = parser.parse_args()
+
+    session_factory = setup_database()
+    engine = get_engine()
+    db = session_factory()
+    try:
+        requests = max(1, args.snapshots // args.devices)
+        start = datetime.now(timezone.utc) - timedelta(hours=23)
+        ingestor = SnapshotIngestor(layout=NarrowLayout())
+        for payload in make_payloads(requests, args.devices, args.metrics, start=start,
+                                     step_seconds=82_800 / requests):
+            ingestor.ingest(db, [payload])
+        migrate_layout(engine, "wide")
+
+        print(f"{'table':<26} {'total size':>12} {'rows':>12}")
+        for table in ("metric_values", "device_snapshot_metrics"):
+            size, rows = db.execute(text(
+                f"SELECT pg_size_pretty(pg_total_relation_size('{table}')), (SELECT count(*) FROM {table})"
+            )).one()
+            print(f"{table:<26} {size:>12} {rows:>12}")
+
+        metric_def_id = db.execute(
+            text("SELECT metric_def_id FROM metric_definitions WHERE metric_name = :n"),
+            {"n": f"{BENCH_PREFIX} metric 0"}
+        ).scalar()
+        params = {"metric_def_id": metric_def_id, "start_time": start, "glimit": 10}
+
+        print(f"\n{'query':<20} {'narrow ms':>10} {'wide ms':>10}")
+        for label, build in (
+            ("history stats", lambda l: f"SELECT count(*), avg(m.metric_value), max(m.metric_value) "
+                                        f"FROM ({l.metric_source_sql()}) m WHERE m.snapshot_time >= :start_time"),
+            ("history page", lambda l: f"SELECT m.snapshot_time, m.metric_value FROM ({l.metric_source_sql()}) m "
+                                       f"WHERE m.snapshot_time >= :start_time ORDER BY m.snapshot_time DESC LIMIT 10"),
+            ("overview", lambda l: l.overview_sql()),
+        ):
+            timings = []
+            for layout in (NarrowLayout(), WideLayout()):
+                try:
+                    timings.append(f"{time_query(db, build(layout), params, args.repeat):>10.2f}")
+                except Exception as e:  # get_overview() is not created by the migrations
+                    db.rollback()
+                    timings.append(f"{'n/a':>10}")
+                    print(f"  ({layout.name} {label} skipped: {type(e).__name__})")
+            print(f"{label:<20} {timings[0]} {timings[1]}")
+    finally:
+        if not args.keep:
+            cleanup(db)
+        db.close()
+
+if __name__ == "__main__":
+    main()
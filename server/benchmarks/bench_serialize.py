@@ -0,0 +1,124 @@
+import argparse
+import json
+import statistics
+from datetime import datetime, timedelta, timezone
+from fastapi.encoders import jsonable_encoder
+from serializers import TimestampFormatter, serialize_overview, orjson
+from utils import format_timestamp
+from benchmarks.common import Stopwatch
+
+"""
+    Microbenchmark of the /api/overview response path without a database: synthetic overview rows
+    are nested and encoded by the previous dict builder + jsonable_encoder + json.dumps (what the
+    route and FastAPI did before) and by serializers.serialize_overview.
+
+    python -m benchmarks.bench_serialize --aggregators 50 --devices 20 --metrics 10 --graph-limit 10
+"""
+
+_COLUMNS = ("aggregator_id", "aggregator_name", "device_id", "device_name", "snapshot_time",
+            "metric_def_id", "metric_name", "metric_value", "display_type")
+_INDEX = {name: i for i, name in enumerate(_COLUMNS)}
+
+class _Row(tuple):
+    """
+    Stand-in for a SQLAlchemy row: positional and legacy string-key access.
+    """
+    def __getitem__(self, key):
+        return tuple.__getitem__(self, _INDEX[key] if isinstance(key, str) else key)
+
+def make_rows(aggregators, devices, metrics, graph_limit):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    rows = []
+    for a in range(aggregators):
+        for d in range(devices):
+            device_id = a * devices + d
+            for m in range(metrics):
+                graph = m % 2 == 0
+                for p in range(graph_limit if graph else 1):
+                    rows.append(_Row((
+                        a, f"aggregator {a}", device_id, f"device {d}",
+                        now - timedelta(seconds=10 * p), m, f"metric {m}",
+                        (a + d + m + p) * 1.2345, "graph" if graph else "row"
+                    )))
+    return rows
+
+def legacy_overview(rows) -> bytes:
+    """
+    The route's previous builder, followed by FastAPI's default response encoding.
+    """
+    aggregator_map = {}
+    for r in rows:
+        agg_id = r["aggregator_id"]
+        dev_id = r["device_id"]
+        snap_time = r["snapshot_time"]
+        metric_def_id = r["metric_def_id"]
+
+        if agg_id not in aggregator_map:
+            aggregator_map[agg_id] = {"aggregatorId": agg_id, "aggregatorName": r["aggregator_name"], "devices": {}}
+        dev_map = aggregator_map[agg_id]["devices"]
+        if dev_id not in dev_map:
+            dev_map[dev_id] = {"deviceId": dev_id, "deviceName": r["device_name"], "lastUpdated": None, "metrics": {}}
+        if snap_time is not None:
+            device_info = dev_map[dev_id]
+            if device_info["lastUpdated"] is None or snap_time > device_info["lastUpdated"]:
+                device_info["lastUpdated"] = snap_time
+        metric_map = dev_map[dev_id]["metrics"]
+        if metric_def_id not in metric_map:
+            metric_map[metric_def_id] = {"metricName": r["metric_name"], "displayType": r["display_type"], "data": []}
+        metric_map[metric_def_id]["data"].append({
+            "time": format_timestamp(snap_time) if snap_time else None,
+            "value": round(r["metric_value"], 1)
+        })
+
+    result = []
+    for agg_id, agg_info in aggregator_map.items():
+        device_list = []
+        for dev_id, dev_info in agg_info["devices"].items():
+            metric_list = [
+                {"metricName": m["metricName"], "displayType": m["displayType"], "data": m["data"]}
+                for m in dev_info["metrics"].values()
+            ]
+            device_list.append({
+                "deviceId": dev_info["deviceId"],
+                "deviceName": dev_info["deviceName"],
+                "lastUpdated": format_timestamp(dev_info["lastUpdated"]) if dev_info["lastUpdated"] else None,
+                "metrics": metric_list
+            })
+        result.append({"aggregatorId": agg_id, "aggregatorName": agg_info["aggregatorName"], "devices": device_list})
+
+    return json.dumps(jsonable_encoder(result), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        with Stopwatch() as sw:
+            fn()
+        samples.append(sw.elapsed * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare overview serialization paths")
+    parser.add_argument("--aggregators", type=int, default=50)
+    parser.add_argument("--devices", type=int, default=20, help="Devices per aggregator")
+    parser.add_argument("--metrics", type=int, default=10, help="Metrics per device (half of them 'graph')")
+    parser.add_argument("--graph-limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per path (median is reported)")
+    args = parser.parse_args()
+
+    rows = make_rows(args.aggregators, args.devices, args.metrics, args.graph_limit)
+    if json.loads(legacy_overview(rows)) != json.loads(serialize_overview(rows)):
+        raise SystemExit("Serializers disagree on the output")
+
+    print(f"{len(rows)} rows, orjson {'available' if orjson is not None else 'NOT installed (stdlib json fallback)'}\n")
+    legacy = median_ms(lambda: legacy_overview(rows), args.repeat)
+    fresh = median_ms(lambda: serialize_overview(rows, TimestampFormatter()), args.repeat)
+    warm = TimestampFormatter()
+    warm_ms = median_ms(lambda: serialize_overview(rows, warm), args.repeat)
+    print(f"{'path':<40} {'median ms':>10} {'speedup':>8}")
+    print(f"{'dict builder + jsonable_encoder (before)':<40} {legacy:>10.2f} {1:>7.1f}x")
+    print(f"{'serialize_overview, cold timestamps':<40} {fresh:>10.2f} {legacy / fresh:>7.1f}x")
+    print(f"{'serialize_overview, warm timestamps':<40} {warm_ms:>10.2f} {legacy / warm_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from config.config import Config
+from database.db import init_db, get_engine, new_session
+from database.migrate import run_migrations
+from schemas import AggregatorIn, DeviceSnapshotIn
+
+"""
+    Shared helpers for the benchmark scripts.
+    Benchmarks run against the database in DATABASE_URL (use a local Postgres, never production)
+    and are started from the server/ directory, e.g.:  python -m benchmarks.bench_ingest
+"""
+
+BENCH_PREFIX = "bench"
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--keep", action="store_true", help="Keep the generated rows after the run")
+    return parser
+
+def setup_database():
+    """
+    Initialises the global engine from DATABASE_URL and applies pending migrations.
+    """
+    init_db(Config().db_url)
+    run_migrations(get_engine())
+    return new_session
+
+def make_payloads(requests: int, devices: int, metrics: int, aggregators: int = 1,
+                  start: datetime = None, step_seconds: float = 1.0):
+    """
+    Builds `requests` synthetic AggregatorIn payloads spread round-robin over `aggregators` aggregators,
+    each with `devices` device snapshots of `metrics` metrics. Timestamps advance by `step_seconds`.
+    """
+    start = start or datetime.now(timezone.utc)
+    guids = [str(uuid.uuid4()) for _ in range(aggregators)]
+    payloads = []
+    for i in range(requests):
+        a = i % aggregators
+        snapshots = [
+            DeviceSnapshotIn(
+                device_name=f"{BENCH_PREFIX} device {d}",
+                timestamp=start + timedelta(seconds=step_seconds * (i // aggregators)),
+                metrics={f"{BENCH_PREFIX} metric {m}": float((i + d + m) % 100) for m in range(metrics)}
+            )
+            for d in range(devices)
+        ]
+        payloads.append(AggregatorIn(
+            guid=guids[a],
+            name=f"{BENCH_PREFIX} aggregator {a}",
+            device_snapshots=snapshots
+        ))
+    return payloads
+
+def cleanup(db):
+    """
+    Removes every aggregator and metric definition created by a benchmark (cascades to child rows;
+    snapshot values follow their snapshots through the trigger from migration 0010).
+    """
+    db.execute(text("DELETE FROM aggregators WHERE name LIKE :p"), {"p": f"{BENCH_PREFIX} %"})
+    db.execute(text("DELETE FROM metric_definitions WHERE metric_name LIKE :p"), {"p": f"{BENCH_PREFIX} %"})
+    db.commit()
+
+class Stopwatch:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
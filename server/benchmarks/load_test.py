@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+try:
+    import httpx
+except ImportError:
+    raise SystemExit("The load test needs httpx:  pip install httpx")
+from benchmarks.common import BENCH_PREFIX
+
+"""
+    HTTP load test of a running server: `--aggregators` simulated aggregators each POST a snapshot
+    every `--interval` seconds for `--duration` seconds, optionally alongside dashboard readers
+    polling /api/overview and /api/metrics/history. Reports throughput, latency percentiles and
+    errors per endpoint.
+
+    Compare sync and async mode by running the server twice (database_config.mode = "sync" / "async")
+    against the same scratch database, e.g.:
+      python -m benchmarks.load_test --url http://localhost:8000 --aggregators 500 --readers 20
+    Rows created here are named 'bench ...'; benchmarks.common.cleanup removes them.
+"""
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name: str, elapsed: float, ok: bool):
+        self.latencies.setdefault(name, []).append(elapsed * 1000)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, duration: float):
+        print(f"{'endpoint':<18} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, samples in sorted(self.latencies.items()):
+            samples.sort()
+            pct = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))]
+            print(f"{name:<18} {len(samples):>9} {len(samples) / duration:>8.1f} "
+                  f"{statistics.median(samples):>8.1f} {pct(0.95):>8.1f} {pct(0.99):>8.1f} "
+                  f"{self.errors.get(name, 0):>7}")
+
+async def timed(recorder: Recorder, name: str, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+        ok = response.status_code < 400 or response.status_code == 429
+    except httpx.HTTPError:
+        ok = False
+    recorder.record(name, time.perf_counter() - start, ok)
+
+async def aggregator(client, recorder, index, args, deadline):
+    guid = str(uuid.uuid4())
+    # Spread the first posts over one interval so the aggregators do not fire in lockstep.
+    await asyncio.sleep(args.interval * index / args.aggregators)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        payload = {
+            "guid": guid,
+            "name": f"{BENCH_PREFIX} aggregator {index}",
+            "device_snapshots": [
+                {
+                    "device_name": f"{BENCH_PREFIX} device {d}",
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "metrics": {f"{BENCH_PREFIX} metric {m}": float((index + d + m) % 100) for m in range(args.metrics)}
+                }
+                for d in range(args.devices)
+            ]
+        }
+        await timed(recorder, "POST snapshots", client.post("/api/snapshots", json=payload))
+        await asyncio.sleep(max(0.0, args.interval - (time.perf_counter() - started)))
+
+async def reader(client, recorder, args, deadline):
+    while time.perf_counter() < deadline:
+        await timed(recorder, "GET overview", client.get("/api/overview", params={"graph_limit": 10}))
+        await timed(recorder, "GET history", client.get(
+            "/api/metrics/history", params={"metric_name": f"{BENCH_PREFIX} metric 0", "page_size": 10}
+        ))
+        await asyncio.sleep(args.reader_interval)
+
+async def run(args):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.aggregators + args.readers)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(
+            *(aggregator(client, recorder, i, args, deadline) for i in range(args.aggregators)),
+            *(reader(client, recorder, args, deadline) for _ in range(args.readers)),
+        )
+    print(f"{args.aggregators} aggregators x {args.devices} devices x {args.metrics} metrics, "
+          f"{args.readers} readers, {args.duration:.0f}s against {args.url}\n")
+    recorder.report(args.duration)
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent aggregator/dashboard load test")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--aggregators", type=int, default=500, help="Concurrent simulated aggregators")
+    parser.add_argument("--devices", type=int, default=5, help="Devices per aggregator")
+    parser.add_argument("--metrics", type=int, default=10, help="Metrics per device")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between posts per aggregator")
+    parser.add_argument("--readers", type=int, default=0, help="Concurrent dashboard readers")
+    parser.add_argument("--reader-interval", type=float, default=1.0, help="Seconds between reader polls")
+    parser.add_argument("--duration", type=float, default=60.0, help="Test length in seconds")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
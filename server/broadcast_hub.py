@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+from schemas import AggregatorIn
+from utils import format_timestamp
+
+def snapshot_events(payloads: List[AggregatorIn]) -> List[dict]:
+    """
+    One stream event per device snapshot of the ingested payloads.
+    """
+    return [
+        {
+            "aggregatorName": agg_in.name,
+            "deviceName": ds_in.device_name,
+            "time": format_timestamp(ds_in.timestamp),
+            "metrics": {name: float(value) for name, value in ds_in.metrics.items()},
+        }
+        for agg_in in payloads
+        for ds_in in agg_in.device_snapshots
+    ]
+
+
+class Subscription:
+    """
+    One live-stream subscriber. Pending updates are held per (aggregator, device) and coalesced:
+    a newer snapshot of a device already waiting is merged into it (newest values win), so a slow
+    consumer sees the latest state rather than a backlog. At most `buffer_size` devices are held;
+    beyond that the oldest pending update is dropped.
+    Only touched from the event loop thread.
+    """
+    def __init__(self, aggregator: Optional[str], device: Optional[str], buffer_size: int):
+        self.aggregator = aggregator
+        self.device = device
+        self.buffer_size = buffer_size
+        self.dropped = 0
+        self.coalesced = 0
+        self._pending = OrderedDict() # (aggregator, device) -> event
+        self._ready = asyncio.Event()
+
+    def matches(self, event: dict) -> bool:
+        return ((self.aggregator is None or event["aggregatorName"] == self.aggregator)
+                and (self.device is None or event["deviceName"] == self.device))
+
+    def push(self, event: dict):
+        key = (event["aggregatorName"], event["deviceName"])
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending["metrics"].update(event["metrics"])
+            pending["time"] = event["time"]
+            self.coalesced += 1
+        else:
+            if len(self._pending) >= self.buffer_size:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[key] = {**event, "metrics": dict(event["metrics"])}
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[dict]:
+        """
+        Wait up to `timeout` seconds for updates and take everything pending ([] on timeout).
+        """
+        if not self._pending:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        batch = list(self._pending.values())
+        self._pending.clear()
+        return batch
+
+
+class BroadcastHub:
+    """
+    In-process fan-out of freshly committed snapshots to live-stream subscribers.
+
+    Registered as an ingest listener, it turns the committed payloads into one event per device
+    snapshot ({aggregatorName, deviceName, time, metrics}) without touching the database, and
+    hands them to the event loop, where every matching subscription buffers them.
+    """
+    def __init__(self, buffer_size: int = 100, logger: Optional[logging.Logger] = None):
+        self.buffer_size = buffer_size
+        self.logger = logger or logging.getLogger(__name__)
+        self._loop = None
+        self._subscriptions = set()
+        self._stats_lock = threading.Lock()
+        self._stats = {"published": 0, "delivered": 0}
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """
+        Bind the hub to the server's event loop (called on startup).
+        """
+        self._loop = loop
+
+    def subscribe(self, aggregator: Optional[str] = None, device: Optional[str] = None) -> Subscription:
+        subscription = Subscription(aggregator, device, self.buffer_size)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, payloads: List[AggregatorIn], *_):
+        """
+        Ingest listener; may be called from any thread.
+        """
+        if self._loop is None or not self._subscriptions:
+            return
+        self.publish_events(snapshot_events(payloads))
+
+    def publish_events(self, events: List[dict]):
+        """
+        Fan out already built events, e.g. relayed from another worker; may be called from any thread.
+        """
+        if self._loop is None or not self._subscriptions or not events:
+            return
+        with self._stats_lock:
+            self._stats["published"] += len(events)
+        try:
+            self._loop.call_soon_threadsafe(self._fan_out, events)
+        except RuntimeError:
+            pass # loop already closed during shutdown
+
+    def _fan_out(self, events: List[dict]):
+        delivered = 0
+        for subscription in list(self._subscriptions):
+            for event in events:
+                if subscription.matches(event):
+                    subscription.push(event)
+                    delivered += 1
+        with self._stats_lock:
+            self._stats["delivered"] += delivered
+
+    def stats(self) -> dict:
+        subscriptions = list(self._subscriptions)
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["subscribers"] = len(subscriptions)
+        stats["dropped"] = sum(s.dropped for s in subscriptions)
+        stats["coalesced"] = sum(s.coalesced for s in subscriptions)
+        return stats
+
+
+_hub = None # Global broadcast hub, None when stream_config.enabled is false
+
+def init_broadcast_hub(stream_config, ingestor, logger: logging.Logger = None) -> Optional[BroadcastHub]:
+    """
+    Called once at application startup, after init_ingestor(...). The hub still needs
+    attach(loop) from a startup handler before it delivers anything.
+    """
+    global _hub
+    if _hub is None and stream_config.enabled:
+        _hub = BroadcastHub(buffer_size=stream_config.buffer_size, logger=logger)
+        ingestor.add_listener(_hub.publish)
+    return _hub
+
+def get_broadcast_hub() -> Optional[BroadcastHub]:
+    """
+    FastAPI dependency: the broadcast hub, or None when live streaming is disabled.
+    """
+    return _hub
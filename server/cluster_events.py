@@ -0,0 +1,160 @@
+import json
+import logging
+import select
+import threading
+import uuid
+from typing import List, Optional
+from sqlalchemy import text
+from broadcast_hub import BroadcastHub, snapshot_events
+from response_cache import ResponseCache
+from database.commands import COMMANDS_CHANNEL
+
+"""
+    Ingest notifications between worker processes (server_config.workers > 1).
+    The response cache and the live stream only hear about snapshots ingested by their own process;
+    with several workers, every ingest is also sent on a Postgres NOTIFY channel and each worker
+    LISTENs on it, invalidating its cache and relaying the stream events to its own subscribers.
+    The same connection LISTENs on the command channel of database/commands.py, waking the
+    long-polls of the aggregator a command was queued for in whichever worker holds them.
+"""
+
+CHANNEL = "deepmetrics_ingest"
+MAX_PAYLOAD = 7900 # NOTIFY payloads are limited to 8000 bytes
+
+class ClusterEvents(threading.Thread):
+    def __init__(
+        self,
+        engine,
+        cache: Optional[ResponseCache] = None,
+        hub: Optional[BroadcastHub] = None,
+        commands=None,
+        poll_interval: float = 1.0,
+        logger: Optional[logging.Logger] = None
+    ):
+        super().__init__(name="ClusterEvents", daemon=True)
+        self.engine = engine
+        self.cache = cache
+        self.hub = hub
+        self.commands = commands
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.origin = uuid.uuid4().hex # tells this worker's own notifications apart
+        self._stop_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {"sent": 0, "received": 0, "truncated": 0, "reconnects": 0}
+
+    def messages(self, events: List[dict]) -> List[str]:
+        """
+        NOTIFY payloads for one ingest: the events split into chunks below MAX_PAYLOAD.
+        An event too large on its own is left out (the receivers still invalidate their cache).
+        """
+        messages, chunk = [], []
+        empty = len(json.dumps({"o": self.origin, "e": []}))
+        size = empty
+        for event in events:
+            encoded = len(json.dumps(event)) + 1
+            if empty + encoded > MAX_PAYLOAD:
+                with self._stats_lock:
+                    self._stats["truncated"] += 1
+                continue
+            if size + encoded > MAX_PAYLOAD:
+                messages.append(json.dumps({"o": self.origin, "e": chunk}))
+                chunk, size = [], empty
+            chunk.append(event)
+            size += encoded
+        if chunk or not messages:
+            messages.append(json.dumps({"o": self.origin, "e": chunk}))
+        return messages
+
+    def publish(self, payloads, *_):
+        """
+        Ingest listener: notify the other workers.
+        """
+        events = snapshot_events(payloads) if self.hub is not None else []
+        messages = self.messages(events)
+        try:
+            with self.engine.connect() as conn:
+                for message in messages:
+                    conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": message})
+                conn.commit()
+        except Exception as e:
+            self.logger.error("[ClusterEvents] Failed to notify other workers: %s", e)
+            return
+        with self._stats_lock:
+            self._stats["sent"] += len(messages)
+
+    def receive(self, payload: str):
+        message = json.loads(payload)
+        if message["o"] == self.origin:
+            return
+        with self._stats_lock:
+            self._stats["received"] += 1
+        if self.cache is not None:
+            self.cache.bump()
+        if self.hub is not None:
+            self.hub.publish_events(message["e"])
+
+    def run(self):
+        self.logger.info("[ClusterEvents] Listening on channel '%s'", CHANNEL)
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                self.logger.error("[ClusterEvents] Listener connection failed, reconnecting: %s", e)
+                with self._stats_lock:
+                    self._stats["reconnects"] += 1
+                # Notifications missed while disconnected may hide ingests, so drop cached responses.
+                if self.cache is not None:
+                    self.cache.bump()
+                self._stop_event.wait(self.poll_interval)
+
+    def _listen(self):
+        # A dedicated connection outside the pool, held for as long as it stays healthy.
+        connection = self.engine.raw_connection()
+        connection.detach()
+        dbapi_connection = connection.connection
+        try:
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+                cursor.execute(f"LISTEN {COMMANDS_CHANNEL}")
+            while not self._stop_event.is_set():
+                if select.select([dbapi_connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notify = dbapi_connection.notifies.pop(0)
+                    if notify.channel == COMMANDS_CHANNEL:
+                        if self.commands is not None:
+                            self.commands.waiters.notify(notify.payload)
+                    else:
+                        self.receive(notify.payload)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+_cluster_events = None # Global cluster notifier, None with a single worker
+
+def init_cluster_events(server_config, engine, ingestor, cache=None, hub=None, commands=None,
+                        logger: logging.Logger = None) -> Optional[ClusterEvents]:
+    """
+    Called once at application startup, after the response cache, broadcast hub and command store.
+    Only runs when server_config.workers is above 1.
+    """
+    global _cluster_events
+    if _cluster_events is None and server_config.workers > 1:
+        _cluster_events = ClusterEvents(engine, cache=cache, hub=hub, commands=commands, logger=logger)
+        ingestor.add_listener(_cluster_events.publish)
+        _cluster_events.start()
+    return _cluster_events
+
+def get_cluster_events() -> Optional[ClusterEvents]:
+    return _cluster_events
@@ -1,51 +1,207 @@
+import asyncio
 import collections
 import threading
 import logging
 import itertools
+from typing import Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+
+class CommandWaiters:
+    """
+    Long-poll support shared by the command stores: one asyncio.Event per aggregator with a
+    pending long-poll, set when a command is queued for that aggregator.
+    notify() may be called from any thread; everything else runs on the event loop.
+    """
+    def __init__(self, max_wait: float = 30.0):
+        self.max_wait = max_wait # longest a single long-poll is held, in seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._events: Dict[str, list] = {} # aggregator_name -> [event, waiting requests]
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """
+        Bind to the server's event loop (called on startup).
+        """
+        self._loop = loop
+
+    def notify(self, aggregator_name: str):
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake, aggregator_name)
+        except RuntimeError:
+            pass # loop already closed during shutdown
+
+    def _wake(self, aggregator_name: str):
+        entry = self._events.pop(aggregator_name, None)
+        if entry is not None:
+            entry[0].set()
+
+    def register(self, aggregator_name: str) -> asyncio.Event:
+        """
+        Start waiting for `aggregator_name`. Register before checking for pending commands,
+        so a command queued in between still sets the returned event.
+        """
+        entry = self._events.get(aggregator_name)
+        if entry is None:
+            entry = self._events[aggregator_name] = [asyncio.Event(), 0]
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, aggregator_name: str, event: asyncio.Event):
+        entry = self._events.get(aggregator_name)
+        if entry is not None and entry[0] is event:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._events[aggregator_name]
+
+    def waiting(self) -> int:
+        return sum(entry[1] for entry in list(self._events.values()))
+
+
+class _AggregatorCommands:
+    """
+    Pending commands of one aggregator, in enqueue order and indexed by command_id.
+    """
+    __slots__ = ("lock", "commands")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = collections.OrderedDict() # command_id -> cmd
+
 
 class CommandQueue:
     """
-    A thread-safe in-memory queue for commands.
+    A thread-safe in-memory queue for commands, kept per aggregator.
+
+    Each aggregator has its own ordered map of pending commands and its own lock, so a poll costs
+    O(commands pending for that aggregator) and an ack O(acked ids), and aggregators polling at
+    the same time do not wait on each other. The global lock only guards creating an aggregator's
+    entry the first time a command is queued for it. Entries are kept once created, so an enqueue
+    can never land in an entry that a concurrent ack is removing.
     """
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, waiters: Optional[CommandWaiters] = None):
         self.logger = logger or logging.getLogger(__name__)
-        self.queue = collections.deque()
+        self._aggregators: Dict[str, _AggregatorCommands] = {}
         self.lock = threading.Lock()
-        self._id_counter = itertools.count(1)  # Incrementing ID generator
+        self._id_counter = itertools.count(1)  # Incrementing ID generator, next() is atomic
+        self.waiters = waiters or CommandWaiters()
+
+    def _entry(self, aggregator_name: str, create: bool = False):
+        entry = self._aggregators.get(aggregator_name)
+        if entry is None and create:
+            with self.lock:
+                entry = self._aggregators.setdefault(aggregator_name, _AggregatorCommands())
+        return entry
 
     def enqueue(self, cmd: dict) -> int:
         """
         Enqueue a new command (dict) and assign a unique command_id.
         """
-        with self.lock:
+        entry = self._entry(cmd["aggregator_name"], create=True)
+        with entry.lock:
             command_id = next(self._id_counter)
             cmd["command_id"] = command_id
-            self.queue.append(cmd)
-            self.logger.info(
-                "Enqueued command %s for aggregator '%s' device '%s'",
-                command_id, cmd.get("aggregator_name"), cmd.get("device_name")
-            )
-            return command_id
+            entry.commands[command_id] = cmd
+        self.waiters.notify(cmd["aggregator_name"])
+        self.logger.info(
+            "Enqueued command %s for aggregator '%s' device '%s'",
+            command_id, cmd.get("aggregator_name"), cmd.get("device_name")
+        )
+        return command_id
 
-    def get_unacked_for_aggregator(self, aggregator_name: str):
+    def get_unacked_for_aggregator(self, aggregator_name: str) -> List[dict]:
         """
         Return all commands for a specific aggregator (unacked = still in the queue).
         """
-        with self.lock:
-            return [cmd for cmd in self.queue if cmd["aggregator_name"] == aggregator_name]
+        entry = self._entry(aggregator_name)
+        if entry is None:
+            return []
+        with entry.lock:
+            return list(entry.commands.values())
 
     def ack(self, aggregator_name: str, command_ids: list):
         """
         Acknowledge (remove) commands by ID for a particular aggregator.
         """
-        with self.lock:
-            old_size = len(self.queue)
-            self.queue = collections.deque(
-                cmd for cmd in self.queue
-                if not (cmd["aggregator_name"] == aggregator_name and cmd["command_id"] in command_ids)
-            )
-            new_size = len(self.queue)
-            self.logger.info(
-                "Acked command IDs %s for aggregator '%s'. Queue size: %d -> %d",
-                command_ids, aggregator_name, old_size, new_size
+        entry = self._entry(aggregator_name)
+        if entry is None:
+            return
+        with entry.lock:
+            old_size = len(entry.commands)
+            for command_id in command_ids:
+                entry.commands.pop(command_id, None)
+            new_size = len(entry.commands)
+        self.logger.info(
+            "Acked command IDs %s for aggregator '%s'. Queue size: %d -> %d",
+            command_ids, aggregator_name, old_size, new_size
+        )
+
+    def __len__(self) -> int:
+        return sum(len(entry.commands) for entry in list(self._aggregators.values()))
+
+    def stats(self) -> dict:
+        return {"store": "memory", "pending": len(self)}
+
+    def close(self):
+        """
+        Nothing to flush; pending commands are lost with the process.
+        """
+
+
+_command_store = None # Global command store (CommandQueue or database.commands.DatabaseCommandStore)
+
+def init_command_store(command_config, session_factory, logger: logging.Logger = None):
+    """
+    Called once at application startup. "memory" keeps commands in this process, which is only
+    correct with a single worker; "database" shares them between workers through Postgres and
+    adds expiry, redelivery and dead-lettering.
+    """
+    global _command_store
+    if _command_store is None:
+        waiters = CommandWaiters(max_wait=command_config.max_wait)
+        if command_config.store == "database":
+            from database.commands import DatabaseCommandStore
+            _command_store = DatabaseCommandStore(
+                session_factory,
+                ttl=command_config.ttl,
+                visibility_timeout=command_config.visibility_timeout,
+                max_attempts=command_config.max_attempts,
+                dead_retention_days=command_config.dead_retention_days,
+                max_batch=command_config.max_batch,
+                sweep_interval=command_config.sweep_interval,
+                logger=logger,
+                waiters=waiters
             )
+        else:
+            _command_store = CommandQueue(logger=logger, waiters=waiters)
+    return _command_store
+
+def get_command_store():
+    """
+    FastAPI dependency: the configured command store.
+    """
+    if _command_store is None:
+        raise RuntimeError("Command store not initialized. Call init_command_store(...) at startup.")
+    return _command_store
+
+async def wait_for_commands(store, aggregator_name: str, wait: float) -> List[dict]:
+    """
+    Pending commands of `aggregator_name`, holding the request up to `wait` seconds (capped at
+    the store's max_wait) while there are none. Store reads run in the threadpool, since the
+    database store blocks on Postgres.
+    """
+    wait = min(wait, store.waiters.max_wait)
+    if wait <= 0:
+        return await run_in_threadpool(store.get_unacked_for_aggregator, aggregator_name)
+    event = store.waiters.register(aggregator_name)
+    try:
+        commands = await run_in_threadpool(store.get_unacked_for_aggregator, aggregator_name)
+        if commands:
+            return commands
+        try:
+            await asyncio.wait_for(event.wait(), wait)
+        except asyncio.TimeoutError:
+            return []
+        return await run_in_threadpool(store.get_unacked_for_aggregator, aggregator_name)
+    finally:
+        store.waiters.release(aggregator_name, event)
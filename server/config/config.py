@@ -2,7 +2,7 @@ import json
 import os
 import logging
 from dataclasses import dataclass
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 import colorlog
 import logging.handlers
@@ -11,6 +11,69 @@ from pathlib import Path
 @dataclass
 class ServerConfig:
     allowed_origins: List[str]
+    workers: int = 1            # worker processes; above 1 needs command_config.store = "database"
+
+@dataclass
+class DatabaseConfig:
+    mode: str = "sync"          # "sync" (psycopg2 Session, threadpool routes) or "async" (asyncpg, async routes)
+    pool_size: int = 10         # connections kept open per engine (per worker process)
+    max_overflow: int = 20      # extra connections opened under load, closed when returned
+    pool_timeout: float = 30.0  # seconds a request waits for a free connection before failing
+    pool_recycle: int = 1800    # seconds after which a connection is replaced (hosted Postgres idle cut-offs)
+    pool_pre_ping: bool = True  # test each connection on checkout and reconnect if it was dropped
+    query_cache_size: int = 500 # compiled SQL statements cached per engine
+    prepared_statements: bool = True    # PREPARE the hot ingest/overview queries once per connection (off behind pgbouncer transaction pooling)
+    statement_cache_size: int = 500     # prepared statements cached per asyncpg connection in async mode
+
+@dataclass
+class CommandConfig:
+    store: str = "memory"       # "memory" (this process only) or "database" (commands table, shared by workers)
+                                # "database" is the multi-worker setting: durable, but unacked commands stay
+                                # hidden for visibility_timeout and can be dead-lettered (see database/commands.py)
+    max_wait: float = 30.0      # longest a long-poll GET .../commands?wait= is held, keep below proxy idle timeouts
+    # The settings below apply to the "database" store.
+    ttl: Optional[float] = 86400.0          # seconds before an undelivered command is dead-lettered; null never expires
+    visibility_timeout: float = 60.0        # seconds a delivered, unacked command stays hidden before redelivery
+    max_attempts: int = 5                   # deliveries before an unacked command is dead-lettered
+    dead_retention_days: Optional[int] = 7  # dead letters older than this are pruned; null keeps all
+    max_batch: int = 500                    # enqueues/acks group-committed in one transaction
+    sweep_interval: float = 60.0            # seconds between expiry/pruning sweeps
+
+@dataclass
+class IngestConfig:
+    mode: str = "sync"          # "sync" writes on the request thread, "buffered" queues for the background writer
+    queue_size: int = 1000      # payloads held in memory before POST /api/snapshots answers 429
+    flush_interval: float = 0.5 # seconds the writer waits to fill a batch
+    max_batch: int = 200        # payloads coalesced into one transaction
+    drain_timeout: float = 30.0 # seconds allowed to flush the queue on shutdown
+    id_cache_size: int = 100000 # devices kept in the ingest ID cache (LRU)
+
+@dataclass
+class StorageConfig:
+    layout: str = "narrow"      # "narrow" (metric_values rows) or "wide" (device_snapshot_metrics arrays)
+
+@dataclass
+class RetentionConfig:
+    partition_interval: str = "daily"       # "daily" or "weekly" snapshot_time partitions
+    premake: int = 7                        # partitions created ahead of the current one
+    retention_days: Optional[int] = None    # partitions entirely older than this are dropped; null keeps all
+    check_interval: float = 3600.0          # seconds between maintenance passes
+
+@dataclass
+class RollupConfig:
+    enabled: bool = True                        # maintain 1m/1h/1d rollups on ingest and use them for history stats
+    minute_retention_days: Optional[int] = 7    # 1m buckets older than this are pruned; null keeps all
+
+@dataclass
+class OverviewConfig:
+    source: str = "latest"      # "latest" (latest_metric_values projection) or "raw" (storage layout query)
+    ring_size: int = 60         # newest points kept per device and metric; caps graph_limit with "latest"
+    cache_entries: int = 256    # cached /api/overview responses (ETag/304), invalidated by ingest; 0 disables
+
+@dataclass
+class StreamConfig:
+    enabled: bool = True        # GET /api/stream server-sent events of new snapshots
+    buffer_size: int = 100      # devices with pending updates held per subscriber before dropping the oldest
 
 class Config:
     """
@@ -18,6 +81,14 @@ class Config:
     Provides a method to set up structured logging.
     """
     server_settings: ServerConfig
+    database_settings: DatabaseConfig
+    command_settings: CommandConfig
+    ingest_settings: IngestConfig
+    storage_settings: StorageConfig
+    retention_settings: RetentionConfig
+    rollup_settings: RollupConfig
+    overview_settings: OverviewConfig
+    stream_settings: StreamConfig
     db_url: str
     uvicorn_log_config: Dict[str, Any]
 
@@ -31,9 +102,32 @@ class Config:
         server_dict = raw_config.get("server_config", {})
 
         self.server_settings = ServerConfig(
-            allowed_origins=server_dict.get("allowed_origins", ["*"])
+            allowed_origins=server_dict.get("allowed_origins", ["*"]),
+            workers=server_dict.get("workers", 1)
         )
 
+        self.database_settings = DatabaseConfig(**raw_config.get("database_config", {}))
+        if self.database_settings.mode not in ("sync", "async"):
+            raise ValueError(f"Invalid database_config.mode: {self.database_settings.mode}")
+
+        self.command_settings = CommandConfig(**raw_config.get("command_config", {}))
+        if self.command_settings.store not in ("memory", "database"):
+            raise ValueError(f"Invalid command_config.store: {self.command_settings.store}")
+        if self.server_settings.workers > 1 and self.command_settings.store == "memory":
+            raise ValueError("server_config.workers > 1 requires command_config.store = \"database\"")
+
+        self.ingest_settings = IngestConfig(**raw_config.get("ingest_config", {}))
+        if self.ingest_settings.mode not in ("sync", "buffered"):
+            raise ValueError(f"Invalid ingest_config.mode: {self.ingest_settings.mode}")
+
+        self.storage_settings = StorageConfig(**raw_config.get("storage_config", {}))
+        self.retention_settings = RetentionConfig(**raw_config.get("retention_config", {}))
+        self.rollup_settings = RollupConfig(**raw_config.get("rollup_config", {}))
+        self.overview_settings = OverviewConfig(**raw_config.get("overview_config", {}))
+        if self.overview_settings.source not in ("latest", "raw"):
+            raise ValueError(f"Invalid overview_config.source: {self.overview_settings.source}")
+        self.stream_settings = StreamConfig(**raw_config.get("stream_config", {}))
+
         self.db_url = os.getenv("DATABASE_URL")
         self.uvicorn_log_config = raw_config.get("uvicorn_log_config", {})
 
@@ -0,0 +1,68 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from database.db import InstrumentedAsyncQueuePool, engine_options
+
+"""
+    Async counterpart of database/db.py, used when database_config.mode is "async".
+    The same DATABASE_URL is reused with the asyncpg driver. Sync code (the ingestor, migrations,
+    background threads) keeps using the engine from database/db.py.
+"""
+
+_async_engine = None # Global async engine (asyncpg)
+_AsyncSessionLocal = None # Global async session factory
+
+def to_async_url(db_url: str):
+    """
+    postgresql:// or postgresql+psycopg2:// -> postgresql+asyncpg://
+    """
+    url = make_url(db_url)
+    return url.set(drivername="postgresql+asyncpg")
+
+def init_async_db(db_url: str, database_config=None):
+    """
+    Called once at application startup in async mode.
+    The pool is sized like the sync one; asyncpg prepares statements itself and keeps
+    statement_cache_size of them per connection (0 when prepared_statements is off).
+    """
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        return  # Already initialized
+
+    if not db_url:
+        raise ValueError("DATABASE_URL is empty or not provided.")
+
+    url = to_async_url(db_url)
+    if database_config is not None:
+        cache_size = database_config.statement_cache_size if database_config.prepared_statements else 0
+        url = url.update_query_dict({"prepared_statement_cache_size": str(cache_size)})
+    _async_engine = create_async_engine(url, echo=False, future=True, poolclass=InstrumentedAsyncQueuePool,
+                                        **engine_options(database_config))
+    _AsyncSessionLocal = sessionmaker(
+        bind=_async_engine, class_=AsyncSession, autoflush=False, autocommit=False, expire_on_commit=False
+    )
+
+def get_async_engine():
+    if _async_engine is None:
+        raise RuntimeError("Async database not initialized. Call init_async_db(db_url) first.")
+    return _async_engine
+
+async def get_async_db():
+    """
+    FastAPI dependency that yields an AsyncSession, closed when the request is done.
+    """
+    if _AsyncSessionLocal is None:
+        raise RuntimeError("Async database not initialized. Call init_async_db(db_url) before get_async_db().")
+
+    db = _AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+async def dispose_async_db():
+    """
+    Close the async pool on shutdown.
+    """
+    if _async_engine is not None:
+        await _async_engine.dispose()
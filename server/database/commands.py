@@ -0,0 +1,279 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from command_queue import CommandWaiters
+
+"""
+    Durable command queue kept in the commands table (migrations 0008/0009), used when
+    command_config.store is "database". Every worker process reads and writes the same rows, so a
+    command enqueued through one worker is delivered by whichever worker the aggregator's poll
+    lands on, and pending commands survive restarts.
+
+    Delivery is at-least-once:
+      - a poll claims the aggregator's visible pending commands (FOR UPDATE SKIP LOCKED), counts
+        the attempt and hides them for visibility_timeout seconds; if they are not acked by then,
+        the next poll delivers them again;
+      - commands past their expiry (ttl) or already delivered max_attempts times are moved to the
+        dead letters (status 'dead') instead, where they stay for dead_retention_days.
+    Enqueues and acks go through a single writer thread that group-commits everything submitted
+    while the previous transaction ran, so concurrent writers share one round trip and commit.
+
+    Same interface as the in-memory CommandQueue in command_queue.py.
+    Each enqueue also NOTIFYs the aggregator name on COMMANDS_CHANNEL, which cluster_events.py
+    relays to the long-poll waiters of every worker.
+"""
+
+COMMANDS_CHANNEL = "deepmetrics_commands"
+_COMMAND_ID_SEQ = "commands_command_id_seq"
+
+_UNDELIVERABLE = "coalesce(c.expires_at <= now(), false) OR c.attempts >= :max_attempts"
+
+_POLL_SQL = f"""
+WITH due AS (
+    SELECT command_id
+    FROM commands
+    WHERE aggregator_name = :aggregator AND status = 'pending' AND visible_at <= now()
+    ORDER BY command_id
+    FOR UPDATE SKIP LOCKED
+),
+dead AS (
+    UPDATE commands c
+    SET status = 'dead', dead_at = now(),
+        dead_reason = CASE WHEN coalesce(c.expires_at <= now(), false) THEN 'expired' ELSE 'max_attempts' END
+    FROM due
+    WHERE c.command_id = due.command_id AND ({_UNDELIVERABLE})
+)
+UPDATE commands c
+SET attempts = c.attempts + 1, last_delivered_at = now(), visible_at = now() + make_interval(secs => :visibility)
+FROM due
+WHERE c.command_id = due.command_id AND NOT ({_UNDELIVERABLE})
+RETURNING c.command_id, c.aggregator_name, c.device_name, c.command, c.attempts
+"""
+
+_INSERT_SQL = """
+INSERT INTO commands (command_id, aggregator_name, device_name, command, expires_at)
+SELECT i, a, d, c, now() + make_interval(secs => :ttl)
+FROM unnest(CAST(:ids AS bigint[]), CAST(:aggregators AS text[]), CAST(:devices AS text[]), CAST(:commands AS text[]))
+    AS u(i, a, d, c)
+"""
+
+_ACK_SQL = """
+DELETE FROM commands c
+USING unnest(CAST(:aggregators AS text[]), CAST(:ids AS bigint[])) AS a(aggregator_name, command_id)
+WHERE c.command_id = a.command_id AND c.aggregator_name = a.aggregator_name
+"""
+
+_EXPIRE_SQL = """
+UPDATE commands
+SET status = 'dead', dead_reason = 'expired', dead_at = now()
+WHERE status = 'pending' AND expires_at <= now()
+"""
+
+_PRUNE_DEAD_SQL = """
+DELETE FROM commands
+WHERE status = 'dead' AND dead_at < now() - make_interval(days => :days)
+"""
+
+class DatabaseCommandStore:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        ttl: Optional[float] = 86400.0,
+        visibility_timeout: float = 60.0,
+        max_attempts: int = 5,
+        dead_retention_days: Optional[int] = 7,
+        max_batch: int = 500,
+        sweep_interval: float = 60.0,
+        logger=None,
+        waiters: Optional[CommandWaiters] = None
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.dead_retention_days = dead_retention_days
+        self.max_batch = max_batch
+        self.sweep_interval = sweep_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.waiters = waiters or CommandWaiters()
+        self._writes = queue.Queue() # (kind, payload, Future)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="CommandWriter", daemon=True)
+        self._stats_lock = threading.Lock()
+        self._stats = {"enqueued": 0, "acked": 0, "delivered": 0, "batches": 0, "expired": 0, "pruned": 0}
+        self._thread.start()
+
+    def enqueue(self, cmd: dict) -> int:
+        """
+        Insert a new command (dict) and return its command_id once committed.
+        """
+        command_id = self._submit("enqueue", cmd)
+        cmd["command_id"] = command_id
+        self.logger.info(
+            "Enqueued command %s for aggregator '%s' device '%s'",
+            command_id, cmd.get("aggregator_name"), cmd.get("device_name")
+        )
+        return command_id
+
+    def get_unacked_for_aggregator(self, aggregator_name: str) -> List[dict]:
+        """
+        Claim and return the aggregator's deliverable commands, oldest first. They are hidden from
+        further polls for visibility_timeout seconds, or until acked.
+        """
+        with self.session_factory() as db:
+            rows = db.execute(text(_POLL_SQL), {
+                "aggregator": aggregator_name,
+                "max_attempts": self.max_attempts,
+                "visibility": self.visibility_timeout,
+            }).mappings().all()
+            db.commit()
+        if rows:
+            with self._stats_lock:
+                self._stats["delivered"] += len(rows)
+        return sorted((dict(row) for row in rows), key=lambda cmd: cmd["command_id"])
+
+    def ack(self, aggregator_name: str, command_ids: list):
+        """
+        Acknowledge (delete) commands by ID for a particular aggregator, once committed.
+        """
+        if not command_ids:
+            return
+        self._submit("ack", (aggregator_name, list(command_ids)))
+        self.logger.info("Acked command IDs %s for aggregator '%s'", command_ids, aggregator_name)
+
+    def dead_letters(self, aggregator_name: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """
+        Dead-lettered commands, newest first, optionally for one aggregator.
+        """
+        sql = ("SELECT command_id, aggregator_name, device_name, command, attempts, "
+               "created_at, last_delivered_at, dead_at, dead_reason "
+               "FROM commands WHERE status = 'dead'")
+        params = {"limit": limit}
+        if aggregator_name is not None:
+            sql += " AND aggregator_name = :aggregator"
+            params["aggregator"] = aggregator_name
+        sql += " ORDER BY dead_at DESC, command_id DESC LIMIT :limit"
+        with self.session_factory() as db:
+            return [dict(row) for row in db.execute(text(sql), params).mappings()]
+
+    def close(self, timeout: float = 10.0):
+        """
+        Stop the writer after committing whatever is still submitted.
+        """
+        self._stop_event.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["store"] = "database"
+        stats["write_queue_depth"] = self._writes.qsize()
+        return stats
+
+    def _submit(self, kind: str, payload):
+        if self._stop_event.is_set():
+            raise RuntimeError("Command store is shut down.")
+        future = Future()
+        self._writes.put((kind, payload, future))
+        return future.result(timeout=30.0)
+
+    def _run(self):
+        next_sweep = time.monotonic()
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            elif self._stop_event.is_set():
+                break
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                try:
+                    self.sweep()
+                except Exception as e:
+                    self.logger.error("[CommandWriter] Sweep failed: %s", e, exc_info=True)
+
+    def _take_batch(self) -> list:
+        """
+        Block for the first write (up to one second), then take whatever else is already queued.
+        """
+        try:
+            first = self._writes.get(timeout=1.0)
+        except queue.Empty:
+            return []
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._writes.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        """
+        One transaction for the whole batch: a multi-row INSERT for the enqueues (ids reserved up
+        front, like the snapshot ingest), one DELETE for the acks, one NOTIFY per aggregator.
+        """
+        enqueues = [(cmd, future) for kind, cmd, future in batch if kind == "enqueue"]
+        acks = [(payload, future) for kind, payload, future in batch if kind == "ack"]
+        ids = []
+        try:
+            with self.session_factory() as db:
+                if enqueues:
+                    ids = db.execute(
+                        text(f"SELECT nextval('{_COMMAND_ID_SEQ}') FROM generate_series(1, :n)"),
+                        {"n": len(enqueues)}
+                    ).scalars().all()
+                    db.execute(text(_INSERT_SQL), {
+                        "ttl": self.ttl,
+                        "ids": ids,
+                        "aggregators": [cmd["aggregator_name"] for cmd, _ in enqueues],
+                        "devices": [cmd["device_name"] for cmd, _ in enqueues],
+                        "commands": [cmd["command"] for cmd, _ in enqueues],
+                    })
+                    for aggregator in {cmd["aggregator_name"] for cmd, _ in enqueues}:
+                        db.execute(text("SELECT pg_notify(:channel, :aggregator)"),
+                                   {"channel": COMMANDS_CHANNEL, "aggregator": aggregator})
+                if acks:
+                    pairs = [(aggregator, command_id) for (aggregator, command_ids), _ in acks for command_id in command_ids]
+                    db.execute(text(_ACK_SQL), {
+                        "aggregators": [aggregator for aggregator, _ in pairs],
+                        "ids": [command_id for _, command_id in pairs],
+                    })
+                db.commit()
+        except Exception as e:
+            self.logger.error("[CommandWriter] Failed to write %d commands/acks: %s", len(batch), e)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (cmd, future), command_id in zip(enqueues, ids):
+            future.set_result(command_id)
+            self.waiters.notify(cmd["aggregator_name"])
+        for _, future in acks:
+            future.set_result(None)
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["enqueued"] += len(enqueues)
+            self._stats["acked"] += len(acks)
+
+    def sweep(self):
+        """
+        Dead-letter expired pending commands (of aggregators that stopped polling) and prune dead
+        letters older than dead_retention_days. Idempotent, so every worker can run it.
+        """
+        with self.session_factory() as db:
+            expired = db.execute(text(_EXPIRE_SQL)).rowcount
+            pruned = 0
+            if self.dead_retention_days is not None:
+                pruned = db.execute(text(_PRUNE_DEAD_SQL), {"days": self.dead_retention_days}).rowcount
+            db.commit()
+        if expired or pruned:
+            self.logger.info("[CommandWriter] Dead-lettered %d expired commands, pruned %d dead letters.", expired, pruned)
+            with self._stats_lock:
+                self._stats["expired"] += expired
+                self._stats["pruned"] += pruned
@@ -1,24 +1,154 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 _engine = None # Global engine which manages the connection pool
 _SessionLocal = None # Global session factory
 
-def init_db(db_url: str):
+
+class PoolWaitStats:
+    """
+    Time spent waiting for a pooled connection, recorded by the instrumented pool classes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a free connection.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """
+    InstrumentedQueuePool for the asyncpg engine of database/async_db.py.
+    """
+
+
+def engine_options(database_config=None) -> dict:
+    """
+    create_engine() keyword arguments for the pool settings of database_config (config.DatabaseConfig).
+    """
+    if database_config is None:
+        return {}
+    return {
+        "pool_size": database_config.pool_size,
+        "max_overflow": database_config.max_overflow,
+        "pool_timeout": database_config.pool_timeout,
+        "pool_recycle": database_config.pool_recycle,
+        "pool_pre_ping": database_config.pool_pre_ping,
+        "query_cache_size": database_config.query_cache_size,
+    }
+
+def pool_stats(engine) -> dict:
+    """
+    Gauges of an engine's connection pool: configured size, connections checked out, overflow in
+    use and checkout wait times.
+    """
+    pool = engine.pool
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+    }
+    if hasattr(pool, "wait_stats"):
+        stats.update(pool.wait_stats.snapshot())
+    return stats
+
+
+@contextmanager
+def advisory_lock(engine, key: int):
+    """
+    Holds a session-level Postgres advisory lock for the duration of the with block, so startup and
+    maintenance work runs in one worker process at a time.
+    """
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": key})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+            conn.commit()
+
+
+def init_db(db_url: str, database_config=None):
     """
     Called once at application startup.
     Creates the global engine and SessionLocal for the entire app.
+    database_config (config.DatabaseConfig) sizes the connection pool; defaults apply without it.
     """
     global _engine, _SessionLocal
     if _engine is not None:
         return  # Already initialized
-    
+
     if not db_url:
         raise ValueError("DATABASE_URL is empty or not provided.")
-    
-    _engine = create_engine(db_url, echo=False, future=True)
+
+    _engine = create_engine(db_url, echo=False, future=True, poolclass=InstrumentedQueuePool,
+                            **engine_options(database_config))
     _SessionLocal = sessionmaker(bind=_engine, autoflush=False, autocommit=False)
 
+def get_engine():
+    """
+    Returns the global engine, for code that needs raw connections (migrations, benchmarks).
+    """
+    if _engine is None:
+        raise RuntimeError("Database not initialized. Call init_db(db_url) before get_engine().")
+    return _engine
+
+def new_session():
+    """
+    Returns a new Session for code running outside a request (background workers, scripts).
+    The caller is responsible for closing it.
+    """
+    if _SessionLocal is None:
+        raise RuntimeError("Database not initialized. Call init_db(db_url) before new_session().")
+    return _SessionLocal()
+
 def get_db():
     """
     FastAPI dependency that yields a session from the global SessionLocal.
@@ -26,7 +156,7 @@ def get_db():
     """
     if _SessionLocal is None:
         raise RuntimeError("Database not initialized. Call init_db(db_url) before get_db().")
-    
+
     db = _SessionLocal()
     try:
         yield db # return db to the caller, but come back to this function when the request is done
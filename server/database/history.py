@@ -0,0 +1,67 @@
+from typing import Optional
+from database.layouts import StorageLayout
+from database.rollups import RollupStore
+
+"""
+    The /api/metrics/history query as a single statement.
+
+    One round trip returns the metric id, the page rows and the window totals: the metric name is
+    resolved in a CTE and fed to the layout's source as a scalar subquery (evaluated once, so the
+    per-metric index and partition pruning still apply), and the totals are cross joined onto
+    every page row. A metric with no rows in the window still yields one row with NULL page
+    columns; an unknown metric yields no rows at all.
+"""
+
+_METRIC_DEF_ID = "(SELECT metric_def_id FROM md)"
+
+_NO_STATS = "SELECT CAST(NULL AS bigint) AS total_count, CAST(NULL AS float8) AS avg_value, CAST(NULL AS float8) AS max_value"
+
+def history_sql(
+    layout: StorageLayout,
+    rollups: Optional[RollupStore],
+    sort: str,
+    keyset: bool = False,
+    with_stats: bool = True
+) -> str:
+    """
+    Binds: :metric_name, :start_time, :offset, :limit, plus :cursor_time/:cursor_id when keyset
+    is set and rollups.window_params(start_time) when rollups are used for the totals.
+    Columns: metric_def_id, total_count, avg_value, max_value, metric_value, snapshot_time,
+    device_snapshot_id.
+    """
+    order = "DESC" if sort == "desc" else "ASC"
+    source = layout.metric_source_sql(_METRIC_DEF_ID)
+
+    if not with_stats:
+        stats = _NO_STATS
+    elif rollups is not None:
+        stats = rollups.stats_sql(source, _METRIC_DEF_ID)
+    else:
+        stats = f"""
+            SELECT count(*) AS total_count, avg(m.metric_value) AS avg_value, max(m.metric_value) AS max_value
+            FROM ({source}) m WHERE m.snapshot_time >= :start_time
+        """
+
+    after = ""
+    if keyset:
+        after = f"AND (m.snapshot_time, m.device_snapshot_id) {'<' if order == 'DESC' else '>'} (:cursor_time, :cursor_id)"
+
+    return f"""
+        WITH md AS (
+            SELECT metric_def_id FROM metric_definitions WHERE metric_name = :metric_name
+        ),
+        stats AS ({stats}),
+        page AS (
+            SELECT m.metric_value, m.snapshot_time, m.device_snapshot_id
+            FROM ({source}) m
+            WHERE m.snapshot_time >= :start_time {after}
+            ORDER BY m.snapshot_time {order}, m.device_snapshot_id {order}
+            OFFSET :offset LIMIT :limit
+        )
+        SELECT md.metric_def_id, stats.total_count, stats.avg_value, stats.max_value,
+               page.metric_value, page.snapshot_time, page.device_snapshot_id
+        FROM md
+        CROSS JOIN stats
+        LEFT JOIN page ON true
+        ORDER BY page.snapshot_time {order}, page.device_snapshot_id {order}
+    """
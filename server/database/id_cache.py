@@ -0,0 +1,160 @@
+import collections
+import threading
+import logging
+from typing import Dict, Hashable
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database.models import Aggregator, Device, MetricDefinition
+
+_MISSING = object()
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded mapping with least-recently-used eviction and hit/miss counters.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put_many(self, items: Dict[Hashable, object]):
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard_where(self, predicate) -> int:
+        """
+        Remove every entry for which predicate(key, value) is true. Returns how many were removed.
+        """
+        with self._lock:
+            doomed = [k for k, v in self._data.items() if predicate(k, v)]
+            for key in doomed:
+                del self._data[key]
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class IdCache:
+    """
+    Process-wide cache of the surrogate keys ingest needs to resolve on every request:
+      aggregators:  guid -> (aggregator_id, name)
+      devices:      (aggregator_id, device_name) -> device_id
+      metric_defs:  metric_name -> metric_def_id
+    Entries are only added after the transaction that created or read them has committed.
+
+    Metric definition ids are also tracked as verified: an id is verified when it is cached, and
+    every invalidation event (ORM delete, bulk delete, clear after a stale-id FK violation)
+    un-verifies all of them. Layouts without a foreign key to metric_definitions (wide) re-check
+    unverified ids once, so steady-state ingest still issues no lookup SELECTs. Deletes these
+    events never see (raw SQL, or another worker process) go unnoticed with the wide layout until
+    the next invalidation or restart.
+    """
+    def __init__(self, max_aggregators: int = 10_000, max_devices: int = 100_000,
+                 max_metric_defs: int = 10_000, logger: logging.Logger = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.aggregators = LRUCache(max_aggregators)
+        self.devices = LRUCache(max_devices)
+        self.metric_defs = LRUCache(max_metric_defs)
+        self._verified_metric_defs = set()
+        self._verified_lock = threading.Lock()
+
+    def update(self, aggregators: Dict = None, devices: Dict = None, metric_defs: Dict = None):
+        if aggregators:
+            self.aggregators.put_many(aggregators)
+        if devices:
+            self.devices.put_many(devices)
+        if metric_defs:
+            self.metric_defs.put_many(metric_defs)
+            self.mark_metric_defs_verified(metric_defs.values())
+
+    def unverified_metric_defs(self, metric_def_ids) -> set:
+        with self._verified_lock:
+            return set(metric_def_ids) - self._verified_metric_defs
+
+    def mark_metric_defs_verified(self, metric_def_ids):
+        with self._verified_lock:
+            self._verified_metric_defs.update(metric_def_ids)
+
+    def _unverify_metric_defs(self):
+        with self._verified_lock:
+            self._verified_metric_defs.clear()
+
+    def invalidate_aggregator(self, aggregator_id: int):
+        # Deleting an aggregator cascades to its devices, so drop those too.
+        self.aggregators.discard_where(lambda _, v: v[0] == aggregator_id)
+        self.devices.discard_where(lambda k, _: k[0] == aggregator_id)
+        self._unverify_metric_defs()
+
+    def invalidate_device(self, device_id: int):
+        self.devices.discard_where(lambda _, v: v == device_id)
+        self._unverify_metric_defs()
+
+    def invalidate_metric_def(self, metric_def_id: int):
+        self.metric_defs.discard_where(lambda _, v: v == metric_def_id)
+        self._unverify_metric_defs()
+
+    def clear(self):
+        self.aggregators.clear()
+        self.devices.clear()
+        self.metric_defs.clear()
+        self._unverify_metric_defs()
+
+    def stats(self) -> dict:
+        return {
+            "aggregators": self.aggregators.stats(),
+            "devices": self.devices.stats(),
+            "metric_defs": self.metric_defs.stats(),
+        }
+
+    def install_listeners(self):
+        """
+        Invalidate entries when rows are deleted through the ORM.
+        Deletes issued as raw SQL are caught by the ingest engine instead: a stale id surfaces
+        as a foreign key violation, after which the cache is cleared and the batch retried.
+        The wide layout's metric_def_ids arrays have no foreign key, so with that layout ingest
+        re-checks cached metric definition ids after any invalidation (see the class docstring).
+        """
+        event.listen(Aggregator, "after_delete",
+                     lambda mapper, conn, target: self.invalidate_aggregator(target.aggregator_id), propagate=True)
+        event.listen(Device, "after_delete",
+                     lambda mapper, conn, target: self.invalidate_device(target.device_id), propagate=True)
+        event.listen(MetricDefinition, "after_delete",
+                     lambda mapper, conn, target: self.invalidate_metric_def(target.metric_def_id), propagate=True)
+        event.listen(Session, "after_bulk_delete", self._on_bulk_delete)
+
+    def _on_bulk_delete(self, delete_context):
+        if delete_context.mapper.local_table.name in ("aggregators", "devices", "metric_definitions"):
+            self.logger.info("Bulk delete on %s, clearing ID cache.", delete_context.mapper.local_table.name)
+            self.clear()
@@ -0,0 +1,389 @@
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database.models import (
+    Aggregator,
+    Device,
+    DeviceSnapshot,
+    MetricDefinition,
+    MetricDisplayConfig
+)
+from database.id_cache import IdCache
+from database.layouts import StorageLayout, NarrowLayout
+from database.rollups import RollupStore
+from database.latest import LatestValuesStore
+from database.prepared import execute_prepared
+from schemas import AggregatorIn
+
+"""
+    Set-based ingest engine for POST /api/snapshots.
+    Instead of building one ORM object per snapshot/metric and letting the unit of work flush them,
+    each batch of aggregator payloads is written with a fixed number of statements:
+      1. upsert aggregators            (INSERT ... ON CONFLICT (guid) DO UPDATE ... RETURNING)
+      2. upsert devices                (INSERT ... ON CONFLICT (aggregator_id, name) DO NOTHING RETURNING)
+      3. upsert metric definitions     (INSERT ... ON CONFLICT (metric_name) DO NOTHING RETURNING)
+      4. display configs for new defs  (INSERT ... ON CONFLICT DO NOTHING)
+      5. reserve snapshot ids          (one nextval() round trip for the whole batch, prepared per connection)
+      6. multi-row INSERT of device_snapshots and of the metric values in the active StorageLayout
+         (psycopg2 execute_values pages)
+    Steps 1-3 are skipped for ids already held in the process-wide IdCache (database/id_cache.py).
+    With the wide layout, cached metric definition ids are re-checked with one SELECT after a cache
+    invalidation only, since its arrays have no foreign key that would reject a stale id.
+"""
+
+_SNAPSHOT_ID_SEQ = "device_snapshots_device_snapshot_id_seq"
+_FK_VIOLATION = "23503"
+_RESERVE_IDS_SQL = f"SELECT nextval('{_SNAPSHOT_ID_SEQ}') FROM generate_series(1, :n)"
+
+def _sqlstate(e: IntegrityError):
+    """
+    SQLSTATE of a DBAPI error: psycopg2 exposes it as pgcode, asyncpg (behind SQLAlchemy's
+    adapter, which chains the original exception) as sqlstate.
+    """
+    for error in (e.orig, getattr(e.orig, "__cause__", None)):
+        code = getattr(error, "pgcode", None) or getattr(error, "sqlstate", None)
+        if code:
+            return code
+    return None
+
+def _guid_key(guid) -> str:
+    """
+    Postgres returns UUIDs in canonical lowercase form, so payload guids are normalised the same way.
+    """
+    try:
+        return str(uuid.UUID(str(guid)))
+    except ValueError:
+        raise ValueError(f"Invalid aggregator guid: {guid!r}")
+
+def _to_float(metric_name: str, metric_val, device_name: str) -> float:
+    try:
+        return float(metric_val)
+    except (TypeError, ValueError):
+        raise ValueError(f"Metric '{metric_name}' on device '{device_name}' is not numeric: {metric_val!r}")
+
+@dataclass
+class IngestResult:
+    aggregators: int = 0
+    snapshots: int = 0
+    metric_values: int = 0
+
+    @property
+    def rows(self) -> int:
+        return self.snapshots + self.metric_values
+
+
+class SnapshotIngestor:
+    """
+    Writes AggregatorIn payloads using a constant number of set-based statements per batch,
+    regardless of how many devices or metrics the payloads contain.
+    Aggregator, device and metric definition ids are resolved through an IdCache first, so in
+    steady state only the snapshot/metric value inserts reach the database.
+    With a RollupStore / LatestValuesStore the new samples are also folded into the rollup tiers /
+    the latest_metric_values projection in the same transaction.
+    """
+    def __init__(self, layout: StorageLayout = None, id_cache: IdCache = None,
+                 rollups: RollupStore = None, latest: LatestValuesStore = None,
+                 logger: logging.Logger = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.layout = layout or NarrowLayout()
+        self.id_cache = id_cache or IdCache(logger=self.logger)
+        self.rollups = rollups
+        self.latest = latest
+        self._listeners = []
+
+    def add_listener(self, callback: Callable[[List[AggregatorIn], "IngestResult"], None]):
+        """
+        Register callback(payloads, result), called after every committed ingest
+        (e.g. to invalidate response caches). Exceptions are logged, never raised to the writer.
+        """
+        self._listeners.append(callback)
+
+    def validate(self, agg_in: AggregatorIn):
+        """
+        Cheap pre-flight checks that would otherwise only fail inside the transaction.
+        Raises ValueError on an invalid guid or a non-numeric metric value.
+        """
+        _guid_key(agg_in.guid)
+        for ds_in in agg_in.device_snapshots:
+            for metric_name, metric_val in ds_in.metrics.items():
+                _to_float(metric_name, metric_val, ds_in.device_name)
+
+    def ingest(self, db: Session, payloads: Iterable[AggregatorIn], notify: bool = True) -> IngestResult:
+        """
+        Persist one or more aggregator payloads in a single transaction and commit it.
+        Raises ValueError if a metric value cannot be stored as a float.
+        With notify=False the listeners are not called; the caller passes the result to notify()
+        itself, e.g. off the event loop when ingesting through an AsyncSession's run_sync.
+        """
+        payloads = list(payloads)
+        if not payloads:
+            return IngestResult()
+
+        try:
+            result = self._ingest_once(db, payloads)
+        except IntegrityError as e:
+            if _sqlstate(e) != _FK_VIOLATION:
+                raise
+            # A cached id points at a row deleted behind our back: forget everything and re-resolve.
+            self.logger.warning("Stale ID cache detected (%s). Clearing cache and retrying ingest.", e.orig)
+            self.id_cache.clear()
+            result = self._ingest_once(db, payloads)
+        if notify:
+            self.notify(payloads, result)
+        return result
+
+    def notify(self, payloads: List[AggregatorIn], result: IngestResult):
+        """
+        Call the listeners for a committed ingest.
+        """
+        for callback in self._listeners:
+            try:
+                callback(payloads, result)
+            except Exception as e:
+                self.logger.error("Ingest listener %r failed: %s", callback, e, exc_info=True)
+
+    def _ingest_once(self, db: Session, payloads: List[AggregatorIn]) -> IngestResult:
+        resolved = {"aggregators": {}, "devices": {}, "metric_defs": {}}
+        try:
+            aggregator_ids = self._upsert_aggregators(db, payloads, resolved)
+            device_ids = self._upsert_devices(db, payloads, aggregator_ids, resolved)
+            metric_def_ids = self._upsert_metric_definitions(db, payloads, resolved)
+
+            snapshot_rows, snapshot_metrics = self._build_rows(
+                db, payloads, aggregator_ids, device_ids, metric_def_ids
+            )
+            value_count = 0
+            if snapshot_rows:
+                db.execute(insert(DeviceSnapshot.__table__), snapshot_rows)
+                value_count = self.layout.write(db, snapshot_metrics)
+                if self.rollups is not None:
+                    self.rollups.apply(db, snapshot_rows, snapshot_metrics)
+                if self.latest is not None:
+                    self.latest.apply(db, snapshot_rows, snapshot_metrics)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        # Only ids from a committed transaction may be cached.
+        self.id_cache.update(**resolved)
+        return IngestResult(
+            aggregators=len(payloads),
+            snapshots=len(snapshot_rows),
+            metric_values=value_count
+        )
+
+    def _upsert_aggregators(self, db: Session, payloads: List[AggregatorIn], resolved: dict) -> Dict[str, int]:
+        """
+        guid -> aggregator_id. The latest name in the batch wins, matching the old ORM behaviour;
+        a cached aggregator is only written again when its name changed.
+        """
+        names_by_guid = {}
+        for agg_in in payloads:
+            names_by_guid[_guid_key(agg_in.guid)] = agg_in.name
+
+        aggregator_ids = {}
+        to_upsert = {}
+        for guid, name in names_by_guid.items():
+            cached = self.id_cache.aggregators.get(guid)
+            if cached is not None and cached[1] == name:
+                aggregator_ids[guid] = cached[0]
+            else:
+                to_upsert[guid] = name
+        if not to_upsert:
+            return aggregator_ids
+
+        table = Aggregator.__table__
+        stmt = insert(table).values([
+            {"guid": guid, "name": name} for guid, name in sorted(to_upsert.items())
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.guid],
+            set_={"name": stmt.excluded.name}
+        ).returning(table.c.guid, table.c.aggregator_id)
+
+        for guid, agg_id in db.execute(stmt):
+            aggregator_ids[str(guid)] = agg_id
+            resolved["aggregators"][str(guid)] = (agg_id, to_upsert[str(guid)])
+        return aggregator_ids
+
+    def _upsert_devices(
+        self, db: Session, payloads: List[AggregatorIn], aggregator_ids: Dict[str, int], resolved: dict
+    ) -> Dict[Tuple[int, str], int]:
+        """
+        (aggregator_id, device_name) -> device_id.
+        DO NOTHING avoids rewriting unchanged rows; rows that already existed are not returned
+        by RETURNING, so those are fetched with one follow-up SELECT.
+        """
+        keys = set()
+        for agg_in in payloads:
+            agg_id = aggregator_ids[_guid_key(agg_in.guid)]
+            for ds_in in agg_in.device_snapshots:
+                keys.add((agg_id, ds_in.device_name))
+
+        device_ids = {}
+        for key in keys:
+            dev_id = self.id_cache.devices.get(key)
+            if dev_id is not None:
+                device_ids[key] = dev_id
+        keys -= device_ids.keys()
+        if not keys:
+            return device_ids
+
+        table = Device.__table__
+        stmt = (
+            insert(table)
+            .values([{"aggregator_id": a, "name": n} for a, n in sorted(keys)])
+            .on_conflict_do_nothing(index_elements=[table.c.aggregator_id, table.c.name])
+            .returning(table.c.aggregator_id, table.c.name, table.c.device_id)
+        )
+        fetched = {(a, n): dev_id for a, n, dev_id in db.execute(stmt)}
+
+        missing = keys - fetched.keys()
+        if missing:
+            agg_filter = {a for a, _ in missing}
+            name_filter = {n for _, n in missing}
+            rows = db.execute(
+                select(table.c.aggregator_id, table.c.name, table.c.device_id)
+                .where(table.c.aggregator_id.in_(agg_filter))
+                .where(table.c.name.in_(name_filter))
+            )
+            for a, n, dev_id in rows:
+                if (a, n) in missing:
+                    fetched[(a, n)] = dev_id
+
+        resolved["devices"].update(fetched)
+        device_ids.update(fetched)
+        return device_ids
+
+    def _upsert_metric_definitions(self, db: Session, payloads: List[AggregatorIn], resolved: dict) -> Dict[str, int]:
+        """
+        metric_name -> metric_def_id. Newly created definitions also get a default display config.
+        """
+        names = set()
+        for agg_in in payloads:
+            for ds_in in agg_in.device_snapshots:
+                names.update(ds_in.metrics.keys())
+
+        metric_def_ids = {}
+        for name in names:
+            def_id = self.id_cache.metric_defs.get(name)
+            if def_id is not None:
+                metric_def_ids[name] = def_id
+        unverified = set()
+        if metric_def_ids and not self.layout.checks_metric_defs:
+            unverified = self.id_cache.unverified_metric_defs(metric_def_ids.values())
+        if unverified:
+            # No foreign key would catch a deleted definition: after an invalidation event,
+            # confirm once that the cached ids still exist.
+            existing = set(db.execute(
+                select(MetricDefinition.__table__.c.metric_def_id)
+                .where(MetricDefinition.__table__.c.metric_def_id.in_(unverified))
+            ).scalars())
+            self.id_cache.mark_metric_defs_verified(existing)
+            for name, def_id in list(metric_def_ids.items()):
+                if def_id in unverified and def_id not in existing:
+                    self.id_cache.metric_defs.discard_where(lambda _, v, stale=def_id: v == stale)
+                    del metric_def_ids[name]
+        names -= metric_def_ids.keys()
+        if not names:
+            return metric_def_ids
+
+        table = MetricDefinition.__table__
+        stmt = (
+            insert(table)
+            .values([{"metric_name": n} for n in sorted(names)])
+            .on_conflict_do_nothing(index_elements=[table.c.metric_name])
+            .returning(table.c.metric_name, table.c.metric_def_id)
+        )
+        fetched = {name: def_id for name, def_id in db.execute(stmt)}
+
+        if fetched:
+            disp_table = MetricDisplayConfig.__table__
+            db.execute(
+                insert(disp_table)
+                .values([{"metric_def_id": def_id} for def_id in sorted(fetched.values())])
+                .on_conflict_do_nothing(index_elements=[disp_table.c.metric_def_id])
+            )
+
+        missing = names - fetched.keys()
+        if missing:
+            rows = db.execute(
+                select(table.c.metric_name, table.c.metric_def_id)
+                .where(table.c.metric_name.in_(missing))
+            )
+            fetched.update({name: def_id for name, def_id in rows})
+
+        resolved["metric_defs"].update(fetched)
+        metric_def_ids.update(fetched)
+        return metric_def_ids
+
+    def _build_rows(self, db, payloads, aggregator_ids, device_ids, metric_def_ids):
+        """
+        Reserves snapshot ids up front so metric values can reference them without
+        relying on the row order of a multi-row RETURNING.
+        Returns the device_snapshots rows and, per snapshot, its metric ids and values.
+        """
+        snapshot_count = sum(len(agg_in.device_snapshots) for agg_in in payloads)
+        if snapshot_count == 0:
+            return [], []
+
+        snapshot_ids = execute_prepared(
+            db, _RESERVE_IDS_SQL, {"n": snapshot_count}
+        ).scalars().all()
+
+        snapshot_rows = []
+        snapshot_metrics = []
+        ids = iter(snapshot_ids)
+        for agg_in in payloads:
+            agg_id = aggregator_ids[_guid_key(agg_in.guid)]
+            for ds_in in agg_in.device_snapshots:
+                snapshot_id = next(ids)
+                snapshot_rows.append({
+                    "device_snapshot_id": snapshot_id,
+                    "device_id": device_ids[(agg_id, ds_in.device_name)],
+                    "snapshot_time": ds_in.timestamp
+                })
+                snapshot_metrics.append((
+                    snapshot_id,
+                    ds_in.timestamp,
+                    [metric_def_ids[name] for name in ds_in.metrics],
+                    [_to_float(name, val, ds_in.device_name) for name, val in ds_in.metrics.items()]
+                ))
+        return snapshot_rows, snapshot_metrics
+
+
+_ingestor = None # Global ingest engine shared by the routes and background writers
+
+def init_ingestor(layout: StorageLayout, id_cache_size: int = 100_000, rollups: RollupStore = None,
+                  latest: LatestValuesStore = None, logger: logging.Logger = None):
+    """
+    Called once at application startup, after init_db(...).
+    id_cache_size bounds the device cache; aggregator and metric definition caches get a tenth of it.
+    """
+    global _ingestor
+    if _ingestor is None:
+        id_cache = IdCache(
+            max_aggregators=max(1, id_cache_size // 10),
+            max_devices=id_cache_size,
+            max_metric_defs=max(1, id_cache_size // 10),
+            logger=logger
+        )
+        id_cache.install_listeners()
+        _ingestor = SnapshotIngestor(layout=layout, id_cache=id_cache, rollups=rollups,
+                                     latest=latest, logger=logger)
+    return _ingestor
+
+def get_ingestor() -> SnapshotIngestor:
+    """
+    FastAPI dependency returning the global ingest engine.
+    """
+    if _ingestor is None:
+        raise RuntimeError("Ingestor not initialized. Call init_ingestor() at startup.")
+    return _ingestor
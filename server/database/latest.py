@@ -0,0 +1,132 @@
+import argparse
+import logging
+from typing import Optional
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from database.layouts import overview_filters
+from database.models import LatestMetricValue
+from database.rollups import as_utc
+
+"""
+    latest_metric_values: per (device, metric) the newest `ring_size` points as two parallel arrays
+    (oldest first). Ingest merges every batch into it in the same transaction, so /api/overview is
+    one indexed read over devices x metrics whose cost does not depend on how much history is stored.
+
+    Overview requests asking for more graph points than the ring holds get the whole ring.
+    After changing overview_config.ring_size (or to recover from drift) rebuild from the raw tables:
+      python -m database.latest
+"""
+
+_OVERVIEW_SQL = """
+    SELECT a.aggregator_id, a.name AS aggregator_name,
+           d.device_id, d.name AS device_name,
+           r.snapshot_time, md.metric_def_id, md.metric_name, r.metric_value,
+           COALESCE(mdc.display_type, 'row') AS display_type
+    FROM aggregators a
+    JOIN devices d ON d.aggregator_id = a.aggregator_id
+    JOIN latest_metric_values l ON l.device_id = d.device_id
+    JOIN metric_definitions md ON md.metric_def_id = l.metric_def_id
+    LEFT JOIN metric_display_config mdc ON mdc.metric_def_id = md.metric_def_id
+    CROSS JOIN LATERAL unnest(l.snapshot_times, l.metric_values)
+        WITH ORDINALITY AS r(snapshot_time, metric_value, pos)
+    WHERE r.pos > cardinality(l.snapshot_times) - CASE WHEN mdc.display_type = 'graph' THEN :glimit ELSE 1 END{filters}
+    ORDER BY a.aggregator_id, d.device_id, md.metric_def_id, r.snapshot_time
+"""
+
+
+class LatestValuesStore:
+    """
+    Maintains and reads the latest_metric_values projection.
+    """
+    def __init__(self, ring_size: int = 60, logger: logging.Logger = None):
+        if ring_size < 1:
+            raise ValueError("ring_size must be at least 1")
+        self.ring_size = ring_size
+        self.logger = logger or logging.getLogger(__name__)
+
+    def apply(self, db: Session, snapshot_rows: list, snapshot_metrics: list) -> int:
+        """
+        Merge freshly ingested samples into the rings with one multi-row upsert.
+        snapshot_rows and snapshot_metrics are the parallel lists built by SnapshotIngestor.
+        Returns the number of (device, metric) rows touched.
+        """
+        points = {}
+        for snap_row, (_, snapshot_time, def_ids, values) in zip(snapshot_rows, snapshot_metrics):
+            moment = as_utc(snapshot_time)
+            for def_id, value in zip(def_ids, values):
+                points.setdefault((snap_row["device_id"], def_id), []).append((moment, value))
+        if not points:
+            return 0
+
+        rows = []
+        for (device_id, def_id), series in sorted(points.items()):
+            series.sort(key=lambda p: p[0])
+            series = series[-self.ring_size:]
+            rows.append({
+                "device_id": device_id,
+                "metric_def_id": def_id,
+                "last_time": series[-1][0],
+                "snapshot_times": [p[0] for p in series],
+                "metric_values": [p[1] for p in series],
+            })
+        db.execute(self._upsert_stmt(), rows)
+        return len(rows)
+
+    def _upsert_stmt(self):
+        table = LatestMetricValue.__table__
+        stmt = insert(table)
+        excluded = stmt.excluded
+        # Inlined rather than bound so the statement stays a plain multi-row INSERT for executemany.
+        ring_size = literal_column(str(int(self.ring_size)))
+        times = table.c.snapshot_times.concat(excluded.snapshot_times)
+        values = table.c.metric_values.concat(excluded.metric_values)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.device_id, table.c.metric_def_id],
+            set_={
+                "last_time": func.greatest(table.c.last_time, excluded.last_time),
+                "snapshot_times": func.latest_ring_times(times, values, ring_size),
+                "metric_values": func.latest_ring_values(times, values, ring_size),
+            }
+        )
+
+    def overview_sql(self, aggregator: bool = False, device: bool = False) -> str:
+        """
+        Same columns and binds as StorageLayout.overview_sql().
+        """
+        return _OVERVIEW_SQL.format(filters=overview_filters(aggregator, device))
+
+    def rebuild(self, engine):
+        with engine.begin() as conn:
+            conn.execute(text("SELECT rebuild_latest_metric_values(:n)"), {"n": self.ring_size})
+
+
+_latest = None # Global projection store, None when overview_config.source is "raw"
+
+def init_latest_values(overview_config, logger: logging.Logger = None) -> Optional[LatestValuesStore]:
+    """
+    Called once at application startup.
+    """
+    global _latest
+    if _latest is None and overview_config.source == "latest":
+        _latest = LatestValuesStore(ring_size=overview_config.ring_size, logger=logger)
+    return _latest
+
+def get_latest_values() -> Optional[LatestValuesStore]:
+    """
+    FastAPI dependency: the projection store, or None when the overview reads raw tables.
+    """
+    return _latest
+
+
+if __name__ == "__main__":
+    from config.config import Config
+    from database.db import init_db, get_engine
+
+    parser = argparse.ArgumentParser(description="Recompute the latest_metric_values projection from raw data")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = Config()
+    init_db(config.db_url)
+    LatestValuesStore(ring_size=config.overview_settings.ring_size).rebuild(get_engine())
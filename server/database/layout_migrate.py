@@ -0,0 +1,86 @@
+import argparse
+import logging
+from sqlalchemy import text
+
+"""
+    Copies metric values between the narrow (metric_values) and wide (device_snapshot_metrics)
+    storage layouts, one device_snapshot_id range per transaction so it can be stopped and resumed.
+    Snapshots that already exist in the target layout are skipped.
+
+    Typical switch to the wide layout (from the server/ directory):
+      1. set storage_config.layout = "wide" and restart, so new snapshots land in the wide table
+      2. python -m database.layout_migrate --to wide --purge
+"""
+
+_TO_WIDE = """
+    INSERT INTO device_snapshot_metrics (device_snapshot_id, snapshot_time, metric_def_ids, metric_values)
+    SELECT mv.device_snapshot_id, mv.snapshot_time,
+           array_agg(mv.metric_def_id ORDER BY mv.metric_def_id),
+           array_agg(mv.metric_value ORDER BY mv.metric_def_id)
+    FROM metric_values mv
+    WHERE mv.device_snapshot_id >= :lo AND mv.device_snapshot_id < :hi
+    GROUP BY mv.device_snapshot_id, mv.snapshot_time
+    ON CONFLICT (device_snapshot_id, snapshot_time) DO NOTHING
+"""
+
+_TO_NARROW = """
+    INSERT INTO metric_values (device_snapshot_id, snapshot_time, metric_def_id, metric_value)
+    SELECT w.device_snapshot_id, w.snapshot_time, u.metric_def_id, u.metric_value
+    FROM device_snapshot_metrics w
+    CROSS JOIN LATERAL unnest(w.metric_def_ids, w.metric_values) AS u(metric_def_id, metric_value)
+    WHERE w.device_snapshot_id >= :lo AND w.device_snapshot_id < :hi
+      AND NOT EXISTS (
+          SELECT 1 FROM metric_values mv WHERE mv.device_snapshot_id = w.device_snapshot_id
+      )
+"""
+
+_PURGE = {
+    "wide": "DELETE FROM metric_values WHERE device_snapshot_id >= :lo AND device_snapshot_id < :hi",
+    "narrow": "DELETE FROM device_snapshot_metrics WHERE device_snapshot_id >= :lo AND device_snapshot_id < :hi",
+}
+
+def migrate_layout(engine, to: str, batch_size: int = 10_000, purge: bool = False,
+                   logger: logging.Logger = None) -> int:
+    """
+    Copies every snapshot's metric values into the `to` layout ("wide" or "narrow").
+    With purge=True the copied rows are deleted from the source layout in the same transaction.
+    Returns the number of rows inserted into the target table.
+    """
+    logger = logger or logging.getLogger(__name__)
+    if to not in _PURGE:
+        raise ValueError(f"Unknown target layout '{to}'")
+    copy_sql = text(_TO_WIDE if to == "wide" else _TO_NARROW)
+
+    with engine.connect() as conn:
+        lo, hi = conn.execute(text(
+            "SELECT min(device_snapshot_id), max(device_snapshot_id) FROM device_snapshots"
+        )).one()
+    if lo is None:
+        logger.info("No snapshots to migrate.")
+        return 0
+
+    copied = 0
+    for start in range(lo, hi + 1, batch_size):
+        params = {"lo": start, "hi": start + batch_size}
+        with engine.begin() as conn:
+            copied += conn.execute(copy_sql, params).rowcount
+            if purge:
+                conn.execute(text(_PURGE[to]), params)
+        logger.info("Migrated snapshots %d..%d to %s layout (%d rows so far)",
+                    start, min(start + batch_size - 1, hi), to, copied)
+    return copied
+
+
+if __name__ == "__main__":
+    from config.config import Config
+    from database.db import init_db, get_engine
+
+    parser = argparse.ArgumentParser(description="Copy metric values between storage layouts")
+    parser.add_argument("--to", choices=["wide", "narrow"], required=True, help="Target layout")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Snapshot ids per transaction")
+    parser.add_argument("--purge", action="store_true", help="Delete migrated rows from the source layout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db(Config().db_url)
+    migrate_layout(get_engine(), args.to, batch_size=args.batch_size, purge=args.purge)
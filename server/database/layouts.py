@@ -0,0 +1,185 @@
+from datetime import datetime
+from typing import List, Tuple
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from database.models import MetricValue, DeviceSnapshotMetrics
+
+"""
+    Storage layouts for the metric values of a device snapshot.
+
+    narrow: one metric_values row per metric per snapshot (the original schema).
+    wide:   one device_snapshot_metrics row per snapshot holding two parallel arrays,
+            metric_def_ids int[] and metric_values float8[]. No surrogate key and no per-value
+            foreign keys/indexes, so it is several times smaller for the same data.
+
+    Ingest and the overview/history readers only talk to a layout through this interface,
+    so switching storage_config.layout changes where new data is written and read from.
+    Existing data can be copied between layouts with:  python -m database.layout_migrate --to wide
+"""
+
+# One entry per snapshot: (device_snapshot_id, snapshot_time, [metric_def_id, ...], [metric_value, ...])
+SnapshotMetrics = List[Tuple[int, datetime, List[int], List[float]]]
+
+
+class StorageLayout:
+    name = None
+    # Whether writes reference metric_definitions through a foreign key, so that a stale cached
+    # metric_def_id fails the insert (and ingest retries with a cleared ID cache).
+    checks_metric_defs = True
+
+    def write(self, db: Session, snapshot_metrics: SnapshotMetrics) -> int:
+        """
+        Insert the metric values of freshly inserted snapshots. Returns the number of values written.
+        """
+        raise NotImplementedError
+
+    def metric_source_sql(self, metric_def_id: str = ":metric_def_id") -> str:
+        """
+        A SELECT yielding (device_snapshot_id, device_id, snapshot_time, metric_value) for the
+        metric given by the SQL expression metric_def_id (a bind parameter by default, or e.g. a
+        scalar subquery). Callers wrap it as a subquery and add their own filters;
+        Postgres inlines it, and snapshot_time is the value table's own column, so time predicates
+        prune its partitions.
+        """
+        raise NotImplementedError
+
+    def overview_sql(self, aggregator: bool = False, device: bool = False) -> str:
+        """
+        A SELECT returning the get_overview() columns for the latest snapshots, bound to :glimit.
+        With aggregator/device set it is also bound to :aggregator/:device (names) and only
+        reads the snapshots of the matching devices.
+        """
+        return _OVERVIEW_SQL.format(values=self._overview_values_sql(),
+                                    filters=overview_filters(aggregator, device))
+
+    def _overview_values_sql(self) -> str:
+        """
+        LATERAL subquery over the snapshots of device d yielding (snapshot_time, metric_def_id,
+        metric_value, rn), rn numbering each metric's values newest first.
+        """
+        raise NotImplementedError
+
+
+class NarrowLayout(StorageLayout):
+    name = "narrow"
+
+    def write(self, db: Session, snapshot_metrics: SnapshotMetrics) -> int:
+        rows = [
+            {"device_snapshot_id": snapshot_id, "snapshot_time": snapshot_time,
+             "metric_def_id": def_id, "metric_value": value}
+            for snapshot_id, snapshot_time, def_ids, values in snapshot_metrics
+            for def_id, value in zip(def_ids, values)
+        ]
+        if rows:
+            db.execute(insert(MetricValue.__table__), rows)
+        return len(rows)
+
+    def metric_source_sql(self, metric_def_id: str = ":metric_def_id") -> str:
+        return f"""
+            SELECT mv.device_snapshot_id, ds.device_id, mv.snapshot_time, mv.metric_value
+            FROM metric_values mv
+            JOIN device_snapshots ds ON ds.device_snapshot_id = mv.device_snapshot_id
+                                    AND ds.snapshot_time = mv.snapshot_time
+            WHERE mv.metric_def_id = {metric_def_id}
+        """
+
+    def overview_sql(self, aggregator: bool = False, device: bool = False) -> str:
+        if not (aggregator or device):
+            return "SELECT * FROM get_overview(:glimit)"
+        return super().overview_sql(aggregator, device)
+
+    def _overview_values_sql(self) -> str:
+        return """
+            SELECT mv.snapshot_time, mv.metric_def_id, mv.metric_value,
+                   row_number() OVER (PARTITION BY mv.metric_def_id ORDER BY mv.snapshot_time DESC) AS rn
+            FROM device_snapshots ds
+            JOIN metric_values mv ON mv.device_snapshot_id = ds.device_snapshot_id
+                                 AND mv.snapshot_time = ds.snapshot_time
+            WHERE ds.device_id = d.device_id
+        """
+
+
+class WideLayout(StorageLayout):
+    name = "wide"
+    checks_metric_defs = False # metric_def_ids is a plain array
+
+    def write(self, db: Session, snapshot_metrics: SnapshotMetrics) -> int:
+        rows = [
+            {"device_snapshot_id": snapshot_id, "snapshot_time": snapshot_time,
+             "metric_def_ids": def_ids, "metric_values": values}
+            for snapshot_id, snapshot_time, def_ids, values in snapshot_metrics
+            if def_ids
+        ]
+        if rows:
+            db.execute(insert(DeviceSnapshotMetrics.__table__), rows)
+        return sum(len(r["metric_def_ids"]) for r in rows)
+
+    def metric_source_sql(self, metric_def_id: str = ":metric_def_id") -> str:
+        return f"""
+            SELECT w.device_snapshot_id, ds.device_id, w.snapshot_time,
+                   w.metric_values[array_position(w.metric_def_ids, CAST({metric_def_id} AS integer))] AS metric_value
+            FROM device_snapshot_metrics w
+            JOIN device_snapshots ds ON ds.device_snapshot_id = w.device_snapshot_id
+                                    AND ds.snapshot_time = w.snapshot_time
+            WHERE w.metric_def_ids @> ARRAY[CAST({metric_def_id} AS integer)]
+        """
+
+    def _overview_values_sql(self) -> str:
+        return """
+            SELECT ds.snapshot_time, u.metric_def_id, u.metric_value,
+                   row_number() OVER (PARTITION BY u.metric_def_id ORDER BY ds.snapshot_time DESC) AS rn
+            FROM device_snapshots ds
+            JOIN device_snapshot_metrics w ON w.device_snapshot_id = ds.device_snapshot_id
+                                          AND w.snapshot_time = ds.snapshot_time
+            CROSS JOIN LATERAL unnest(w.metric_def_ids, w.metric_values) AS u(metric_def_id, metric_value)
+            WHERE ds.device_id = d.device_id
+        """
+
+
+# Same rows as get_overview(): the latest :glimit points for 'graph' metrics, the latest one otherwise.
+# The name filters sit next to the devices scan, so only the selected devices' snapshots are read.
+_OVERVIEW_SQL = """
+    SELECT a.aggregator_id, a.name AS aggregator_name,
+           d.device_id, d.name AS device_name,
+           v.snapshot_time, md.metric_def_id, md.metric_name, v.metric_value,
+           COALESCE(mdc.display_type, 'row') AS display_type
+    FROM aggregators a
+    JOIN devices d ON d.aggregator_id = a.aggregator_id
+    CROSS JOIN LATERAL ({values}) v
+    JOIN metric_definitions md ON md.metric_def_id = v.metric_def_id
+    LEFT JOIN metric_display_config mdc ON mdc.metric_def_id = md.metric_def_id
+    WHERE v.rn <= CASE WHEN mdc.display_type = 'graph' THEN :glimit ELSE 1 END{filters}
+    ORDER BY a.aggregator_id, d.device_id, md.metric_def_id, v.snapshot_time
+"""
+
+def overview_filters(aggregator: bool, device: bool) -> str:
+    filters = ""
+    if aggregator:
+        filters += " AND a.name = :aggregator"
+    if device:
+        filters += " AND d.name = :device"
+    return filters
+
+
+LAYOUTS = {layout.name: layout for layout in (NarrowLayout, WideLayout)}
+
+_layout = None # Global storage layout, chosen by storage_config.layout
+
+def init_storage_layout(name: str = "narrow") -> StorageLayout:
+    """
+    Called once at application startup.
+    """
+    global _layout
+    if _layout is None:
+        if name not in LAYOUTS:
+            raise ValueError(f"Unknown storage layout '{name}'. Expected one of: {', '.join(LAYOUTS)}")
+        _layout = LAYOUTS[name]()
+    return _layout
+
+def get_storage_layout() -> StorageLayout:
+    """
+    FastAPI dependency returning the active storage layout.
+    """
+    if _layout is None:
+        raise RuntimeError("Storage layout not initialized. Call init_storage_layout() at startup.")
+    return _layout
@@ -0,0 +1,57 @@
+import logging
+import os
+from sqlalchemy import text
+from database.db import advisory_lock
+
+"""
+    Minimal forward-only migration runner.
+    Each file in database/migrations/ is applied once, in filename order, inside its own
+    transaction. Applied versions are recorded in the schema_migrations table.
+
+    Run manually with:  python -m database.migrate   (from the server/ directory)
+"""
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+MIGRATION_LOCK_KEY = 72450001 # advisory lock serializing workers that start together
+
+def run_migrations(engine, logger: logging.Logger = None):
+    """
+    Applies every pending .sql migration against the given engine.
+    Safe to call on every startup; already applied files are skipped.
+    """
+    with advisory_lock(engine, MIGRATION_LOCK_KEY):
+        _apply_pending(engine, logger or logging.getLogger(__name__))
+
+def _apply_pending(engine, logger: logging.Logger):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "  version text PRIMARY KEY,"
+            "  applied_at timestamptz NOT NULL DEFAULT now()"
+            ")"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not filename.endswith(".sql") or filename in applied:
+            continue
+
+        with open(os.path.join(MIGRATIONS_DIR, filename), "r") as f:
+            sql = f.read()
+
+        with engine.begin() as conn:
+            conn.exec_driver_sql(sql)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+                {"version": filename}
+            )
+        logger.info("Applied migration %s", filename)
+
+
+if __name__ == "__main__":
+    from config.config import Config
+    from database.db import init_db, get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    init_db(Config().db_url)
+    run_migrations(get_engine())
@@ -0,0 +1,27 @@
+-- Unique keys required by the set-based ingest path (INSERT ... ON CONFLICT).
+
+-- Fold any duplicate devices (same aggregator + name) into the oldest row first,
+-- otherwise the unique index below cannot be built.
+WITH dupes AS (
+    SELECT device_id,
+           min(device_id) OVER (PARTITION BY aggregator_id, name) AS keep_id
+    FROM devices
+)
+UPDATE device_snapshots ds
+SET device_id = d.keep_id
+FROM dupes d
+WHERE ds.device_id = d.device_id
+  AND d.device_id <> d.keep_id;
+
+DELETE FROM devices d
+USING devices keep
+WHERE keep.aggregator_id = d.aggregator_id
+  AND keep.name = d.name
+  AND keep.device_id < d.device_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_devices_aggregator_name
+    ON devices (aggregator_id, name);
+
+-- Child lookups by snapshot (overview, cascades) otherwise scan metric_values.
+CREATE INDEX IF NOT EXISTS idx_metric_values_snapshot
+    ON metric_values (device_snapshot_id);
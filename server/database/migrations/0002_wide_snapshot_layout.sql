@@ -0,0 +1,12 @@
+-- Wide storage layout: all metric values of a snapshot in one row (see database/layouts.py).
+CREATE TABLE IF NOT EXISTS device_snapshot_metrics (
+    device_snapshot_id integer PRIMARY KEY
+        REFERENCES device_snapshots (device_snapshot_id) ON DELETE CASCADE,
+    metric_def_ids integer[] NOT NULL,
+    metric_values double precision[] NOT NULL,
+    CHECK (cardinality(metric_def_ids) = cardinality(metric_values))
+);
+
+-- Both layouts find a metric's history through device_snapshots by time.
+CREATE INDEX IF NOT EXISTS idx_device_snapshots_time
+    ON device_snapshots (snapshot_time);
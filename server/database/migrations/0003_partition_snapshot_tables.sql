@@ -0,0 +1,102 @@
+-- Range-partition the snapshot tables by snapshot_time. Partitions are named
+-- <table>_<YYYYMMDD from>_<YYYYMMDD to> and maintained by partitions.py (premake + retention).
+--
+-- metric_values and device_snapshot_metrics carry snapshot_time themselves so they prune and drop
+-- independently. Their foreign keys to device_snapshots are gone: a referenced partition can only
+-- be detached after a validation scan of the referencing table, which would defeat cheap drops.
+-- Ingest writes a snapshot and its values in one transaction, so the link is still consistent;
+-- deletes of snapshots are carried over to their values by a trigger (0010).
+
+ALTER SEQUENCE device_snapshots_device_snapshot_id_seq OWNED BY NONE;
+ALTER SEQUENCE metric_values_metric_value_id_seq OWNED BY NONE;
+
+DROP INDEX IF EXISTS idx_device_snapshots_device_time;
+DROP INDEX IF EXISTS idx_device_snapshots_time;
+DROP INDEX IF EXISTS idx_metric_values_def_snapshot;
+DROP INDEX IF EXISTS idx_metric_values_snapshot;
+
+ALTER TABLE device_snapshots RENAME TO device_snapshots_legacy;
+ALTER TABLE metric_values RENAME TO metric_values_legacy;
+ALTER TABLE device_snapshot_metrics RENAME TO device_snapshot_metrics_legacy;
+
+CREATE TABLE device_snapshots (
+    device_snapshot_id integer NOT NULL DEFAULT nextval('device_snapshots_device_snapshot_id_seq'::regclass),
+    device_id integer NOT NULL REFERENCES devices (device_id) ON DELETE CASCADE,
+    snapshot_time timestamptz NOT NULL,
+    CONSTRAINT pk_device_snapshots PRIMARY KEY (device_snapshot_id, snapshot_time)
+) PARTITION BY RANGE (snapshot_time);
+
+CREATE INDEX idx_device_snapshots_device_time ON device_snapshots (device_id, snapshot_time);
+CREATE INDEX idx_device_snapshots_time ON device_snapshots (snapshot_time);
+
+CREATE TABLE metric_values (
+    metric_value_id integer NOT NULL DEFAULT nextval('metric_values_metric_value_id_seq'::regclass),
+    device_snapshot_id integer NOT NULL,
+    snapshot_time timestamptz NOT NULL,
+    metric_def_id integer NOT NULL REFERENCES metric_definitions (metric_def_id) ON DELETE CASCADE,
+    metric_value double precision NOT NULL,
+    CONSTRAINT pk_metric_values PRIMARY KEY (metric_value_id, snapshot_time)
+) PARTITION BY RANGE (snapshot_time);
+
+CREATE INDEX idx_metric_values_def_time ON metric_values (metric_def_id, snapshot_time);
+CREATE INDEX idx_metric_values_snapshot ON metric_values (device_snapshot_id);
+
+CREATE TABLE device_snapshot_metrics (
+    device_snapshot_id integer NOT NULL,
+    snapshot_time timestamptz NOT NULL,
+    metric_def_ids integer[] NOT NULL,
+    metric_values double precision[] NOT NULL,
+    CONSTRAINT pk_device_snapshot_metrics PRIMARY KEY (device_snapshot_id, snapshot_time),
+    CHECK (cardinality(metric_def_ids) = cardinality(metric_values))
+) PARTITION BY RANGE (snapshot_time);
+
+ALTER SEQUENCE device_snapshots_device_snapshot_id_seq OWNED BY device_snapshots.device_snapshot_id;
+ALTER SEQUENCE metric_values_metric_value_id_seq OWNED BY metric_values.metric_value_id;
+
+-- One catch-up partition for the existing history, up to today (UTC). Current and future
+-- partitions are created by partitions.py at startup with the configured partition_interval;
+-- legacy rows from today onwards wait in the default partition and are moved out by it.
+-- Retention drops the catch-up partition once its whole range is past the cutoff. The current
+-- bucket is only partly covered by it; partitions.py creates the remainder as a partial bucket.
+DO $$
+DECLARE
+    t text;
+    first_day date;
+    today date := (now() AT TIME ZONE 'UTC')::date;
+BEGIN
+    SELECT (min(snapshot_time) AT TIME ZONE 'UTC')::date INTO first_day
+    FROM device_snapshots_legacy;
+
+    IF first_day IS NOT NULL AND first_day < today THEN
+        FOREACH t IN ARRAY ARRAY['device_snapshots', 'metric_values', 'device_snapshot_metrics'] LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                t || '_' || to_char(first_day, 'YYYYMMDD') || '_' || to_char(today, 'YYYYMMDD'),
+                t,
+                first_day::text || ' 00:00:00+00',
+                today::text || ' 00:00:00+00'
+            );
+        END LOOP;
+    END IF;
+END $$;
+
+-- Catch-all for timestamps outside the maintained range (e.g. clients with a wrong clock).
+CREATE TABLE device_snapshots_default PARTITION OF device_snapshots DEFAULT;
+CREATE TABLE metric_values_default PARTITION OF metric_values DEFAULT;
+CREATE TABLE device_snapshot_metrics_default PARTITION OF device_snapshot_metrics DEFAULT;
+
+INSERT INTO device_snapshots (device_snapshot_id, device_id, snapshot_time)
+SELECT device_snapshot_id, device_id, snapshot_time
+FROM device_snapshots_legacy;
+
+INSERT INTO metric_values (metric_value_id, device_snapshot_id, snapshot_time, metric_def_id, metric_value)
+SELECT mv.metric_value_id, mv.device_snapshot_id, ds.snapshot_time, mv.metric_def_id, mv.metric_value
+FROM metric_values_legacy mv
+JOIN device_snapshots_legacy ds ON ds.device_snapshot_id = mv.device_snapshot_id;
+
+INSERT INTO device_snapshot_metrics (device_snapshot_id, snapshot_time, metric_def_ids, metric_values)
+SELECT w.device_snapshot_id, ds.snapshot_time, w.metric_def_ids, w.metric_values
+FROM device_snapshot_metrics_legacy w
+JOIN device_snapshots_legacy ds ON ds.device_snapshot_id = w.device_snapshot_id;
+
+DROP TABLE device_snapshot_metrics_legacy, metric_values_legacy, device_snapshots_legacy;
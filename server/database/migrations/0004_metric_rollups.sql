@@ -0,0 +1,93 @@
+-- Pre-aggregated 1-minute / 1-hour / 1-day rollups per (device, metric), see database/rollups.py.
+-- Ingest keeps them current incrementally; rebuild_metric_rollups() recomputes them from raw data.
+
+CREATE TABLE IF NOT EXISTS metric_rollups_1m (
+    metric_def_id integer NOT NULL REFERENCES metric_definitions (metric_def_id) ON DELETE CASCADE,
+    bucket_start timestamptz NOT NULL,
+    device_id integer NOT NULL REFERENCES devices (device_id) ON DELETE CASCADE,
+    sample_count bigint NOT NULL,
+    value_sum double precision NOT NULL,
+    value_min double precision NOT NULL,
+    value_max double precision NOT NULL,
+    last_value double precision NOT NULL,
+    last_time timestamptz NOT NULL,
+    PRIMARY KEY (metric_def_id, bucket_start, device_id)
+);
+
+CREATE TABLE IF NOT EXISTS metric_rollups_1h (LIKE metric_rollups_1m INCLUDING ALL);
+CREATE TABLE IF NOT EXISTS metric_rollups_1d (LIKE metric_rollups_1m INCLUDING ALL);
+
+-- LIKE does not copy foreign keys.
+ALTER TABLE metric_rollups_1h
+    ADD FOREIGN KEY (metric_def_id) REFERENCES metric_definitions (metric_def_id) ON DELETE CASCADE,
+    ADD FOREIGN KEY (device_id) REFERENCES devices (device_id) ON DELETE CASCADE;
+ALTER TABLE metric_rollups_1d
+    ADD FOREIGN KEY (metric_def_id) REFERENCES metric_definitions (metric_def_id) ON DELETE CASCADE,
+    ADD FOREIGN KEY (device_id) REFERENCES devices (device_id) ON DELETE CASCADE;
+
+-- Recomputes every tier from raw samples at or after p_since (rounded down to a UTC day).
+-- Samples are read from both storage layouts; wide rows whose snapshot also exists in the
+-- narrow table (copied without --purge) are skipped so nothing is counted twice.
+CREATE OR REPLACE FUNCTION rebuild_metric_rollups(p_since timestamptz DEFAULT '-infinity')
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_since timestamptz := date_trunc('day', p_since AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+BEGIN
+    DELETE FROM metric_rollups_1m WHERE bucket_start >= v_since;
+    DELETE FROM metric_rollups_1h WHERE bucket_start >= v_since;
+    DELETE FROM metric_rollups_1d WHERE bucket_start >= v_since;
+
+    INSERT INTO metric_rollups_1m (metric_def_id, bucket_start, device_id, sample_count,
+                                   value_sum, value_min, value_max, last_value, last_time)
+    SELECT s.metric_def_id,
+           date_trunc('minute', s.snapshot_time AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+           s.device_id,
+           count(*), sum(s.metric_value), min(s.metric_value), max(s.metric_value),
+           (array_agg(s.metric_value ORDER BY s.snapshot_time DESC))[1],
+           max(s.snapshot_time)
+    FROM (
+        SELECT ds.device_id, mv.metric_def_id, mv.snapshot_time, mv.metric_value
+        FROM metric_values mv
+        JOIN device_snapshots ds ON ds.device_snapshot_id = mv.device_snapshot_id
+                                AND ds.snapshot_time = mv.snapshot_time
+        WHERE mv.snapshot_time >= v_since
+        UNION ALL
+        SELECT ds.device_id, u.metric_def_id, w.snapshot_time, u.metric_value
+        FROM device_snapshot_metrics w
+        JOIN device_snapshots ds ON ds.device_snapshot_id = w.device_snapshot_id
+                                AND ds.snapshot_time = w.snapshot_time
+        CROSS JOIN LATERAL unnest(w.metric_def_ids, w.metric_values) AS u(metric_def_id, metric_value)
+        WHERE w.snapshot_time >= v_since
+          AND NOT EXISTS (SELECT 1 FROM metric_values mv WHERE mv.device_snapshot_id = w.device_snapshot_id)
+    ) s
+    GROUP BY 1, 2, 3;
+
+    INSERT INTO metric_rollups_1h (metric_def_id, bucket_start, device_id, sample_count,
+                                   value_sum, value_min, value_max, last_value, last_time)
+    SELECT metric_def_id,
+           date_trunc('hour', bucket_start AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+           device_id,
+           sum(sample_count), sum(value_sum), min(value_min), max(value_max),
+           (array_agg(last_value ORDER BY last_time DESC))[1],
+           max(last_time)
+    FROM metric_rollups_1m
+    WHERE bucket_start >= v_since
+    GROUP BY 1, 2, 3;
+
+    INSERT INTO metric_rollups_1d (metric_def_id, bucket_start, device_id, sample_count,
+                                   value_sum, value_min, value_max, last_value, last_time)
+    SELECT metric_def_id,
+           date_trunc('day', bucket_start AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+           device_id,
+           sum(sample_count), sum(value_sum), min(value_min), max(value_max),
+           (array_agg(last_value ORDER BY last_time DESC))[1],
+           max(last_time)
+    FROM metric_rollups_1h
+    WHERE bucket_start >= v_since
+    GROUP BY 1, 2, 3;
+END;
+$$;
+
+SELECT rebuild_metric_rollups();
@@ -0,0 +1,8 @@
+-- Keyset pagination of /api/metrics/history orders by (snapshot_time, device_snapshot_id):
+-- extend the per-metric time index with the tie-breaker so pages come straight off the index.
+CREATE INDEX IF NOT EXISTS idx_metric_values_def_time_snapshot
+    ON metric_values (metric_def_id, snapshot_time, device_snapshot_id);
+DROP INDEX IF EXISTS idx_metric_values_def_time;
+
+CREATE INDEX IF NOT EXISTS idx_device_snapshot_metrics_time_snapshot
+    ON device_snapshot_metrics (snapshot_time, device_snapshot_id);
@@ -0,0 +1,3 @@
+-- /api/overview?device=... looks devices up by name alone (aggregator+name is already covered
+-- by uq_devices_aggregator_name); each device's snapshots then come from idx_device_snapshots_device_time.
+CREATE INDEX IF NOT EXISTS idx_devices_name ON devices (name);
@@ -0,0 +1,66 @@
+-- Materialized latest values per (device, metric) for /api/overview, see database/latest.py.
+-- snapshot_times/metric_values hold the newest points (oldest first), at most the configured ring size.
+
+CREATE TABLE IF NOT EXISTS latest_metric_values (
+    device_id integer NOT NULL REFERENCES devices (device_id) ON DELETE CASCADE,
+    metric_def_id integer NOT NULL REFERENCES metric_definitions (metric_def_id) ON DELETE CASCADE,
+    last_time timestamptz NOT NULL,
+    snapshot_times timestamptz[] NOT NULL,
+    metric_values double precision[] NOT NULL,
+    PRIMARY KEY (device_id, metric_def_id)
+);
+
+-- Newest p_n points of a (times, values) ring, returned oldest first. Used to merge incoming points
+-- into a ring regardless of arrival order.
+CREATE OR REPLACE FUNCTION latest_ring_times(p_times timestamptz[], p_values double precision[], p_n integer)
+RETURNS timestamptz[]
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT array_agg(t ORDER BY t)
+    FROM (SELECT t FROM unnest(p_times, p_values) AS u(t, v) ORDER BY t DESC LIMIT p_n) s
+$$;
+
+CREATE OR REPLACE FUNCTION latest_ring_values(p_times timestamptz[], p_values double precision[], p_n integer)
+RETURNS double precision[]
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT array_agg(v ORDER BY t)
+    FROM (SELECT t, v FROM unnest(p_times, p_values) AS u(t, v) ORDER BY t DESC LIMIT p_n) s
+$$;
+
+-- Recomputes the whole projection from both storage layouts (wide rows already present in the
+-- narrow table are skipped, as in rebuild_metric_rollups).
+CREATE OR REPLACE FUNCTION rebuild_latest_metric_values(p_ring_size integer DEFAULT 60)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM latest_metric_values;
+
+    INSERT INTO latest_metric_values (device_id, metric_def_id, last_time, snapshot_times, metric_values)
+    SELECT s.device_id, s.metric_def_id, max(s.snapshot_time),
+           array_agg(s.snapshot_time ORDER BY s.snapshot_time),
+           array_agg(s.metric_value ORDER BY s.snapshot_time)
+    FROM (
+        SELECT r.*, row_number() OVER (PARTITION BY r.device_id, r.metric_def_id
+                                       ORDER BY r.snapshot_time DESC) AS rn
+        FROM (
+            SELECT ds.device_id, mv.metric_def_id, mv.snapshot_time, mv.metric_value
+            FROM metric_values mv
+            JOIN device_snapshots ds ON ds.device_snapshot_id = mv.device_snapshot_id
+                                    AND ds.snapshot_time = mv.snapshot_time
+            UNION ALL
+            SELECT ds.device_id, u.metric_def_id, w.snapshot_time, u.metric_value
+            FROM device_snapshot_metrics w
+            JOIN device_snapshots ds ON ds.device_snapshot_id = w.device_snapshot_id
+                                    AND ds.snapshot_time = w.snapshot_time
+            CROSS JOIN LATERAL unnest(w.metric_def_ids, w.metric_values) AS u(metric_def_id, metric_value)
+            WHERE NOT EXISTS (SELECT 1 FROM metric_values mv WHERE mv.device_snapshot_id = w.device_snapshot_id)
+        ) r
+    ) s
+    WHERE s.rn <= p_ring_size
+    GROUP BY s.device_id, s.metric_def_id;
+END;
+$$;
+
+SELECT rebuild_latest_metric_values();
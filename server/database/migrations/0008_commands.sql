@@ -0,0 +1,12 @@
+-- Shared command queue for multi-worker deployments (command_config.store = "database"),
+-- see database/commands.py. Rows are deleted when the aggregator acknowledges them.
+
+CREATE TABLE IF NOT EXISTS commands (
+    command_id bigserial PRIMARY KEY,
+    aggregator_name text NOT NULL,
+    device_name text NOT NULL,
+    command text NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_commands_aggregator ON commands (aggregator_name, command_id);
@@ -0,0 +1,19 @@
+-- Delivery state for the database command store (database/commands.py):
+--   expires_at   pending commands past it are dead-lettered ('expired'); null never expires
+--   visible_at   a delivered command is hidden until then and redelivered if still unacked
+--   attempts     deliveries so far; past command_config.max_attempts it is dead-lettered
+--   status       'pending' or 'dead' (dead-letter rows are kept for inspection, then pruned)
+
+ALTER TABLE commands
+    ADD COLUMN IF NOT EXISTS expires_at timestamptz,
+    ADD COLUMN IF NOT EXISTS visible_at timestamptz NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS attempts integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS last_delivered_at timestamptz,
+    ADD COLUMN IF NOT EXISTS status text NOT NULL DEFAULT 'pending',
+    ADD COLUMN IF NOT EXISTS dead_reason text,
+    ADD COLUMN IF NOT EXISTS dead_at timestamptz;
+
+DROP INDEX IF EXISTS idx_commands_aggregator;
+CREATE INDEX IF NOT EXISTS idx_commands_pending ON commands (aggregator_name, command_id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_commands_pending_expiry ON commands (expires_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_commands_dead ON commands (dead_at) WHERE status = 'dead';
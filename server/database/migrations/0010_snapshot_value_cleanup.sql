@@ -0,0 +1,34 @@
+-- metric_values and device_snapshot_metrics lost their foreign keys to device_snapshots in 0003,
+-- so deleting an aggregator or device (cascading to device_snapshots) no longer removed their
+-- values. This trigger deletes them along with each snapshot row; snapshot_time is part of the
+-- lookup so only the matching partition is searched. Partition drops by retention bypass it,
+-- which is fine since the value tables drop the same ranges.
+
+CREATE OR REPLACE FUNCTION delete_snapshot_values()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM metric_values
+    WHERE device_snapshot_id = OLD.device_snapshot_id AND snapshot_time = OLD.snapshot_time;
+    DELETE FROM device_snapshot_metrics
+    WHERE device_snapshot_id = OLD.device_snapshot_id AND snapshot_time = OLD.snapshot_time;
+    RETURN OLD;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_device_snapshots_delete_values ON device_snapshots;
+CREATE TRIGGER trg_device_snapshots_delete_values
+    AFTER DELETE ON device_snapshots
+    FOR EACH ROW EXECUTE FUNCTION delete_snapshot_values();
+
+-- Values already orphaned by deletes before this migration.
+DELETE FROM metric_values mv
+WHERE NOT EXISTS (
+    SELECT 1 FROM device_snapshots ds
+    WHERE ds.device_snapshot_id = mv.device_snapshot_id AND ds.snapshot_time = mv.snapshot_time
+);
+DELETE FROM device_snapshot_metrics w
+WHERE NOT EXISTS (
+    SELECT 1 FROM device_snapshots ds
+    WHERE ds.device_snapshot_id = w.device_snapshot_id AND ds.snapshot_time = w.snapshot_time
+);
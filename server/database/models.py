@@ -1,7 +1,7 @@
 # coding: utf-8
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, Text, text
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, DateTime, Float, ForeignKey, Index, Integer, Text, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.orm import relationship, declared_attr
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -30,6 +30,10 @@ class MetricDefinition(Base):
 
 class Device(Base):
     __tablename__ = 'devices'
+    __table_args__ = (
+        Index('uq_devices_aggregator_name', 'aggregator_id', 'name', unique=True),
+        Index('idx_devices_name', 'name'),
+    )
 
     device_id = Column(Integer, primary_key=True, server_default=text("nextval('devices_device_id_seq'::regclass)"))
     aggregator_id = Column(ForeignKey('aggregators.aggregator_id', ondelete='CASCADE'), nullable=False, index=True)
@@ -45,24 +49,121 @@ class MetricDisplayConfig(Base):
 
 
 class DeviceSnapshot(Base):
+    """
+        Range-partitioned by snapshot_time (migration 0003), so snapshot_time is part of the key.
+    """
     __tablename__ = 'device_snapshots'
     __table_args__ = (
         Index('idx_device_snapshots_device_time', 'device_id', 'snapshot_time'),
+        Index('idx_device_snapshots_time', 'snapshot_time'),
     )
 
     device_snapshot_id = Column(Integer, primary_key=True, server_default=text("nextval('device_snapshots_device_snapshot_id_seq'::regclass)"))
     device_id = Column(ForeignKey('devices.device_id', ondelete='CASCADE'), nullable=False)
-    snapshot_time = Column(DateTime(True), nullable=False)
+    snapshot_time = Column(DateTime(True), primary_key=True, nullable=False)
 
 
 class MetricValue(Base):
+    """
+        Partitioned like device_snapshots and carries its snapshot_time; there is no database
+        foreign key to device_snapshots (see migration 0003). Rows are removed with their snapshot
+        by the trg_device_snapshots_delete_values trigger (migration 0010).
+    """
     __tablename__ = 'metric_values'
     __table_args__ = (
-        Index('idx_metric_values_def_snapshot', 'metric_def_id', 'device_snapshot_id'),
+        Index('idx_metric_values_def_time_snapshot', 'metric_def_id', 'snapshot_time', 'device_snapshot_id'),
+        Index('idx_metric_values_snapshot', 'device_snapshot_id'),
     )
 
     metric_value_id = Column(Integer, primary_key=True, server_default=text("nextval('metric_values_metric_value_id_seq'::regclass)"))
-    device_snapshot_id = Column(ForeignKey('device_snapshots.device_snapshot_id', ondelete='CASCADE'), nullable=False)
+    device_snapshot_id = Column(Integer, nullable=False)
+    snapshot_time = Column(DateTime(True), primary_key=True, nullable=False)
     metric_def_id = Column(ForeignKey('metric_definitions.metric_def_id', ondelete='CASCADE'), nullable=False)
     metric_value = Column(Float(53), nullable=False)
 
+
+class DeviceSnapshotMetrics(Base):
+    """
+        Wide storage layout: every metric of one snapshot as parallel arrays (see database/layouts.py).
+    """
+    __tablename__ = 'device_snapshot_metrics'
+    __table_args__ = (
+        Index('idx_device_snapshot_metrics_time_snapshot', 'snapshot_time', 'device_snapshot_id'),
+    )
+
+    device_snapshot_id = Column(Integer, primary_key=True)
+    snapshot_time = Column(DateTime(True), primary_key=True, nullable=False)
+    metric_def_ids = Column(ARRAY(Integer), nullable=False)
+    metric_values = Column(ARRAY(Float(53)), nullable=False)
+
+
+class _MetricRollupMixin:
+    """
+        Columns shared by the rollup tiers (see database/rollups.py).
+    """
+    @declared_attr
+    def metric_def_id(cls):
+        return Column(ForeignKey('metric_definitions.metric_def_id', ondelete='CASCADE'), primary_key=True)
+
+    bucket_start = Column(DateTime(True), primary_key=True)
+
+    @declared_attr
+    def device_id(cls):
+        return Column(ForeignKey('devices.device_id', ondelete='CASCADE'), primary_key=True)
+
+    sample_count = Column(BigInteger, nullable=False)
+    value_sum = Column(Float(53), nullable=False)
+    value_min = Column(Float(53), nullable=False)
+    value_max = Column(Float(53), nullable=False)
+    last_value = Column(Float(53), nullable=False)
+    last_time = Column(DateTime(True), nullable=False)
+
+
+class MetricRollup1m(_MetricRollupMixin, Base):
+    __tablename__ = 'metric_rollups_1m'
+
+
+class MetricRollup1h(_MetricRollupMixin, Base):
+    __tablename__ = 'metric_rollups_1h'
+
+
+class MetricRollup1d(_MetricRollupMixin, Base):
+    __tablename__ = 'metric_rollups_1d'
+
+
+class LatestMetricValue(Base):
+    """
+        Newest points per (device, metric), maintained by ingest for the overview (see database/latest.py).
+    """
+    __tablename__ = 'latest_metric_values'
+
+    device_id = Column(ForeignKey('devices.device_id', ondelete='CASCADE'), primary_key=True)
+    metric_def_id = Column(ForeignKey('metric_definitions.metric_def_id', ondelete='CASCADE'), primary_key=True)
+    last_time = Column(DateTime(True), nullable=False)
+    snapshot_times = Column(ARRAY(DateTime(True)), nullable=False)
+    metric_values = Column(ARRAY(Float(53)), nullable=False)
+
+
+class Command(Base):
+    """
+        Commands when command_config.store is "database" (see database/commands.py).
+    """
+    __tablename__ = 'commands'
+    __table_args__ = (
+        Index('idx_commands_pending', 'aggregator_name', 'command_id', postgresql_where=text("status = 'pending'")),
+        Index('idx_commands_pending_expiry', 'expires_at', postgresql_where=text("status = 'pending'")),
+        Index('idx_commands_dead', 'dead_at', postgresql_where=text("status = 'dead'")),
+    )
+
+    command_id = Column(BigInteger, primary_key=True)
+    aggregator_name = Column(Text, nullable=False)
+    device_name = Column(Text, nullable=False)
+    command = Column(Text, nullable=False)
+    created_at = Column(DateTime(True), nullable=False, server_default=text("now()"))
+    expires_at = Column(DateTime(True))
+    visible_at = Column(DateTime(True), nullable=False, server_default=text("now()"))
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    last_delivered_at = Column(DateTime(True))
+    status = Column(Text, nullable=False, server_default=text("'pending'"))
+    dead_reason = Column(Text)
+    dead_at = Column(DateTime(True))
@@ -13,6 +13,12 @@ from database.models import (
     This file contains the extended models with relationships defined.
 """
 
+# metric_values has no database FK to the partitioned device_snapshots table, so the join is spelled out.
+_SNAPSHOT_VALUES_JOIN = (
+    "and_(DeviceSnapshotEx.device_snapshot_id == foreign(MetricValueEx.device_snapshot_id), "
+    "DeviceSnapshotEx.snapshot_time == foreign(MetricValueEx.snapshot_time))"
+)
+
 class AggregatorEx(BaseAggregator):
     __tablename__ = "aggregators" # Ensures both the base and extended class refer to the same table
 
@@ -54,7 +60,8 @@ class DeviceSnapshotEx(BaseDeviceSnapshot):
     metric_values = relationship(
         "MetricValueEx",
         back_populates="device_snapshot",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        primaryjoin=_SNAPSHOT_VALUES_JOIN
     )
 
     def get_metric_value(self, metric_name: str):
@@ -83,7 +90,8 @@ class MetricValueEx(BaseMetricValue):
 
     device_snapshot = relationship(
         "DeviceSnapshotEx",
-        back_populates="metric_values"
+        back_populates="metric_values",
+        primaryjoin=_SNAPSHOT_VALUES_JOIN
     )
     metric_def = relationship(
         "MetricDefinitionEx",
@@ -0,0 +1,184 @@
+import re
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from database.db import advisory_lock
+
+"""
+    Maintenance of the time-partitioned snapshot tables created by migration 0003.
+    Partitions are named <table>_<YYYYMMDD from>_<YYYYMMDD to> (UTC, upper bound exclusive), which
+    lets the manager read the existing layout from the catalog without parsing partition bounds.
+"""
+
+PARTITIONED_TABLES = ("device_snapshots", "metric_values", "device_snapshot_metrics")
+INTERVALS = {"daily": timedelta(days=1), "weekly": timedelta(days=7)}
+MAINTENANCE_LOCK_KEY = 72450002 # advisory lock, one maintenance pass at a time across workers
+
+
+def uncovered(start: datetime, end: datetime, ranges: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """
+    The sub-ranges of [start, end) not overlapped by any of the [from, to) ranges, in order.
+    """
+    gaps = []
+    for r_start, r_end in sorted(ranges):
+        if r_end <= start or r_start >= end:
+            continue
+        if r_start > start:
+            gaps.append((start, r_start))
+        start = max(start, r_end)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+class PartitionManager(threading.Thread):
+    """
+    Background thread that keeps `premake` partitions ready ahead of the current time and drops
+    partitions whose whole range is older than the retention period.
+    """
+    def __init__(
+        self,
+        engine,
+        interval: str = "daily",
+        premake: int = 7,
+        retention_days: Optional[int] = None,
+        check_interval: float = 3600.0,
+        rollups=None,
+        logger: Optional[logging.Logger] = None
+    ):
+        super().__init__(name="PartitionManager", daemon=True)
+        if interval not in INTERVALS:
+            raise ValueError(f"Invalid partition interval '{interval}'. Expected one of: {', '.join(INTERVALS)}")
+        self.engine = engine
+        self.interval = interval
+        self.premake = premake
+        self.retention_days = retention_days
+        self.check_interval = check_interval
+        self.rollups = rollups
+        self.logger = logger or logging.getLogger(__name__)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self.logger.info("[PartitionManager] Started (interval=%s, premake=%d, retention_days=%s)",
+                         self.interval, self.premake, self.retention_days)
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self.maintain()
+            except Exception as e:
+                self.logger.error("[PartitionManager] Maintenance failed: %s", e, exc_info=True)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def maintain(self, now: datetime = None):
+        now = now or datetime.now(timezone.utc)
+        with advisory_lock(self.engine, MAINTENANCE_LOCK_KEY):
+            for table in PARTITIONED_TABLES:
+                self.ensure_partitions(table, now)
+            self.drop_expired(now)
+            if self.rollups is not None:
+                with self.engine.begin() as conn:
+                    self.rollups.prune(conn, now)
+
+    def bucket_start(self, moment: datetime) -> datetime:
+        """
+        Start of the partition bucket containing `moment`: midnight UTC, or Monday for weekly partitions.
+        """
+        day = moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.interval == "weekly":
+            day -= timedelta(days=day.weekday())
+        return day
+
+    def ensure_partitions(self, table: str, now: datetime):
+        step = INTERVALS[self.interval]
+        with self.engine.begin() as conn:
+            existing = self._partitions(conn, table)
+            start = self.bucket_start(now)
+            for _ in range(self.premake + 1):
+                end = start + step
+                # Only the parts of the bucket no partition covers yet, e.g. the rest of a week after
+                # the migration's catch-up partition or partitions made with another interval.
+                for gap_start, gap_end in uncovered(start, end, [(p_start, p_end) for _, p_start, p_end in existing]):
+                    self._create_partition(conn, table, gap_start, gap_end)
+                    existing.append((None, gap_start, gap_end))
+                start = end
+
+    def drop_expired(self, now: datetime):
+        if self.retention_days is None:
+            return
+        cutoff = now - timedelta(days=self.retention_days)
+        with self.engine.begin() as conn:
+            for table in PARTITIONED_TABLES:
+                for name, _, p_end in self._partitions(conn, table):
+                    if p_end <= cutoff:
+                        conn.exec_driver_sql(f'DROP TABLE "{name}"')
+                        self.logger.info("[PartitionManager] Dropped expired partition %s", name)
+                # Stray old rows in the catch-all partition are few, a plain DELETE is fine there.
+                conn.execute(text(f'DELETE FROM "{table}_default" WHERE snapshot_time < :cutoff'),
+                             {"cutoff": cutoff})
+
+    def _partitions(self, conn, table: str) -> List[Tuple[str, datetime, datetime]]:
+        pattern = re.compile(rf"^{re.escape(table)}_(\d{{8}})_(\d{{8}})$")
+        rows = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table"
+        ), {"table": table})
+
+        partitions = []
+        for (name,) in rows:
+            match = pattern.match(name)
+            if match:
+                p_start, p_end = (datetime.strptime(g, "%Y%m%d").replace(tzinfo=timezone.utc) for g in match.groups())
+                partitions.append((name, p_start, p_end))
+        return partitions
+
+    def _create_partition(self, conn, table: str, start: datetime, end: datetime):
+        name = f"{table}_{start:%Y%m%d}_{end:%Y%m%d}"
+        bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        params = {"start": start, "end": end}
+
+        stray = conn.execute(
+            text(f'SELECT count(*) FROM "{table}_default" WHERE snapshot_time >= :start AND snapshot_time < :end'),
+            params
+        ).scalar()
+        if not stray:
+            conn.exec_driver_sql(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES {bounds}')
+        else:
+            # Rows for this range already sit in the default partition (future timestamps): move them
+            # into a standalone table first, because attaching would fail while they are still there.
+            conn.exec_driver_sql(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            conn.execute(text(
+                f'WITH moved AS (DELETE FROM "{table}_default" '
+                f'WHERE snapshot_time >= :start AND snapshot_time < :end RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved'
+            ), params)
+            conn.exec_driver_sql(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES {bounds}')
+        self.logger.info("[PartitionManager] Created partition %s (%d rows moved from default)", name, stray)
+
+
+_partition_manager = None # Global partition maintenance thread
+
+def init_partition_manager(engine, retention_config, rollups=None, logger: logging.Logger = None) -> PartitionManager:
+    """
+    Called once at application startup. Runs one maintenance pass synchronously so the
+    current partitions exist before the first ingest, then keeps maintaining in the background.
+    """
+    global _partition_manager
+    if _partition_manager is None:
+        _partition_manager = PartitionManager(
+            engine,
+            interval=retention_config.partition_interval,
+            premake=retention_config.premake,
+            retention_days=retention_config.retention_days,
+            check_interval=retention_config.check_interval,
+            rollups=rollups,
+            logger=logger
+        )
+        _partition_manager.maintain()
+        _partition_manager.start()
+    return _partition_manager
@@ -0,0 +1,86 @@
+import hashlib
+import re
+import threading
+from typing import Dict, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+"""
+    Server-side prepared statements for the hot fixed-shape queries (overview, snapshot id
+    reservation). psycopg2 sends every statement as text, so Postgres parses and plans it again on
+    each call; here a statement is PREPAREd once per pooled connection and then run with EXECUTE.
+
+    Prepared statements live on the server connection, so the set of names prepared on it is kept in
+    the DBAPI connection's info dict, which SQLAlchemy clears when the connection is replaced
+    (pool_recycle, pre-ping reconnect, invalidation). Under asyncpg (database_config.mode = "async")
+    the driver already prepares and caches statements itself, so statements run unchanged.
+    Disable with database_config.prepared_statements = false behind a transaction-pooling proxy
+    such as pgbouncer, where consecutive statements may land on different server connections.
+"""
+
+_BIND = re.compile(r"(?<![:\w]):(\w+)")
+_INFO_KEY = "deepmetrics_prepared"
+
+class StatementPreparer:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._compiled: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def _compile(self, sql: str) -> Tuple[str, str, List[str]]:
+        """
+        :name binds -> $n placeholders, with a statement name derived from the SQL text.
+        Returns (statement name, positional SQL, bind names in $n order).
+        """
+        compiled = self._compiled.get(sql)
+        if compiled is None:
+            names: List[str] = []
+
+            def placeholder(match):
+                if match.group(1) not in names:
+                    names.append(match.group(1))
+                return f"${names.index(match.group(1)) + 1}"
+
+            positional = _BIND.sub(placeholder, sql)
+            name = "dm_" + hashlib.blake2b(sql.encode(), digest_size=8).hexdigest()
+            compiled = (name, positional, names)
+            with self._lock:
+                self._compiled[sql] = compiled
+        return compiled
+
+    def execute(self, db: Session, sql: str, params: dict):
+        """
+        Runs sql (with :name binds) as a prepared statement on the session's connection, preparing
+        it first if this connection has not seen it. Returns the CursorResult.
+        """
+        connection = db.connection()
+        if not self.enabled or connection.dialect.driver != "psycopg2":
+            return db.execute(text(sql), params)
+
+        name, positional, names = self._compile(sql)
+        prepared = connection.connection.info.setdefault(_INFO_KEY, set())
+        if name not in prepared:
+            connection.exec_driver_sql(f"PREPARE {name} AS {positional}")
+            prepared.add(name)
+        if not names:
+            return connection.exec_driver_sql(f"EXECUTE {name}")
+        return connection.exec_driver_sql(
+            f"EXECUTE {name} ({', '.join(['%s'] * len(names))})", tuple(params[n] for n in names)
+        )
+
+_preparer = StatementPreparer()
+
+def init_prepared_statements(database_config) -> StatementPreparer:
+    """
+    Called once at application startup with config.DatabaseConfig.
+    """
+    global _preparer
+    _preparer = StatementPreparer(enabled=database_config.prepared_statements)
+    return _preparer
+
+def execute_prepared(db: Session, sql: str, params: dict):
+    """
+    Executes sql through the process-wide StatementPreparer (enabled by default, so scripts and
+    benchmarks that never call init_prepared_statements still prepare).
+    """
+    return _preparer.execute(db, sql, params)
@@ -0,0 +1,215 @@
+import argparse
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy import case, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from database.models import MetricRollup1m, MetricRollup1h, MetricRollup1d
+
+"""
+    Rollup tiers for metric history: per (device, metric) count/sum/min/max/last in
+    1-minute, 1-hour and 1-day buckets (UTC). Ingest folds every new sample into all three tiers,
+    rebuild_metric_rollups() (migration 0004) recomputes them from raw data.
+
+    A window [start, now] is answered by stitching tiers together, coarsest first:
+        raw   [start, b0)   b0 = start rounded up to the minute
+        1m    [b0, b1)      b1 = b0 rounded up to the hour
+        1h    [b1, b2)      b2 = b1 rounded up to the day
+        1d    [b2, ...)
+    so a 30 day window reads ~30 daily rows plus at most a day of hourly and an hour of minute
+    rows, and the result is still exact. Minute buckets older than minute_retention_days are
+    pruned; when [b0, b1) reaches past that, the raw head is extended to b1 instead.
+"""
+
+@dataclass(frozen=True)
+class RollupTier:
+    name: str
+    width: timedelta
+    model: type
+
+    @property
+    def table(self) -> str:
+        return self.model.__tablename__
+
+    def floor(self, moment: datetime) -> datetime:
+        epoch = as_utc(moment).timestamp()
+        step = self.width.total_seconds()
+        return datetime.fromtimestamp(epoch - epoch % step, tz=timezone.utc)
+
+    def ceil(self, moment: datetime) -> datetime:
+        floored = self.floor(moment)
+        return floored if floored == as_utc(moment) else floored + self.width
+
+
+TIERS: List[RollupTier] = [
+    RollupTier("1m", timedelta(minutes=1), MetricRollup1m),
+    RollupTier("1h", timedelta(hours=1), MetricRollup1h),
+    RollupTier("1d", timedelta(days=1), MetricRollup1d),
+]
+
+def as_utc(moment: datetime) -> datetime:
+    # Naive timestamps are treated as UTC, like the rest of the server.
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+class RollupStore:
+    """
+    Maintains and queries the rollup tiers.
+    """
+    def __init__(self, minute_retention_days: Optional[int] = None, logger: logging.Logger = None):
+        self.minute_retention_days = minute_retention_days
+        self.logger = logger or logging.getLogger(__name__)
+
+    def apply(self, db: Session, snapshot_rows: list, snapshot_metrics: list) -> int:
+        """
+        Fold freshly ingested samples into every tier with one multi-row upsert per tier.
+        snapshot_rows and snapshot_metrics are the parallel lists built by SnapshotIngestor.
+        Returns the number of rollup rows touched.
+        """
+        touched = 0
+        for tier in TIERS:
+            deltas = {}
+            for snap_row, (_, snapshot_time, def_ids, values) in zip(snapshot_rows, snapshot_metrics):
+                device_id = snap_row["device_id"]
+                moment = as_utc(snapshot_time)
+                bucket = tier.floor(moment)
+                for def_id, value in zip(def_ids, values):
+                    d = deltas.get((def_id, bucket, device_id))
+                    if d is None:
+                        deltas[(def_id, bucket, device_id)] = [1, value, value, value, value, moment]
+                        continue
+                    d[0] += 1
+                    d[1] += value
+                    d[2] = min(d[2], value)
+                    d[3] = max(d[3], value)
+                    if moment >= d[5]:
+                        d[4], d[5] = value, moment
+
+            if deltas:
+                # Sorted so concurrent ingests lock rollup rows in the same order.
+                rows = [
+                    {"metric_def_id": k[0], "bucket_start": k[1], "device_id": k[2],
+                     "sample_count": d[0], "value_sum": d[1], "value_min": d[2], "value_max": d[3],
+                     "last_value": d[4], "last_time": d[5]}
+                    for k, d in sorted(deltas.items())
+                ]
+                db.execute(self._upsert_stmt(tier), rows)
+                touched += len(rows)
+        return touched
+
+    def _upsert_stmt(self, tier: RollupTier):
+        table = tier.model.__table__
+        stmt = insert(table)
+        excluded = stmt.excluded
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.metric_def_id, table.c.bucket_start, table.c.device_id],
+            set_={
+                "sample_count": table.c.sample_count + excluded.sample_count,
+                "value_sum": table.c.value_sum + excluded.value_sum,
+                "value_min": func.least(table.c.value_min, excluded.value_min),
+                "value_max": func.greatest(table.c.value_max, excluded.value_max),
+                "last_value": case(
+                    (excluded.last_time >= table.c.last_time, excluded.last_value),
+                    else_=table.c.last_value
+                ),
+                "last_time": func.greatest(table.c.last_time, excluded.last_time),
+            }
+        )
+
+    def retained_since(self, tier: RollupTier, now: datetime = None) -> Optional[datetime]:
+        """
+        Earliest bucket_start the tier is guaranteed to still hold, or None when it is never pruned.
+        """
+        if tier is not TIERS[0] or self.minute_retention_days is None:
+            return None
+        return as_utc(now or datetime.now(timezone.utc)) - timedelta(days=self.minute_retention_days)
+
+    def stats_sql(self, source_sql: str, metric_def_id: str = ":metric_def_id") -> str:
+        """
+        total_count / avg_value / max_value of the metric from :start_time onwards.
+        source_sql is the storage layout's metric source, used only for the head before b0;
+        metric_def_id is the SQL expression it was built with.
+        Bind with window_params(start_time).
+        """
+        parts = [
+            f"SELECT count(*) AS n, sum(m.metric_value) AS s, max(m.metric_value) AS mx "
+            f"FROM ({source_sql}) m WHERE m.snapshot_time >= :start_time AND m.snapshot_time < :b0"
+        ]
+        for i, tier in enumerate(TIERS):
+            upper = f" AND bucket_start < :b{i + 1}" if i + 1 < len(TIERS) else ""
+            parts.append(
+                f"SELECT sum(sample_count), sum(value_sum), max(value_max) FROM {tier.table} "
+                f"WHERE metric_def_id = {metric_def_id} AND bucket_start >= :b{i}{upper}"
+            )
+        return (
+            "SELECT COALESCE(sum(n), 0) AS total_count, sum(s) / NULLIF(sum(n), 0) AS avg_value, "
+            "max(mx) AS max_value FROM (" + " UNION ALL ".join(parts) + ") t"
+        )
+
+    def window_params(self, start_time: datetime, now: datetime = None) -> dict:
+        params = {"start_time": as_utc(start_time)}
+        boundary = params["start_time"]
+        for i, tier in enumerate(TIERS):
+            boundary = tier.ceil(boundary)
+            params[f"b{i}"] = boundary
+        minute_cutoff = self.retained_since(TIERS[0], now)
+        if minute_cutoff is not None and params["b0"] < minute_cutoff:
+            # The minute buckets of [b0, b1) may be pruned already: read that stretch raw.
+            params["b0"] = params["b1"]
+        return params
+
+    def prune(self, conn, now: datetime):
+        """
+        Minute buckets are only needed for recent windows; hourly and daily ones are kept.
+        """
+        if self.minute_retention_days is None:
+            return
+        cutoff = now - timedelta(days=self.minute_retention_days)
+        deleted = conn.execute(
+            text(f"DELETE FROM {TIERS[0].table} WHERE bucket_start < :cutoff"), {"cutoff": cutoff}
+        ).rowcount
+        if deleted:
+            self.logger.info("Pruned %d minute rollups older than %s", deleted, cutoff)
+
+    def rebuild(self, engine, since: datetime = None):
+        with engine.begin() as conn:
+            if since is None:
+                conn.execute(text("SELECT rebuild_metric_rollups()"))
+            else:
+                conn.execute(text("SELECT rebuild_metric_rollups(:since)"), {"since": since})
+
+
+_rollups = None # Global rollup store, None when rollup_config.enabled is false
+
+def init_rollups(rollup_config, logger: logging.Logger = None) -> Optional[RollupStore]:
+    """
+    Called once at application startup.
+    """
+    global _rollups
+    if _rollups is None and rollup_config.enabled:
+        _rollups = RollupStore(minute_retention_days=rollup_config.minute_retention_days, logger=logger)
+    return _rollups
+
+def get_rollups() -> Optional[RollupStore]:
+    """
+    FastAPI dependency: the rollup store, or None when rollups are disabled.
+    """
+    return _rollups
+
+
+if __name__ == "__main__":
+    from config.config import Config
+    from database.db import init_db, get_engine
+
+    parser = argparse.ArgumentParser(description="Recompute metric rollups from raw data")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="Only rebuild buckets from this ISO date on (default: everything)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    init_db(Config().db_url)
+    RollupStore().rebuild(get_engine(), since=args.since)
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from database.layouts import StorageLayout
+from database.rollups import RollupStore, TIERS, as_utc
+
+"""
+    Downsampled series for charting: [start, end) is cut into at most `points` equal buckets and
+    each bucket is reduced to count/avg/min/max in SQL, so the result size depends only on `points`.
+    min and max are kept per bucket so spikes survive downsampling.
+
+    When rollups are enabled and a bucket spans at least one rollup bucket, the coarsest such tier
+    is read instead of raw data; the bucket width is then rounded up to a whole number of tier
+    buckets and aligned to the tier, so every rollup row falls into exactly one output bucket.
+    A tier whose retention does not reach back to the start (pruned minute buckets) is skipped
+    in favour of raw data.
+"""
+
+_RAW_SQL = """
+    SELECT floor(extract(epoch FROM m.snapshot_time - :origin) / :width) AS bucket,
+           count(*) AS sample_count, avg(m.metric_value) AS avg_value,
+           min(m.metric_value) AS min_value, max(m.metric_value) AS max_value
+    FROM ({source}) m
+    WHERE m.device_id = :device_id AND m.snapshot_time >= :start_time AND m.snapshot_time < :end_time
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+_ROLLUP_SQL = """
+    SELECT floor(extract(epoch FROM r.bucket_start - :origin) / :width) AS bucket,
+           sum(r.sample_count) AS sample_count, sum(r.value_sum) / sum(r.sample_count) AS avg_value,
+           min(r.value_min) AS min_value, max(r.value_max) AS max_value
+    FROM {table} r
+    WHERE r.metric_def_id = :metric_def_id AND r.device_id = :device_id
+      AND r.bucket_start >= :origin AND r.bucket_start < :end_time
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+def series_query(
+    layout: StorageLayout,
+    rollups: Optional[RollupStore],
+    start_time: datetime,
+    end_time: datetime,
+    points: int,
+    now: Optional[datetime] = None
+) -> Tuple[str, dict, str]:
+    """
+    Returns (sql, params, source) for the series of :metric_def_id / :device_id, where source is
+    "raw" or the rollup tier name. The caller adds metric_def_id and device_id to params.
+    Result rows are (bucket, sample_count, avg_value, min_value, max_value); bucket n starts at
+    params["origin"] + n * params["width"] seconds.
+    """
+    start_time, end_time = as_utc(start_time), as_utc(end_time)
+    width = (end_time - start_time).total_seconds() / points
+
+    tier = None
+    if rollups is not None:
+        tier = next((
+            t for t in reversed(TIERS)
+            if t.width.total_seconds() <= width
+            and (rollups.retained_since(t, now) is None or t.floor(start_time) >= rollups.retained_since(t, now))
+        ), None)
+
+    if tier is None:
+        params = {"origin": start_time, "width": width, "start_time": start_time, "end_time": end_time}
+        return _RAW_SQL.format(source=layout.metric_source_sql()), params, "raw"
+
+    step = tier.width.total_seconds()
+    origin = tier.floor(start_time)
+    # Measured from the aligned origin, so rounding up to whole tier buckets never yields more than `points`.
+    width = (end_time - origin).total_seconds() / points
+    width = -(-width // step) * step
+    params = {"origin": origin, "width": width, "end_time": end_time}
+    return _ROLLUP_SQL.format(table=tier.table), params, tier.name
+
+def bucket_time(params: dict, bucket) -> datetime:
+    return params["origin"] + timedelta(seconds=int(bucket) * params["width"])
@@ -0,0 +1,210 @@
+import queue
+import threading
+import logging
+import time
+from typing import Callable, List, Optional
+from sqlalchemy.exc import DataError, IntegrityError
+from schemas import AggregatorIn
+from database.ingest import SnapshotIngestor
+
+# Errors that condemn the payload itself; anything else is retried.
+_DATA_ERRORS = (ValueError, DataError, IntegrityError)
+
+class IngestBuffer:
+    """
+    Write-behind buffer for POST /api/snapshots.
+    Requests push validated payloads onto a bounded in-memory queue and return immediately;
+    a single background writer coalesces everything that arrived during a tick into one
+    transaction (group commit), so commit latency is paid once per batch instead of per request.
+
+    Only payloads the database rejects as data (ValueError, DataError, IntegrityError) are dropped.
+    Any other failure (lost connection, failover, timeouts) keeps the unwritten payloads and retries
+    them with exponential backoff up to max_backoff seconds; meanwhile `failing` is set and the
+    route answers 503 instead of accepting payloads it cannot write.
+    """
+    def __init__(
+        self,
+        ingestor: SnapshotIngestor,
+        session_factory: Callable,
+        queue_size: int = 1000,
+        flush_interval: float = 0.5,
+        max_batch: int = 200,
+        max_backoff: float = 30.0,
+        logger: Optional[logging.Logger] = None
+    ):
+        self.ingestor = ingestor
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+        self.failing = False # set while the database keeps failing the writer
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="IngestBufferWriter", daemon=True)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "batches": 0,
+            "payloads_written": 0,
+            "rows_written": 0,
+            "failed_payloads": 0,
+            "write_retries": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_commit_ms": 0.0,
+        }
+
+    def start(self):
+        self._thread.start()
+        self.logger.info("[IngestBuffer] Writer started (queue_size=%d, max_batch=%d, flush_interval=%.2fs)",
+                         self.queue.maxsize, self.max_batch, self.flush_interval)
+
+    def submit(self, agg_in: AggregatorIn) -> bool:
+        """
+        Queue a payload for the writer. Returns False when the queue is full (or shutting down)
+        so the caller can apply backpressure.
+        """
+        if self._stop_event.is_set() or self.failing:
+            accepted = False
+        else:
+            try:
+                self.queue.put_nowait(agg_in)
+                accepted = True
+            except queue.Full:
+                accepted = False
+
+        with self._stats_lock:
+            self._stats["accepted" if accepted else "rejected"] += 1
+        return accepted
+
+    def stop(self, timeout: float = 30.0):
+        """
+        Stop accepting payloads and let the writer drain whatever is still queued.
+        """
+        self.logger.info("[IngestBuffer] Draining %d queued payloads.", self.queue.qsize())
+        self._stop_event.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self.logger.error("[IngestBuffer] Drain timed out with %d payloads still queued.", self.queue.qsize())
+        else:
+            self.logger.info("[IngestBuffer] Writer stopped.")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["failing"] = self.failing
+        stats["queue_depth"] = self.queue.qsize()
+        stats["queue_capacity"] = self.queue.maxsize
+        stats["avg_batch_size"] = (stats["payloads_written"] / stats["batches"]) if stats["batches"] else 0.0
+        return stats
+
+    def _run(self):
+        pending, failures = [], 0
+        while True:
+            batch = pending or self._take_batch()
+            if batch:
+                pending = self._write(batch)
+                if pending:
+                    failures += 1
+                    self.failing = True
+                    delay = min(self.max_backoff, self.flush_interval * 2 ** failures)
+                    self.logger.warning("[IngestBuffer] %d payloads not written, retrying in %.1fs (attempt %d).",
+                                        len(pending), delay, failures)
+                    time.sleep(delay)
+                else:
+                    failures = 0
+                    self.failing = False
+            elif self._stop_event.is_set():
+                break
+
+    def _take_batch(self) -> List[AggregatorIn]:
+        """
+        Block for the first payload (up to one tick), then take whatever else is already queued.
+        """
+        try:
+            first = self.queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[AggregatorIn]) -> List[AggregatorIn]:
+        """
+        Write a batch. Returns the payloads left unwritten by a transient error, to be retried.
+        """
+        start = time.perf_counter()
+        written, rows, failed, pending = 0, 0, 0, []
+        db = self.session_factory()
+        try:
+            try:
+                rows = self.ingestor.ingest(db, batch).rows
+                written = len(batch)
+            except _DATA_ERRORS as e:
+                # One bad payload must not sink the whole group: retry them one by one.
+                self.logger.warning("[IngestBuffer] Batch of %d failed (%s). Retrying individually.", len(batch), e)
+                for i, agg_in in enumerate(batch):
+                    try:
+                        rows += self.ingestor.ingest(db, [agg_in]).rows
+                        written += 1
+                    except _DATA_ERRORS as e:
+                        failed += 1
+                        self.logger.error("[IngestBuffer] Dropping payload from aggregator '%s': %s", agg_in.name, e)
+                    except Exception as e:
+                        self.logger.error("[IngestBuffer] Write failed, keeping %d payloads: %s", len(batch) - i, e)
+                        pending = batch[i:]
+                        break
+            except Exception as e:
+                self.logger.error("[IngestBuffer] Write failed, keeping %d payloads: %s", len(batch), e)
+                pending = batch
+        finally:
+            db.close()
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["payloads_written"] += written
+            self._stats["rows_written"] += rows
+            self._stats["failed_payloads"] += failed
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+            self._stats["last_commit_ms"] = round(elapsed_ms, 2)
+            self._stats["write_retries"] += 1 if pending else 0
+        self.logger.debug("[IngestBuffer] Wrote batch of %d payloads (%d rows) in %.2f ms", written, rows, elapsed_ms)
+        return pending
+
+
+_ingest_buffer = None # Global write-behind buffer, only set when ingest_config.mode == "buffered"
+
+def init_ingest_buffer(ingest_config, ingestor: SnapshotIngestor, session_factory: Callable,
+                       logger: logging.Logger = None):
+    """
+    Called once at application startup. Does nothing in "sync" mode.
+    """
+    global _ingest_buffer
+    if _ingest_buffer is not None or ingest_config.mode != "buffered":
+        return _ingest_buffer
+
+    _ingest_buffer = IngestBuffer(
+        ingestor=ingestor,
+        session_factory=session_factory,
+        queue_size=ingest_config.queue_size,
+        flush_interval=ingest_config.flush_interval,
+        max_batch=ingest_config.max_batch,
+        logger=logger
+    )
+    _ingest_buffer.start()
+    return _ingest_buffer
+
+def get_ingest_buffer() -> Optional[IngestBuffer]:
+    """
+    FastAPI dependency: the write-behind buffer, or None when ingest runs synchronously.
+    """
+    return _ingest_buffer
@@ -1,17 +1,64 @@
+import asyncio
+import logging
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from config.config import Config 
 from routes.main_routes import router as main_router 
 from routes.command_routes import router as command_router
-from database.db import init_db
+from routes.stats_routes import router as stats_router
+from routes.stream_routes import router as stream_router
+from routes.async_routes import router as async_router
+from database.db import init_db, get_engine, new_session
+from database.async_db import init_async_db, dispose_async_db
+from database.migrate import run_migrations
+from database.prepared import init_prepared_statements
+from database.ingest import init_ingestor
+from database.layouts import init_storage_layout
+from database.partitions import init_partition_manager
+from database.rollups import init_rollups
+from database.latest import init_latest_values
+from ingest_buffer import init_ingest_buffer
+from response_cache import init_response_cache
+from broadcast_hub import init_broadcast_hub
+from cluster_events import init_cluster_events
+from command_queue import init_command_store
 
 class Application:
     def __init__(self):
         self.config = Config()
 
         # Initialize the global DB
-        init_db(self.config.db_url)
+        init_db(self.config.db_url, self.config.database_settings)
+        if self.config.database_settings.mode == "async":
+            init_async_db(self.config.db_url, self.config.database_settings)
+        init_prepared_statements(self.config.database_settings)
+        run_migrations(get_engine(), logger=logging.getLogger("uvicorn"))
+        rollups = init_rollups(self.config.rollup_settings, logger=logging.getLogger("uvicorn"))
+        self.partition_manager = init_partition_manager(
+            get_engine(), self.config.retention_settings, rollups=rollups, logger=logging.getLogger("uvicorn")
+        )
+        layout = init_storage_layout(self.config.storage_settings.layout)
+        latest = init_latest_values(self.config.overview_settings, logger=logging.getLogger("uvicorn"))
+        ingestor = init_ingestor(
+            layout,
+            id_cache_size=self.config.ingest_settings.id_cache_size,
+            rollups=rollups,
+            latest=latest,
+            logger=logging.getLogger("uvicorn")
+        )
+        cache = init_response_cache(self.config.overview_settings, ingestor, logger=logging.getLogger("uvicorn"))
+        self.broadcast_hub = init_broadcast_hub(self.config.stream_settings, ingestor, logger=logging.getLogger("uvicorn"))
+        self.command_store = init_command_store(
+            self.config.command_settings, new_session, logger=logging.getLogger("uvicorn")
+        )
+        self.cluster_events = init_cluster_events(
+            self.config.server_settings, get_engine(), ingestor,
+            cache=cache, hub=self.broadcast_hub, commands=self.command_store, logger=logging.getLogger("uvicorn")
+        )
+        self.ingest_buffer = init_ingest_buffer(
+            self.config.ingest_settings, ingestor, new_session, logger=logging.getLogger("uvicorn")
+        )
 
         self.app = FastAPI(
             title="DeepMetrics API",
@@ -25,22 +72,79 @@ class Application:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=["ETag"],
         )
 
+        if self.config.database_settings.mode == "async":
+            # Registered first, so its routes take precedence over the sync ones of main_router.
+            self.app.include_router(async_router)
         self.app.include_router(main_router)
         self.app.include_router(command_router)
+        self.app.include_router(stats_router)
+        self.app.include_router(stream_router)
 
-    def run(self, host="0.0.0.0", port=8000, reload=False):
-        uvicorn.run(
-            self.app,
-            host=host,
-            port=port,
-            reload=reload,
-            log_config=self.config.uvicorn_log_config
-        )
+        self.app.add_event_handler("startup", self.startup)
+        self.app.add_event_handler("shutdown", self.shutdown)
+
+    async def startup(self):
+        """
+        Ingest and command posts run on worker threads; the broadcast hub and the command long-poll
+        waiters need the event loop to hand events over.
+        """
+        if self.broadcast_hub is not None:
+            self.broadcast_hub.attach(asyncio.get_running_loop())
+        self.command_store.waiters.attach(asyncio.get_running_loop())
+
+    async def shutdown(self):
+        """
+        Flush anything still held by the write-behind buffer before the process exits.
+        """
+        if self.ingest_buffer is not None:
+            self.ingest_buffer.stop(timeout=self.config.ingest_settings.drain_timeout)
+        self.partition_manager.stop()
+        if self.cluster_events is not None:
+            self.cluster_events.stop()
+        self.command_store.close()
+        await dispose_async_db()
+
+
+_application = None # Built on first use, only in the processes that serve requests
+
+def create_app() -> FastAPI:
+    """
+    Application factory. Building the Application runs the migrations and starts the background
+    services (partition maintenance, command writer, cluster LISTEN thread, DB pools), so it
+    happens lazily: with workers > 1 the uvicorn supervisor never builds one, only its workers do.
+    """
+    global _application
+    if _application is None:
+        _application = Application()
+    return _application.app
+
+def __getattr__(name):
+    # Keeps `uvicorn main:app` / `gunicorn main:app` working without building the app on import.
+    if name == "app":
+        return create_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-application = Application()
-app = application.app  
+def run(host="0.0.0.0", port=8000, reload=False):
+    """
+    With server_config.workers > 1 uvicorn spawns that many processes, each building its own
+    Application through create_app. The same deployment under gunicorn:
+      gunicorn "main:create_app()" -k uvicorn.workers.UvicornWorker -w <workers>
+    (set server_config.workers to the same number, which switches on the shared-state mode).
+    """
+    config = Config()
+    workers = config.server_settings.workers
+    uvicorn.run(
+        "main:create_app" if workers > 1 else create_app(),
+        factory=workers > 1,
+        host=host,
+        port=port,
+        reload=reload,
+        workers=workers,
+        log_config=config.uvicorn_log_config
+    )
 
 if __name__ == "__main__":
-    application.run(reload=False)
\ No newline at end of file
+    run(reload=False)
@@ -0,0 +1,118 @@
+import json
+import zlib
+from typing import Optional
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from schemas import AggregatorIn
+
+try:
+    import msgpack
+except ImportError: # optional, msgpack bodies are answered with 415 without it
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError: # optional, zstd bodies are answered with 415 without it
+    zstandard = None
+
+"""
+    Request body decoding for POST /api/snapshots.
+
+    Content-Encoding: identity, gzip or zstd.
+    Content-Type:
+      application/json                             AggregatorIn as JSON (the original format)
+      application/msgpack                          AggregatorIn as msgpack, timestamps as epoch seconds
+      application/vnd.deepmetrics.columnar+json    columnar batch (see columnar_to_aggregator)
+      application/vnd.deepmetrics.columnar+msgpack
+    Every format is validated straight into AggregatorIn (JSON by pydantic's parser, the others from
+    the decoded objects), never re-serialized to JSON. Unsupported encodings or types, including
+    ones whose optional library is not installed, get 415 so clients can fall back to plain JSON
+    (servers predating this module answer 400 or 422 instead; the SDK then retries once as JSON).
+"""
+
+MAX_DECODED_BYTES = 64 * 1024 * 1024 # guards against decompression bombs
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR_JSON = "application/vnd.deepmetrics.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.deepmetrics.columnar+msgpack"
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return body
+    if encoding == "gzip":
+        try:
+            data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body, MAX_DECODED_BYTES + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    elif encoding == "zstd" and zstandard is not None:
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                data = reader.read(MAX_DECODED_BYTES + 1)
+        except zstandard.ZstdError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid zstd body: {e}")
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+    if len(data) > MAX_DECODED_BYTES:
+        raise HTTPException(status_code=413, detail="Decoded snapshot payload is too large.")
+    return data
+
+def columnar_to_aggregator(doc: dict) -> dict:
+    """
+    Columnar batch -> AggregatorIn fields. Metric names are interned once per batch and each
+    device carries a timestamps column plus one value column per metric (null where a sample
+    lacks that metric):
+      {"guid", "name", "metric_names": [name, ...],
+       "devices": [{"device_name", "timestamps": [epoch seconds, ...],
+                    "metrics": [[metric index, [value, ...]], ...]}, ...]}
+    """
+    names = doc["metric_names"]
+    snapshots = []
+    for device in doc["devices"]:
+        columns = [(names[index], values) for index, values in device["metrics"]]
+        for row, timestamp in enumerate(device["timestamps"]):
+            snapshots.append({
+                "device_name": device["device_name"],
+                "timestamp": timestamp,
+                "metrics": {name: values[row] for name, values in columns if values[row] is not None},
+            })
+    return {"guid": doc["guid"], "name": doc["name"], "device_snapshots": snapshots}
+
+def decode_snapshot_body(body: bytes, content_type: Optional[str], content_encoding: Optional[str]) -> AggregatorIn:
+    """
+    Raw request body -> validated AggregatorIn. Raises HTTPException (400/413/415) or
+    RequestValidationError (422, FastAPI's usual validation response).
+    """
+    data = decompress(body, content_encoding or "")
+    media_type = (content_type or JSON).split(";")[0].strip().lower()
+    try:
+        if media_type == JSON:
+            return AggregatorIn.model_validate_json(data)
+        if media_type in (MSGPACK, COLUMNAR_MSGPACK):
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="msgpack bodies are not supported by this server.")
+            doc = msgpack.unpackb(data, raw=False, strict_map_key=False)
+        elif media_type == COLUMNAR_JSON:
+            doc = json.loads(data)
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Type: {media_type}")
+        if media_type != MSGPACK:
+            doc = columnar_to_aggregator(doc)
+        return AggregatorIn.model_validate(doc)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed {media_type} snapshot payload: {e}")
+
+async def snapshot_payload(request: Request) -> AggregatorIn:
+    """
+    FastAPI dependency replacing the AggregatorIn body parameter of the ingest routes.
+    Reading the body is async, so sync routes keep running in the threadpool.
+    """
+    return decode_snapshot_body(
+        await request.body(),
+        request.headers.get("content-type"),
+        request.headers.get("content-encoding")
+    )
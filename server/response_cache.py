@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+class ResponseCache:
+    """
+    Serialized responses of read endpoints (e.g. /api/overview), keyed by their query parameters.
+
+    Entries are tagged with the data version they were built from. Ingest bumps the version after
+    every commit, which makes all entries stale at once, so idle dashboards polling the same view
+    cost one query per ingest rather than one per poll. Each body gets a strong ETag (a hash of
+    its bytes), letting clients revalidate with If-None-Match and receive 304 Not Modified.
+    """
+    def __init__(self, max_entries: int = 256, logger: Optional[logging.Logger] = None):
+        self.max_entries = max_entries
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entries = OrderedDict() # key -> (version, etag, body)
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self, *_):
+        """
+        Mark every cached response stale. Accepts and ignores ingest listener arguments.
+        """
+        with self._lock:
+            self._version += 1
+            self._stats["invalidations"] += 1
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        """
+        (etag, body) of a response built from the current version, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != self._version:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, version: int, body: bytes) -> str:
+        """
+        Store a body built from `version` (read before querying, so an ingest committing
+        mid-build leaves the entry stale instead of hiding the new data). Returns its ETag.
+        """
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        with self._lock:
+            self._entries[key] = (version, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def record_not_modified(self):
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "version": self._version,
+                "entries": len(self._entries),
+                "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    True when an If-None-Match header value (a list of entity tags, or *) matches `etag`.
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+
+_response_cache = None # Global response cache, None when disabled
+
+def init_response_cache(overview_config, ingestor, logger: logging.Logger = None) -> Optional[ResponseCache]:
+    """
+    Called once at application startup, after init_ingestor(...): registers the cache's
+    invalidation with the ingestor.
+    """
+    global _response_cache
+    if _response_cache is None and overview_config.cache_entries > 0:
+        _response_cache = ResponseCache(max_entries=overview_config.cache_entries, logger=logger)
+        ingestor.add_listener(_response_cache.bump)
+    return _response_cache
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    FastAPI dependency: the response cache, or None when disabled.
+    """
+    return _response_cache
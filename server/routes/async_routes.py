@@ -0,0 +1,96 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import text
+from database.async_db import get_async_db
+from database.ingest import SnapshotIngestor, get_ingestor
+from database.layouts import StorageLayout, get_storage_layout
+from database.latest import LatestValuesStore, get_latest_values
+from database.rollups import RollupStore, get_rollups
+from ingest_buffer import IngestBuffer, get_ingest_buffer
+from response_cache import ResponseCache, get_response_cache
+from routes.main_routes import (
+    queue_snapshot, overview_query, overview_response, history_query, history_response, timestamps
+)
+from schemas import AggregatorIn
+from payload_decoding import snapshot_payload
+from serializers import serialize_overview
+from utils import BlockTimer
+
+router = APIRouter()
+
+"""
+    async def versions of the ingest, overview and history routes, served instead of the ones in
+    main_routes.py when database_config.mode is "async". They await an asyncpg-backed AsyncSession,
+    so a request waiting on Postgres holds no threadpool thread; validation, SQL and response
+    building are shared with the sync routes.
+"""
+
+@router.post("/api/snapshots")
+async def create_aggregator_snapshot(
+    response: Response,
+    agg_in: AggregatorIn = Depends(snapshot_payload),
+    db: AsyncSession = Depends(get_async_db),
+    ingestor: SnapshotIngestor = Depends(get_ingestor),
+    buffer: Optional[IngestBuffer] = Depends(get_ingest_buffer)
+):
+    """
+    Same contract as the sync route. The ingestor is sync code, so it runs on the AsyncSession's
+    underlying Session via run_sync, its statements still going through asyncpg. run_sync runs on
+    the event loop, so the ingest listeners (cache invalidation, SSE, cluster NOTIFY over a
+    blocking connection) are called afterwards on a worker thread.
+    """
+    with BlockTimer("create_aggregator_snapshot", logger=logging.getLogger("uvicorn")):
+        try:
+            if buffer is not None:
+                return queue_snapshot(agg_in, ingestor, buffer, response)
+            result = await db.run_sync(lambda session: ingestor.ingest(session, [agg_in], notify=False))
+            await run_in_threadpool(ingestor.notify, [agg_in], result)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        return {"message": "Aggregator snapshot data saved successfully."}
+
+
+@router.get("/api/overview")
+async def get_overview(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    layout: StorageLayout = Depends(get_storage_layout),
+    latest: Optional[LatestValuesStore] = Depends(get_latest_values),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
+    graph_limit: int = Query(10, description="How many snapshots for 'graph' metrics"),
+    aggregator: str = Query("all", description="Specific aggregator name or 'all'"),
+    device: str = Query("all", description="Specific device name or 'all'")
+):
+    with BlockTimer("overview", logger=logging.getLogger("uvicorn")):
+        key = (graph_limit, aggregator, device)
+        cached = cache.get(key) if cache is not None else None
+        if cached is None:
+            version = cache.version if cache is not None else None
+            sql, params = overview_query(latest if latest is not None else layout, graph_limit, aggregator, device)
+            body = serialize_overview(await db.execute(text(sql), params), timestamps)
+            cached = (cache.put(key, version, body) if cache is not None else None), body
+        return overview_response(request, cache, *cached)
+
+
+@router.get("/api/metrics/history")
+async def get_metric_history(
+    metric_name: str = Query(..., description="Name of the metric to retrieve"),
+    time_filter: str = Query("24h", description="Time range filter, e.g., '24h', '7d', '30d'"),
+    sort: str = Query("desc", description="Sort order: 'asc' or 'desc'"),
+    page: int = Query(1, ge=1, description="Current page number (1-based), ignored when a cursor is given"),
+    page_size: int = Query(10, ge=1, le=100, description="Number of records per page"),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    stats: bool = Query(True, description="Compute totalCount/averageValue/maxValue (null when false)"),
+    db: AsyncSession = Depends(get_async_db),
+    layout: StorageLayout = Depends(get_storage_layout),
+    rollups: Optional[RollupStore] = Depends(get_rollups)
+):
+    with BlockTimer("get_metric_history", logger=logging.getLogger("uvicorn")):
+        sql, params = history_query(layout, rollups, time_filter, sort, page, page_size, cursor, stats)
+        params["metric_name"] = metric_name
+        results = (await db.execute(text(sql), params)).all()
+        return history_response(results, metric_name, time_filter, sort, page, page_size, stats)
@@ -1,13 +1,13 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 import logging
 from schemas import CommandIn, CommandAck
-from command_queue import CommandQueue
+from command_queue import get_command_store, wait_for_commands
 
-command_queue = CommandQueue()
 router = APIRouter()
 
 @router.post("/api/commands", summary="Enqueue a new command")
-def post_command(cmd: CommandIn):
+def post_command(cmd: CommandIn, command_queue=Depends(get_command_store)):
     """
     Front-end calls this to enqueue a command for a given aggregator/device.
     """
@@ -18,13 +18,32 @@ def post_command(cmd: CommandIn):
     )
     return {"message": "Command enqueued", "command_id": command_id}
 
+@router.get("/api/commands/dead-letters", summary="List dead-lettered commands")
+def get_dead_letters(
+    aggregator_name: Optional[str] = Query(None, description="Only this aggregator's commands"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of commands returned"),
+    command_queue=Depends(get_command_store)
+):
+    """
+    Commands that expired before delivery or stayed unacked for max_attempts deliveries,
+    newest first. Only the database command store dead-letters commands.
+    """
+    if not hasattr(command_queue, "dead_letters"):
+        raise HTTPException(status_code=404, detail="Dead-lettering needs command_config.store = \"database\".")
+    return command_queue.dead_letters(aggregator_name, limit)
+
 @router.get("/api/aggregators/{aggregator_name}/commands", summary="Get unacked commands for aggregator")
-def get_commands_for_aggregator(aggregator_name: str):
+async def get_commands_for_aggregator(
+    aggregator_name: str,
+    wait: float = Query(0, ge=0, description="Long-poll: seconds to hold the request while no command is pending"),
+    command_queue=Depends(get_command_store)
+):
     """
     Aggregator code polls this endpoint to retrieve all unacked commands
-    intended for the given aggregator.
+    intended for the given aggregator. With wait > 0 the request is answered as soon as a
+    command is queued for the aggregator, or with [] once wait (at most command_config.max_wait) passes.
     """
-    cmds = command_queue.get_unacked_for_aggregator(aggregator_name)
+    cmds = await wait_for_commands(command_queue, aggregator_name, wait)
     logging.getLogger("uvicorn").info(
         "Polled %d commands for aggregator '%s'",
         len(cmds), aggregator_name
@@ -32,7 +51,7 @@ def get_commands_for_aggregator(aggregator_name: str):
     return cmds
 
 @router.post("/api/aggregators/{aggregator_name}/commands/ack", summary="Acknowledge processed commands")
-def ack_commands_for_aggregator(aggregator_name: str, ack: CommandAck):
+def ack_commands_for_aggregator(aggregator_name: str, ack: CommandAck, command_queue=Depends(get_command_store)):
     """
     Aggregator code calls this after processing commands, so the server
     can remove them from the queue.
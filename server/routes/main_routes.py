@@ -1,24 +1,31 @@
 import logging
-from datetime import datetime, timedelta
-from sqlalchemy import func
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from database.db import get_db
+from database.prepared import execute_prepared
+from database.ingest import SnapshotIngestor, get_ingestor
+from ingest_buffer import IngestBuffer, get_ingest_buffer
+from response_cache import ResponseCache, get_response_cache, etag_matches
 from schemas import AggregatorIn
-from database.models_ex import (
-    AggregatorEx,
-    DeviceEx,
-    DeviceSnapshotEx,
-    MetricDefinitionEx,
-    MetricValueEx,
-    MetricDisplayConfigEx
-)
-from sqlalchemy import func
+from payload_decoding import snapshot_payload
+from database.layouts import StorageLayout, get_storage_layout
+from database.rollups import RollupStore, get_rollups
+from database.latest import LatestValuesStore, get_latest_values
+from database.models_ex import AggregatorEx, DeviceEx, MetricDefinitionEx
+from database.series import series_query, bucket_time
+from database.history import history_sql
 from sqlalchemy.sql import text
-from utils import BlockTimer, format_timestamp
+from serializers import TimestampFormatter, dumps, serialize_overview
+from utils import BlockTimer, encode_cursor, decode_cursor
 
 router = APIRouter()
 
+TIME_FILTERS = {"24h": timedelta(hours=24), "7d": timedelta(days=7), "30d": timedelta(days=30)}
+
+timestamps = TimestampFormatter() # shared per-second cache of formatted timestamps
+
 """
     FastAPI is built around the concept of dependency injection.
     Depends(get_db) is a dependency that will provide a SQLAlchemy Session to the route function.
@@ -27,217 +34,112 @@ router = APIRouter()
 """
 
 @router.post("/api/snapshots")
-def create_aggregator_snapshot(agg_in: AggregatorIn, db: Session = Depends(get_db)):
+def create_aggregator_snapshot(
+    response: Response,
+    agg_in: AggregatorIn = Depends(snapshot_payload),
+    db: Session = Depends(get_db),
+    ingestor: SnapshotIngestor = Depends(get_ingestor),
+    buffer: Optional[IngestBuffer] = Depends(get_ingest_buffer)
+):
+    """
+    Upserts the aggregator, its devices and any new metric definitions, then writes all
+    device snapshots and metric values as multi-row batches (see database/ingest.py).
+    The body may be JSON, msgpack or a columnar batch, optionally gzip/zstd compressed
+    (see payload_decoding.py).
+
+    In "buffered" ingest mode the payload is only validated and queued for the background
+    writer: 202 when accepted, 429 when the queue is full, 503 while the writer cannot reach the database.
+    """
     with BlockTimer("create_aggregator_snapshot", logger=logging.getLogger("uvicorn")):
-        # Upsert aggregator by guid
-        aggregator = db.query(AggregatorEx).filter_by(guid=agg_in.guid).first()
-        if not aggregator:
-            aggregator = AggregatorEx(guid=agg_in.guid, name=agg_in.name)
-            db.add(aggregator)
-            db.flush()  # ensures aggregator.aggregator_id is now assigned
-        else:
-            aggregator.name = agg_in.name
-
-        # Bulk upsert devices (based on aggregator_id + device_name)
-        device_names = {ds_in.device_name for ds_in in agg_in.device_snapshots}
-        existing_devices = (
-            db.query(DeviceEx)
-              .filter(DeviceEx.aggregator_id == aggregator.aggregator_id)
-              .filter(DeviceEx.name.in_(device_names))
-              .all()
-        )
-        device_map = {dev.name: dev for dev in existing_devices}
-
-        new_devices = []
-        for dev_name in device_names:
-            if dev_name not in device_map:
-                dev_obj = DeviceEx(
-                    aggregator_id=aggregator.aggregator_id,
-                    name=dev_name
-                )
-                db.add(dev_obj)
-                device_map[dev_name] = dev_obj
-                new_devices.append(dev_obj)
-
-        # Bulk upsert metric definitions
-        all_metric_names = set()
-        for ds_in in agg_in.device_snapshots:
-            for metric_name in ds_in.metrics.keys():
-                all_metric_names.add(metric_name)
-
-        existing_mdefs = (
-            db.query(MetricDefinitionEx)
-              .filter(MetricDefinitionEx.metric_name.in_(all_metric_names))
-              .all()
-        )
-        metricdef_map = {m.metric_name: m for m in existing_mdefs}
-
-        new_mdefs = []
-        for mname in all_metric_names:
-            if mname not in metricdef_map:
-                mdef_obj = MetricDefinitionEx(metric_name=mname)
-                db.add(mdef_obj)
-                metricdef_map[mname] = mdef_obj
-                new_mdefs.append(mdef_obj)
-
-        # Flush once so newly created aggregator, devices, metric defs get their IDs
-        db.flush()
-
-        # Upsert metric_display_config for each new metric definition
-        if new_mdefs:  # only do a subquery if we created new metric defs
-            new_def_ids = [md.metric_def_id for md in new_mdefs]
-            existing_display = (
-                db.query(MetricDisplayConfigEx)
-                  .filter(MetricDisplayConfigEx.metric_def_id.in_(new_def_ids))
-                  .all()
-            )
-            disp_map = {cfg.metric_def_id: cfg for cfg in existing_display}
-
-            for md_obj in new_mdefs:
-                if md_obj.metric_def_id not in disp_map:
-                    disp_cfg = MetricDisplayConfigEx(metric_def_id=md_obj.metric_def_id)
-                    db.add(disp_cfg)
-                    disp_map[md_obj.metric_def_id] = disp_cfg
-            db.flush()
-
-        # Create device snapshots + metric values now that aggregator, devices, metric defs, and display configs are in place
-        snapshot_objs = []
-        metric_value_objs = []
-
-        for ds_in in agg_in.device_snapshots:
-            device = device_map[ds_in.device_name]
-            snapshot = DeviceSnapshotEx(
-                device_id=device.device_id,
-                snapshot_time=ds_in.timestamp
-            )
-            db.add(snapshot)
-            snapshot_objs.append(snapshot)
-
-            for metric_name, metric_val in ds_in.metrics.items():
-                mdef_obj = metricdef_map[metric_name]
-                mv = MetricValueEx(
-                    metric_def_id=mdef_obj.metric_def_id,
-                    metric_value=metric_val
-                )
-                # Link to snapshot via relationship
-                mv.device_snapshot = snapshot
-                db.add(mv)
-                metric_value_objs.append(mv)
-
-        db.commit()
+        try:
+            if buffer is not None:
+                return queue_snapshot(agg_in, ingestor, buffer, response)
+            ingestor.ingest(db, [agg_in])
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
 
         return {"message": "Aggregator snapshot data saved successfully."}
 
 
+def queue_snapshot(agg_in: AggregatorIn, ingestor: SnapshotIngestor, buffer: IngestBuffer, response: Response) -> dict:
+    """
+    Buffered ingest: validate and hand the payload to the background writer (202), or 429 when full
+    and 503 while the writer is failing, so clients keep the data instead of it being lost.
+    """
+    ingestor.validate(agg_in)
+    if buffer.failing:
+        raise HTTPException(
+            status_code=503,
+            detail="Snapshot storage is unavailable, retry later.",
+            headers={"Retry-After": "5"}
+        )
+    if not buffer.submit(agg_in):
+        raise HTTPException(
+            status_code=429,
+            detail="Ingest queue is full, retry later.",
+            headers={"Retry-After": "1"}
+        )
+    response.status_code = 202
+    return {"message": "Aggregator snapshot data queued."}
+
+
 @router.get("/api/overview")
 def get_overview(
+    request: Request,
     db: Session = Depends(get_db),
+    layout: StorageLayout = Depends(get_storage_layout),
+    latest: Optional[LatestValuesStore] = Depends(get_latest_values),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
     graph_limit: int = Query(10, description="How many snapshots for 'graph' metrics"),
     aggregator: str = Query("all", description="Specific aggregator name or 'all'"),
     device: str = Query("all", description="Specific device name or 'all'")
 ):
     """
-    Calls the get_overview_dynamic(p_graph_limit) DB function,
-    which returns up to 'graph_limit' rows for display_type='graph',
-    else 1 row for 'row' metrics.
+    Reads the latest_metric_values projection (database/latest.py), or with overview_config.source
+    "raw" runs the active storage layout's overview query (the get_overview(p_graph_limit) DB
+    function for the narrow layout). Either returns up to 'graph_limit' rows for
+    display_type='graph', else 1 row for 'row' metrics.
+
+    aggregator/device filters other than 'all' are part of the query, so only the selected
+    devices are read, and we return the same aggregator->devices->metrics structure.
 
-    Then we filter aggregator/device in Python if not 'all',
-    and return the same aggregator->devices->metrics structure.
+    The serialized response is cached per (graph_limit, aggregator, device) until the next ingest
+    and carries an ETag; a matching If-None-Match is answered with 304 Not Modified.
     """
     with BlockTimer("overview", logger=logging.getLogger("uvicorn")):
-        raw_sql = "SELECT * FROM get_overview(:glimit)"
-        params = {"glimit": graph_limit}
-
-        rows = db.execute(text(raw_sql), params).fetchall()  # each row is a row proxy with columns
-
-        # 2) Filter in Python if aggregator != "all" or device != "all"
-        filtered = []
-        for row in rows:
-            if aggregator != "all" and row["aggregator_name"] != aggregator:
-                continue
-            if device != "all" and row["device_name"] != device:
-                continue
-            filtered.append(row)
-
-        # aggregator -> device -> metrics
-        aggregator_map = {}
-        for r in filtered:
-            agg_id = r["aggregator_id"]
-            agg_name = r["aggregator_name"]
-            dev_id = r["device_id"]
-            dev_name = r["device_name"]
-            snap_time = r["snapshot_time"]
-            metric_def_id = r["metric_def_id"]
-            metric_name = r["metric_name"]
-            metric_value = r["metric_value"]
-            display_type = r["display_type"]
-
-            # aggregator
-            if agg_id not in aggregator_map:
-                aggregator_map[agg_id] = {
-                    "aggregatorId": agg_id,
-                    "aggregatorName": agg_name,
-                    "devices": {}
-                }
+        key = (graph_limit, aggregator, device)
+        cached = cache.get(key) if cache is not None else None
+        if cached is None:
+            version = cache.version if cache is not None else None
+            sql, params = overview_query(latest if latest is not None else layout, graph_limit, aggregator, device)
+            body = serialize_overview(execute_prepared(db, sql, params), timestamps)
+            cached = (cache.put(key, version, body) if cache is not None else None), body
+        return overview_response(request, cache, *cached)
 
-            dev_map = aggregator_map[agg_id]["devices"]
-            if dev_id not in dev_map:
-                dev_map[dev_id] = {
-                    "deviceId": dev_id,
-                    "deviceName": dev_name,
-                    "lastUpdated": None,
-                    "metrics": {}
-                }
 
-            # update lastUpdated 
-            if snap_time is not None:
-                device_info = dev_map[dev_id]
-                if device_info["lastUpdated"] is None or snap_time > device_info["lastUpdated"]:
-                    device_info["lastUpdated"] = snap_time
-
-            # metrics
-            metric_map = dev_map[dev_id]["metrics"]
-            if metric_def_id not in metric_map:
-                metric_map[metric_def_id] = {
-                    "metricName": metric_name,
-                    "displayType": display_type,
-                    "data": []
-                }
+def overview_query(source, graph_limit: int, aggregator: str, device: str):
+    """
+    (sql, params) of the overview query of `source` (a StorageLayout or LatestValuesStore).
+    """
+    params = {"glimit": graph_limit}
+    if aggregator != "all":
+        params["aggregator"] = aggregator
+    if device != "all":
+        params["device"] = device
+    return source.overview_sql(aggregator="aggregator" in params, device="device" in params), params
+
 
-            metric_map[metric_def_id]["data"].append({
-                "time": format_timestamp(snap_time) if snap_time else None,
-                "value": round(metric_value, 1)
-            })
-
-        # Convert aggregator_map to final array structure
-        result = []
-        for agg_id, agg_info in aggregator_map.items():
-            device_list = []
-            for dev_id, dev_info in agg_info["devices"].items():
-                # Convert metrics dictionary to a list
-                metric_list = []
-                for mdef_id, mval in dev_info["metrics"].items():
-                    metric_list.append({
-                        "metricName": mval["metricName"],
-                        "displayType": mval["displayType"],
-                        "data": mval["data"]
-                    })
-
-                device_list.append({
-                    "deviceId": dev_info["deviceId"],
-                    "deviceName": dev_info["deviceName"],
-                    "lastUpdated": (format_timestamp(dev_info["lastUpdated"])
-                                    if dev_info["lastUpdated"] else None),
-                    "metrics": metric_list
-                })
-
-            result.append({
-                "aggregatorId": agg_id,
-                "aggregatorName": agg_info["aggregatorName"],
-                "devices": device_list
-            })
-
-        return result
+def overview_response(request: Request, cache: Optional[ResponseCache], etag: Optional[str], body: bytes) -> Response:
+    """
+    The serialized overview, or 304 when the client's If-None-Match already matches its ETag.
+    """
+    if cache is None:
+        return Response(content=body, media_type="application/json")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/api/metrics/history")
@@ -245,92 +147,163 @@ def get_metric_history(
     metric_name: str = Query(..., description="Name of the metric to retrieve"),
     time_filter: str = Query("24h", description="Time range filter, e.g., '24h', '7d', '30d'"),
     sort: str = Query("desc", description="Sort order: 'asc' or 'desc'"),
-    page: int = Query(1, ge=1, description="Current page number (1-based)"),
+    page: int = Query(1, ge=1, description="Current page number (1-based), ignored when a cursor is given"),
     page_size: int = Query(10, ge=1, le=100, description="Number of records per page"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    stats: bool = Query(True, description="Compute totalCount/averageValue/maxValue (null when false)"),
+    db: Session = Depends(get_db),
+    layout: StorageLayout = Depends(get_storage_layout),
+    rollups: Optional[RollupStore] = Depends(get_rollups)
 ):
     """
     Returns historical metric values (with pagination) for the specified metric_name,
     filtered by a time range (24h, 7d, or 30d).
-    Also computes average and maximum metric values over the given time range.
+    Also computes average and maximum metric values over the given time range,
+    from the rollup tiers when they are enabled (see database/rollups.py).
+
+    Pages are ordered by (snapshot_time, device_snapshot_id). Passing the returned nextCursor
+    continues after the last row (keyset pagination), so every page costs about the same as the
+    first; page/OFFSET paging is still accepted. Clients that already have the totals can pass
+    stats=false to skip the aggregate query on follow-up pages.
     """
     with BlockTimer("get_metric_history", logger=logging.getLogger("uvicorn")):
-        # Determine start_time based on time_filter
-        now = datetime.utcnow()
-        if time_filter == "24h":
-            start_time = now - timedelta(hours=24)
-        elif time_filter == "7d":
-            start_time = now - timedelta(days=7)
-        elif time_filter == "30d":
-            start_time = now - timedelta(days=30)
-        else:
+        sql, params = history_query(layout, rollups, time_filter, sort, page, page_size, cursor, stats)
+        params["metric_name"] = metric_name
+        # Metric lookup, page and totals in one statement (see database/history.py)
+        results = db.execute(text(sql), params).all()
+        return history_response(results, metric_name, time_filter, sort, page, page_size, stats)
+
+
+def history_query(layout: StorageLayout, rollups: Optional[RollupStore], time_filter: str, sort: str,
+                  page: int, page_size: int, cursor: Optional[str], stats: bool):
+    """
+    Validates the history parameters and returns (sql, params) of the single-statement query.
+    """
+    # Determine start_time based on time_filter
+    now = datetime.now(timezone.utc)
+    if time_filter not in TIME_FILTERS:
+        raise HTTPException(status_code=400, detail="Invalid time_filter provided.")
+    start_time = now - TIME_FILTERS[time_filter]
+
+    # Sort order by snapshot_time asc/desc
+    if sort not in ["asc", "desc"]:
+        raise HTTPException(status_code=400, detail="Invalid sort param, must be 'asc' or 'desc'")
+
+    params = {"start_time": start_time,
+              "offset": (page - 1) * page_size, "limit": page_size + 1}  # one extra row tells whether another page follows
+    if cursor is not None:
+        try:
+            cursor_sort, params["cursor_time"], params["cursor_id"] = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if cursor_sort != sort:
+            raise HTTPException(status_code=400, detail="Cursor was issued for a different sort order")
+        params["offset"] = 0
+    if stats and rollups is not None:
+        params.update(rollups.window_params(start_time))
+
+    return history_sql(layout, rollups, sort, keyset=cursor is not None, with_stats=stats), params
+
+
+def history_response(results: list, metric_name: str, time_filter: str, sort: str,
+                     page: int, page_size: int, stats: bool) -> Response:
+    """
+    Builds the history JSON from the rows of the history query.
+    """
+    if not results:
+        raise HTTPException(status_code=404, detail="Metric not found")
+
+    total_count = avg_value = max_value = None
+    if stats:
+        first = results[0]
+        total_count = int(first.total_count)
+        avg_value = float(first.avg_value or 0)
+        max_value = float(first.max_value or 0)
+
+    paginated_results = [r for r in results if r.snapshot_time is not None]
+    next_cursor = None
+    if len(paginated_results) > page_size:
+        paginated_results = paginated_results[:page_size]
+        last = paginated_results[-1]
+        next_cursor = encode_cursor(sort, last.snapshot_time, last.device_snapshot_id)
+
+    # Format the paginated rows
+    rows = []
+    for r in paginated_results:
+        rows.append({
+            "timestamp": timestamps(r.snapshot_time),
+            "value": r.metric_value
+        })
+
+    return Response(content=dumps({
+        "metricName": metric_name,
+        "timeFilter": time_filter,
+        "sort": sort,
+        "page": page,
+        "pageSize": page_size,
+        "totalCount": total_count,
+        "averageValue": avg_value,
+        "maxValue": max_value,
+        "rows": rows,
+        "nextCursor": next_cursor,
+    }), media_type="application/json")
+
+
+@router.get("/api/metrics/series")
+def get_metric_series(
+    metric_name: str = Query(..., description="Name of the metric to chart"),
+    device_name: str = Query(..., description="Device the metric belongs to"),
+    aggregator: Optional[str] = Query(None, description="Aggregator name, needed when device names are ambiguous"),
+    time_filter: str = Query("24h", description="Time range filter, e.g., '24h', '7d', '30d'"),
+    points: int = Query(500, ge=10, le=2000, description="Maximum number of points returned"),
+    db: Session = Depends(get_db),
+    layout: StorageLayout = Depends(get_storage_layout),
+    rollups: Optional[RollupStore] = Depends(get_rollups)
+):
+    """
+    Returns the metric of one device over the time range downsampled to at most 'points'
+    min/max/avg buckets (see database/series.py), for charts that would otherwise have to
+    page through the whole history.
+    """
+    with BlockTimer("get_metric_series", logger=logging.getLogger("uvicorn")):
+        if time_filter not in TIME_FILTERS:
             raise HTTPException(status_code=400, detail="Invalid time_filter provided.")
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - TIME_FILTERS[time_filter]
 
-        metric_def = (
-            db.query(MetricDefinitionEx)
-            .filter_by(metric_name=metric_name)
-            .first()
-        )
+        metric_def = db.query(MetricDefinitionEx).filter_by(metric_name=metric_name).first()
         if not metric_def:
             raise HTTPException(status_code=404, detail="Metric not found")
 
-        # Build a base query that joins MetricValueEx -> DeviceSnapshotEx
-        base_query = (
-            db.query(MetricValueEx, DeviceSnapshotEx.snapshot_time)
-            .join(DeviceSnapshotEx,
-                  DeviceSnapshotEx.device_snapshot_id == MetricValueEx.device_snapshot_id)
-            .filter(MetricValueEx.metric_def_id == metric_def.metric_def_id)
-            .filter(DeviceSnapshotEx.snapshot_time >= start_time)
-        )
-
-        count_query = base_query.with_entities(func.count()).order_by(None)
-        total_count = count_query.scalar()
-
-        # Sort order by snapshot_time asc/desc
-        if sort not in ["asc", "desc"]:
-            raise HTTPException(status_code=400, detail="Invalid sort param, must be 'asc' or 'desc'")
-
-        if sort == "asc":
-            base_query = base_query.order_by(DeviceSnapshotEx.snapshot_time.asc())
-        else:
-            base_query = base_query.order_by(DeviceSnapshotEx.snapshot_time.desc())
-
-        offset = (page - 1) * page_size
-        paginated_results = base_query.offset(offset).limit(page_size).all()
-
-        # Calculate average and max over the full filtered range
-        stats_query = (
-            db.query(
-                func.avg(MetricValueEx.metric_value).label("avg_value"),
-                func.max(MetricValueEx.metric_value).label("max_value")
-            )
-            .join(DeviceSnapshotEx,
-                  DeviceSnapshotEx.device_snapshot_id == MetricValueEx.device_snapshot_id)
-            .filter(MetricValueEx.metric_def_id == metric_def.metric_def_id)
-            .filter(DeviceSnapshotEx.snapshot_time >= start_time)
-        )
-        stats_result = stats_query.first()
-        avg_value = stats_result.avg_value if stats_result and stats_result.avg_value is not None else 0
-        max_value = stats_result.max_value if stats_result and stats_result.max_value is not None else 0
-
-        # Format the paginated rows
-        rows = []
-        for (metric_val, snap_time) in paginated_results:
-            rows.append({
-                "timestamp": format_timestamp(snap_time),
-                "value": metric_val.metric_value
-            })
-
-        return {
+        device_query = db.query(DeviceEx).filter(DeviceEx.name == device_name)
+        if aggregator is not None:
+            device_query = device_query.join(AggregatorEx).filter(AggregatorEx.name == aggregator)
+        devices = device_query.limit(2).all()
+        if not devices:
+            raise HTTPException(status_code=404, detail="Device not found")
+        if len(devices) > 1:
+            raise HTTPException(status_code=400, detail="Device name is ambiguous, specify the aggregator")
+
+        sql, params, source = series_query(layout, rollups, start_time, end_time, points)
+        buckets = db.execute(
+            text(sql),
+            {**params, "metric_def_id": metric_def.metric_def_id, "device_id": devices[0].device_id}
+        ).all()
+
+        return Response(content=dumps({
             "metricName": metric_name,
+            "deviceName": device_name,
             "timeFilter": time_filter,
-            "sort": sort,
-            "page": page,
-            "pageSize": page_size,
-            "totalCount": total_count,
-            "averageValue": float(avg_value),
-            "maxValue": float(max_value),
-            "rows": rows,
-        }
-
-
+            "source": source,
+            "bucketSeconds": params["width"],
+            "points": [
+                {
+                    "time": timestamps(bucket_time(params, b.bucket)),
+                    "count": int(b.sample_count),
+                    "avg": float(b.avg_value),
+                    "min": b.min_value,
+                    "max": b.max_value,
+                }
+                for b in buckets
+            ],
+        }), media_type="application/json")
@@ -0,0 +1,45 @@
+from typing import Optional
+from fastapi import APIRouter, Depends
+from database.db import get_engine, pool_stats
+from database.async_db import get_async_engine
+from database.ingest import SnapshotIngestor, get_ingestor
+from ingest_buffer import IngestBuffer, get_ingest_buffer
+from response_cache import ResponseCache, get_response_cache
+from broadcast_hub import BroadcastHub, get_broadcast_hub
+from cluster_events import ClusterEvents, get_cluster_events
+from command_queue import get_command_store
+
+router = APIRouter()
+
+@router.get("/api/server/stats", summary="Internal server metrics")
+def get_server_stats(
+    buffer: Optional[IngestBuffer] = Depends(get_ingest_buffer),
+    ingestor: SnapshotIngestor = Depends(get_ingestor),
+    cache: Optional[ResponseCache] = Depends(get_response_cache),
+    hub: Optional[BroadcastHub] = Depends(get_broadcast_hub),
+    cluster: Optional[ClusterEvents] = Depends(get_cluster_events),
+    commands=Depends(get_command_store)
+):
+    """
+    Operational counters for monitoring: ingest queue depth, batch sizes, ID cache and
+    overview response cache hit rates, live stream subscribers, connection pool usage, etc.
+    """
+    try:
+        async_pool = pool_stats(get_async_engine().sync_engine)
+    except RuntimeError:
+        async_pool = None # sync mode
+    return {
+        "ingest": {
+            "mode": "buffered" if buffer is not None else "sync",
+            **(buffer.stats() if buffer is not None else {})
+        },
+        "id_cache": ingestor.id_cache.stats(),
+        "overview_cache": cache.stats() if cache is not None else None,
+        "stream": hub.stats() if hub is not None else None,
+        "cluster": cluster.stats() if cluster is not None else None,
+        "commands": {**commands.stats(), "long_polls_waiting": commands.waiters.waiting()},
+        "database": {
+            "pool": pool_stats(get_engine()),
+            "async_pool": async_pool
+        }
+    }
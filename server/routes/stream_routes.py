@@ -0,0 +1,47 @@
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from broadcast_hub import BroadcastHub, get_broadcast_hub
+
+router = APIRouter()
+
+KEEPALIVE_INTERVAL = 15.0 # seconds between SSE comments that keep idle connections open
+
+@router.get("/api/stream")
+async def stream_snapshots(
+    request: Request,
+    aggregator: str = Query("all", description="Specific aggregator name or 'all'"),
+    device: str = Query("all", description="Specific device name or 'all'"),
+    hub: Optional[BroadcastHub] = Depends(get_broadcast_hub)
+):
+    """
+    Server-sent events stream of new metric values as soon as their snapshot is committed.
+    Each 'snapshot' event carries {aggregatorName, deviceName, time, metrics}; updates for a device
+    that pile up while the client is slow are coalesced into one event with the newest values.
+    """
+    if hub is None:
+        raise HTTPException(status_code=404, detail="Live streaming is disabled.")
+
+    subscription = hub.subscribe(
+        aggregator=None if aggregator == "all" else aggregator,
+        device=None if device == "all" else device
+    )
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(timeout=KEEPALIVE_INTERVAL)
+                if not batch:
+                    yield ": keepalive\n\n"
+                for event in batch:
+                    yield f"event: snapshot\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
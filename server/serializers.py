@@ -0,0 +1,98 @@
+import json
+from datetime import datetime
+from typing import Iterable
+from utils import format_timestamp
+
+try:
+    import orjson
+except ImportError: # optional, falls back to the standard library encoder
+    orjson = None
+
+"""
+    Response serialization for the read endpoints.
+
+    The overview and history routes return bytes built here inside a raw Response, skipping
+    FastAPI's jsonable_encoder pass. Rows are consumed straight from the result cursor by position,
+    timestamps are formatted once per distinct second, and encoding uses orjson when installed.
+"""
+
+def dumps(obj) -> bytes:
+    """
+    Compact JSON bytes, identical in structure to what FastAPI would have returned.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class TimestampFormatter:
+    """
+    format_timestamp() with a cache per whole second: overview and history responses repeat the
+    same snapshot times across every metric of a snapshot, so strftime runs once per snapshot.
+    """
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._cache = {}
+
+    def __call__(self, dt: datetime) -> str:
+        if dt is None:
+            return None
+        key = (int(dt.timestamp()), dt.tzinfo)
+        formatted = self._cache.get(key)
+        if formatted is None:
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            formatted = self._cache[key] = format_timestamp(dt)
+        return formatted
+
+
+# Positions of the overview query columns (StorageLayout.overview_sql / LatestValuesStore.overview_sql)
+_AGG_ID, _AGG_NAME, _DEV_ID, _DEV_NAME, _TIME, _DEF_ID, _METRIC_NAME, _VALUE, _DISPLAY = range(9)
+
+def serialize_overview(rows: Iterable, timestamps: TimestampFormatter = None) -> bytes:
+    """
+    Nests overview rows into the aggregator -> devices -> metrics structure of /api/overview and
+    encodes it. Rows may arrive in any order (get_overview() does not guarantee one).
+    """
+    timestamps = timestamps or TimestampFormatter()
+    aggregators = {} # agg_id -> [agg_id, name, {dev_id: [dev_id, name, last_time, {def_id: metric}]}]
+    for row in rows:
+        agg = aggregators.get(row[_AGG_ID])
+        if agg is None:
+            agg = aggregators[row[_AGG_ID]] = [row[_AGG_ID], row[_AGG_NAME], {}]
+        dev = agg[2].get(row[_DEV_ID])
+        if dev is None:
+            dev = agg[2][row[_DEV_ID]] = [row[_DEV_ID], row[_DEV_NAME], None, {}]
+
+        snap_time = row[_TIME]
+        if snap_time is not None and (dev[2] is None or snap_time > dev[2]):
+            dev[2] = snap_time
+
+        metric = dev[3].get(row[_DEF_ID])
+        if metric is None:
+            metric = dev[3][row[_DEF_ID]] = {
+                "metricName": row[_METRIC_NAME],
+                "displayType": row[_DISPLAY],
+                "data": []
+            }
+        metric["data"].append({
+            "time": timestamps(snap_time) if snap_time else None,
+            "value": round(row[_VALUE], 1)
+        })
+
+    return dumps([
+        {
+            "aggregatorId": agg_id,
+            "aggregatorName": agg_name,
+            "devices": [
+                {
+                    "deviceId": dev_id,
+                    "deviceName": dev_name,
+                    "lastUpdated": timestamps(last_time) if last_time else None,
+                    "metrics": list(metrics.values())
+                }
+                for dev_id, dev_name, last_time, metrics in devices.values()
+            ]
+        }
+        for agg_id, agg_name, devices in aggregators.values()
+    ])
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Run from server/:  python -m pytest tests
+# The server modules import each other top-level (from database... import ...), as when run from server/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
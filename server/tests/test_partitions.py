@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from database.partitions import PartitionManager, uncovered
+
+def day(d: int, hour: int = 0) -> datetime:
+    return datetime(2026, 3, d, hour, tzinfo=timezone.utc)
+
+def test_bucket_start_daily():
+    manager = PartitionManager(None, interval="daily")
+    assert manager.bucket_start(day(18, 23)) == day(18)
+
+def test_bucket_start_weekly_is_monday():
+    manager = PartitionManager(None, interval="weekly")
+    assert manager.bucket_start(day(18, 23)) == day(16) # Wednesday -> Monday
+    assert manager.bucket_start(day(16)) == day(16)
+
+def test_bucket_start_converts_to_utc():
+    manager = PartitionManager(None, interval="daily")
+    moment = datetime(2026, 3, 19, 1, tzinfo=timezone(timedelta(hours=2)))
+    assert manager.bucket_start(moment) == day(18)
+
+def test_invalid_interval():
+    with pytest.raises(ValueError):
+        PartitionManager(None, interval="monthly")
+
+def test_uncovered_without_partitions():
+    assert uncovered(day(16), day(23), []) == [(day(16), day(23))]
+
+def test_uncovered_fully_covered():
+    assert uncovered(day(16), day(17), [(day(15), day(18))]) == []
+
+def test_uncovered_around_overlapping_partitions():
+    # daily partitions left from before a switch to weekly partitions
+    ranges = [(day(18), day(19)), (day(19), day(20)), (day(22), day(24)), (day(1), day(2))]
+    assert uncovered(day(16), day(23), ranges) == [(day(16), day(18)), (day(20), day(22))]
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from database.prepared import StatementPreparer
+
+def test_binds_become_positional_in_first_use_order():
+    name, positional, names = StatementPreparer()._compile(
+        "SELECT * FROM t WHERE a = :a AND b > :b OR a < :a"
+    )
+    assert positional == "SELECT * FROM t WHERE a = $1 AND b > $2 OR a < $1"
+    assert names == ["a", "b"]
+    assert name.startswith("dm_")
+
+def test_casts_and_literals_are_not_binds():
+    _, positional, names = StatementPreparer()._compile(
+        "SELECT :id::bigint, now()::text, '12:30'"
+    )
+    assert positional == "SELECT $1::bigint, now()::text, '12:30'"
+    assert names == ["id"]
+
+def test_statement_name_is_stable_and_compiled_once():
+    preparer = StatementPreparer()
+    first = preparer._compile("SELECT :x")
+    assert preparer._compile("SELECT :x") is first
+    assert StatementPreparer()._compile("SELECT :x")[0] == first[0]
+    assert StatementPreparer()._compile("SELECT :y")[0] != first[0]
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from database.rollups import RollupStore, TIERS
+
+NOW = datetime(2026, 3, 31, 12, 0, tzinfo=timezone.utc)
+
+def test_window_params_stitch_boundaries():
+    params = RollupStore().window_params(datetime(2026, 3, 1, 10, 15, 30, tzinfo=timezone.utc), now=NOW)
+    assert params["b0"] == datetime(2026, 3, 1, 10, 16, tzinfo=timezone.utc)
+    assert params["b1"] == datetime(2026, 3, 1, 11, 0, tzinfo=timezone.utc)
+    assert params["b2"] == datetime(2026, 3, 2, tzinfo=timezone.utc)
+
+def test_window_older_than_minute_retention_reads_head_raw():
+    rollups = RollupStore(minute_retention_days=7)
+    params = rollups.window_params(datetime(2026, 3, 1, 10, 15, 30, tzinfo=timezone.utc), now=NOW)
+    # [start, b1) from raw data, no minute buckets that may already be pruned
+    assert params["b0"] == params["b1"] == datetime(2026, 3, 1, 11, 0, tzinfo=timezone.utc)
+
+def test_window_within_minute_retention_uses_minute_tier():
+    rollups = RollupStore(minute_retention_days=7)
+    params = rollups.window_params(datetime(2026, 3, 30, 10, 15, 30, tzinfo=timezone.utc), now=NOW)
+    assert params["b0"] == datetime(2026, 3, 30, 10, 16, tzinfo=timezone.utc)
+    assert params["b1"] == datetime(2026, 3, 30, 11, 0, tzinfo=timezone.utc)
+
+def test_retained_since_only_limits_minute_tier():
+    rollups = RollupStore(minute_retention_days=7)
+    assert rollups.retained_since(TIERS[0], NOW) == datetime(2026, 3, 24, 12, 0, tzinfo=timezone.utc)
+    assert rollups.retained_since(TIERS[1], NOW) is None
+    assert RollupStore().retained_since(TIERS[0], NOW) is None
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+
+pytest.importorskip("sqlalchemy")
+from database.layouts import NarrowLayout
+from database.rollups import RollupStore
+from database.series import series_query
+
+NOW = datetime(2026, 3, 31, 12, 0, tzinfo=timezone.utc)
+
+def test_raw_without_rollups():
+    _, params, source = series_query(NarrowLayout(), None, NOW - timedelta(days=30), NOW, 100)
+    assert source == "raw"
+    assert params["width"] == timedelta(days=30).total_seconds() / 100
+
+def test_coarsest_tier_that_fits_the_bucket():
+    _, _, source = series_query(NarrowLayout(), RollupStore(), NOW - timedelta(days=30), NOW, 10)
+    assert source == "1d"
+    _, _, source = series_query(NarrowLayout(), RollupStore(), NOW - timedelta(days=30), NOW, 300)
+    assert source == "1h"
+
+def test_pruned_minute_tier_falls_back_to_raw():
+    rollups = RollupStore(minute_retention_days=7)
+    # 30 days in 1000 points: ~43 minute buckets, finer than an hour
+    _, _, source = series_query(NarrowLayout(), rollups, NOW - timedelta(days=30), NOW, 1000, now=NOW)
+    assert source == "raw"
+    _, _, source = series_query(NarrowLayout(), rollups, NOW - timedelta(days=2), NOW, 1000, now=NOW)
+    assert source == "1m"
+
+def test_rollup_bucket_count_stays_within_points():
+    start = datetime(2026, 3, 31, 0, 0, 30, tzinfo=timezone.utc)
+    end = start + timedelta(seconds=300)
+    _, params, source = series_query(NarrowLayout(), RollupStore(), start, end, 5, now=NOW)
+    assert source == "1m"
+    last_bucket = ((end - params["origin"]).total_seconds() - 1) // params["width"]
+    assert last_bucket <= 4
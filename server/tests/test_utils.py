@@ -0,0 +1,14 @@
+from datetime import datetime, timezone
+import pytest
+from utils import encode_cursor, decode_cursor
+
+def test_cursor_round_trip():
+    moment = datetime(2026, 3, 31, 12, 30, 15, 250000, tzinfo=timezone.utc)
+    cursor = encode_cursor("desc", moment, 123456)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("desc", moment, 123456)
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "ZGVzY3x4eHh8MQ", "ZGVzYw"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
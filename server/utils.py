@@ -1,6 +1,8 @@
 import time
+import base64
 import logging
 from datetime import datetime
+from typing import Tuple
 
 class BlockTimer:
     """
@@ -32,3 +34,23 @@ def format_timestamp(dt: datetime) -> str:
     # %d => zero-padded day, %m => zero-padded month, %Y => 4-digit year
     # %H:%M:%S => 24-hour time with zero-padded hours/minutes/seconds
     return dt.strftime("%d/%m/%Y %H:%M:%S")
+
+
+def encode_cursor(sort: str, snapshot_time: datetime, device_snapshot_id: int) -> str:
+    """
+    Opaque keyset pagination token for the row a page ended on.
+    """
+    raw = f"{sort}|{snapshot_time.isoformat()}|{device_snapshot_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, datetime, int]:
+    """
+    Inverse of encode_cursor. Raises ValueError on a malformed token.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        sort, snapshot_time, device_snapshot_id = raw.split("|")
+        return sort, datetime.fromisoformat(snapshot_time), int(device_snapshot_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e